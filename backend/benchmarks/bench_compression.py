@@ -0,0 +1,169 @@
+"""Compare the listings database with and without dictionary compression.
+
+Builds a database of synthetic listings stored as plain text, the layout
+before compression, then trains a dictionary on a copy and recompresses it.
+Reports the file size, how much of it fits SQLite's default page cache and
+the throughput of a full scan as done by `/messages`.
+
+Run with `python benchmarks/bench_compression.py [n_listings]`.
+"""
+
+import asyncio
+import json
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flattracker.compression import CODEC, load_dictionaries
+from flattracker.database_manager import DatabaseManager
+from flattracker.job_queue import text_hash
+
+TEMPLATES = [
+    (
+        "{bhk} BHK {furnished} flat available for rent in {place}. Rent {rent}k, "
+        "deposit {dep}k, maintenance included. No brokerage. Available from {day} "
+        "{month}. {gender} preferred. Contact {phone}"
+    ),
+    (
+        "Looking for a {gender} flatmate for a {room} in a {bhk} BHK at {place}. "
+        "Rent {rent}k per head, deposit {dep}k, {furnished}, gated society with gym "
+        "and pool. Immediate move in. DM me"
+    ),
+    (
+        "Room available in {place} from {day} {month}: {room}, {furnished}, rent "
+        "{rent}k, deposit {dep}k, {restriction}. Call {phone} (owner, no brokers)"
+    ),
+]
+PLACES = [
+    "Hinjewadi Phase 1",
+    "Hinjewadi Phase 2",
+    "Wakad",
+    "Baner",
+    "Megapolis Sunway",
+    "Megapolis Splendour",
+    "Blue Ridge",
+    "Life Republic",
+]
+# pages in SQLite's default cache (cache_size = -2000, i.e. 2000 KiB)
+CACHE_BYTES = 2000 * 1024
+
+
+def make_rows(n: int) -> list[tuple]:
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(n):
+        fields = {
+            "bhk": rng.randint(1, 3),
+            "furnished": rng.choice(["fully furnished", "semi-furnished"]),
+            "place": rng.choice(PLACES),
+            "rent": rng.randint(8, 45),
+            "dep": rng.randint(20, 150),
+            "day": rng.randint(1, 28),
+            "month": rng.choice(["April", "May", "June"]),
+            "gender": rng.choice(["Male", "Female", "Family"]),
+            "room": rng.choice(["master bedroom", "non-master bedroom", "hall"]),
+            "restriction": rng.choice(["no smoking", "no non-veg", "no restrictions"]),
+            "phone": rng.randint(7000000000, 9999999999),
+        }
+        text = rng.choice(TEMPLATES).format(**fields)
+        details = {
+            "BHK": fields["bhk"],
+            "Bedroom": fields["room"],
+            "Sharing": rng.random() < 0.3,
+            "Gender": fields["gender"],
+            "Address": fields["place"],
+            "Rent": fields["rent"] * 1000,
+            "Deposit": fields["dep"] * 1000,
+            "Restrictions": fields["restriction"],
+            "Furnished": fields["furnished"],
+            "Brokerage": 0,
+            "AvailableDate": f"{fields['day']} {fields['month']}",
+            "ContactDetail": str(fields["phone"]),
+        }
+        date = start + timedelta(minutes=7 * i)
+        rows.append((text, date.isoformat(" "), "Owner", json.dumps(details)))
+    return rows
+
+
+async def build_plain(db_path: Path, rows: list[tuple]) -> None:
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    await manager.engine.dispose()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO message_data (raw_text, date, author, structured_data, "
+        "text_hash) VALUES (?, ?, ?, ?, ?)",
+        [(*row, text_hash(row[0])) for row in rows],
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+async def compress(db_path: Path) -> None:
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    await manager.train_compression()
+    await manager.engine.dispose()
+
+
+def scan(db_path: Path, repeat: int = 5) -> float:
+    """rows per second of reading and decoding every listing"""
+    timings = []
+    for _ in range(repeat):
+        conn = sqlite3.connect(db_path)
+        load_dictionaries(conn)
+        start = time.perf_counter()
+        rows = conn.execute(
+            "SELECT raw_text, structured_data FROM message_data ORDER BY date DESC"
+        ).fetchall()
+        for raw_text, data in rows:
+            CODEC.decode(raw_text)
+            json.loads(CODEC.decode(data))
+        timings.append(time.perf_counter() - start)
+        conn.close()
+    return len(rows) / statistics.median(timings)
+
+
+def report(name: str, db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    pages, page_size = (
+        conn.execute("PRAGMA page_count").fetchone()[0],
+        conn.execute("PRAGMA page_size").fetchone()[0],
+    )
+    payload = conn.execute(
+        "SELECT SUM(LENGTH(raw_text) + LENGTH(structured_data)) FROM message_data"
+    ).fetchone()[0]
+    conn.close()
+    size = db_path.stat().st_size
+    cached = min(1.0, CACHE_BYTES / (pages * page_size))
+    print(
+        f"{name:<12} {size / 1024**2:8.2f} MiB  {pages:7d} pages  "
+        f"payload {payload / 1024**2:7.2f} MiB  "
+        f"{cached:6.1%} in default cache  {scan(db_path):10,.0f} rows/s"
+    )
+
+
+def main(n: int) -> None:
+    rows = make_rows(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "plain.db"
+        compressed = Path(tmp) / "compressed.db"
+        asyncio.run(build_plain(plain, rows))
+        shutil.copy(plain, compressed)
+        asyncio.run(compress(compressed))
+
+        print(f"\n{n} listings")
+        report("plain", plain)
+        report("compressed", compressed)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
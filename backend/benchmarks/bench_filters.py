@@ -0,0 +1,115 @@
+"""Compare the keyword filter with per-keyword checks and a single regex alternation.
+
+Run with `python benchmarks/bench_filters.py [n_messages]`.
+"""
+
+import random
+import re
+import sys
+import time
+
+from flattracker.filters import DEFAULT_FILTER, FilterRules, KeywordFilter
+
+TEMPLATES = [
+    (
+        "2 BHK fully furnished flat available in {place}, rent {rent}k, deposit {dep}k. "
+        "No brokerage. Available from 1st April. Contact {phone}"
+    ),
+    (
+        "Looking for a female flatmate for a shared room in {place}. Rent {rent}k per "
+        "head, deposit {dep}k, gated society with gym and pool. DM me"
+    ),
+    "{name} changed the group photo",
+    "Genuine leads for flats in {place}, external agents welcome, call {phone}",
+    "Car rental available in {place}, {rent}k per day with driver",
+    "1 RK in {place}",
+]
+PLACES = ["Hinjewadi Phase 1", "Wakad", "Baner", "Megapolis Sunway", "Blue Ridge"]
+
+
+def make_messages(n: int) -> list[str]:
+    rng = random.Random(0)
+    return [
+        rng.choice(TEMPLATES).format(
+            place=rng.choice(PLACES),
+            rent=rng.randint(5, 40),
+            dep=rng.randint(10, 100),
+            phone=rng.randint(7000000000, 9999999999),
+            name=rng.choice(["Akash", "Priya", "Rahul"]),
+        )
+        for _ in range(n)
+    ]
+
+
+def random_keyword(rng: random.Random) -> str:
+    letters = "abcdefghijklmnopqrstuvwxyz "
+    return "".join(rng.choice(letters) for _ in range(rng.randint(5, 12))).strip()
+
+
+def old_ingestion_filter(text: str) -> bool:
+    flag1 = len(text) > 50
+    flag2 = "changed" not in text.lower()
+    flag3 = "lead" not in text.lower()
+    flag4 = "external" not in text.lower()
+    return flag1 and flag2 and flag3 and flag4
+
+
+def per_keyword_filter(keywords: list[str]):
+    """the old approach extended to the same keyword list as the engine"""
+
+    def accepts(text: str) -> bool:
+        return len(text) > 50 and not any(k in text.lower() for k in keywords)
+
+    return accepts
+
+
+def regex_filter(keywords: list[str]):
+    """one alternation of all keywords, scanned once per lowercased message"""
+    pattern = re.compile("|".join(re.escape(k) for k in keywords))
+
+    def accepts(text: str) -> bool:
+        return len(text) > 50 and pattern.search(text.lower()) is None
+
+    return accepts
+
+
+def bench(name: str, func, messages: list[str]) -> float:
+    start = time.perf_counter()
+    kept = sum(1 for text in messages if func(text))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<30} {elapsed:6.2f}s  {len(messages) / elapsed / 1e6:5.2f} M msg/s  kept {kept}"
+    )
+    return elapsed
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    messages = make_messages(n)
+    print(f"{n} messages")
+    bench("old ingestion filter", old_ingestion_filter, messages)
+    keywords = DEFAULT_FILTER.rules.exclude
+    bench("per keyword, default rules", per_keyword_filter(keywords), messages)
+    bench("regex, default rules", regex_filter(keywords), messages)
+    bench("KeywordFilter, default rules", DEFAULT_FILTER.accepts, messages)
+
+    # a realistic blocklist grows; past TRIE_MIN_KEYWORDS the filter scans
+    # each message once with a trie shaped regex, which beats both the `in`
+    # checks and a plain alternation of the same keywords
+    rng = random.Random(1)
+    for n_keywords in (30, 100, 300):
+        longer = keywords + [random_keyword(rng) for _ in range(n_keywords - 4)]
+        bench(
+            f"per keyword, {n_keywords} keywords", per_keyword_filter(longer), messages
+        )
+        bench(f"regex, {n_keywords} keywords", regex_filter(longer), messages)
+        rules = FilterRules(exclude=longer, min_length=50)
+        bench(
+            f"KeywordFilter, {n_keywords} keywords",
+            KeywordFilter(rules).accepts,
+            messages,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Time re-normalizing every listing with 1, 2, 4 and 8 worker processes.
+
+Each run saves into its own copy of a synthetic listings database; the
+digest of the resulting table shows that the output does not depend on the
+number of workers. The speedup is bounded by the cores of the machine.
+
+Run with `python benchmarks/bench_normalization.py [n_listings]`.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_compression import build_plain, compress, make_rows
+
+from flattracker.data_normalization import renormalize
+
+
+def digest(db_path: Path) -> str:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT id, structured_data, available_from FROM message_data ORDER BY id"
+    )
+    sha = hashlib.sha256()
+    for row in rows:
+        sha.update(repr(row).encode())
+    conn.close()
+    return sha.hexdigest()[:12]
+
+
+def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "listings.db"
+        asyncio.run(build_plain(source, make_rows(n)))
+        asyncio.run(compress(source))
+
+        print(f"\n{n} listings, {os.cpu_count()} cores")
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            db_path = Path(tmp) / f"workers_{workers}.db"
+            shutil.copy(source, db_path)
+            start = time.perf_counter()
+            renormalize(db_path, workers=workers, save=True)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"{workers} workers  {elapsed:6.2f}s  {n / elapsed:8,.0f} listings/s  "
+                f"speedup {baseline / elapsed:4.2f}x  output {digest(db_path)}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
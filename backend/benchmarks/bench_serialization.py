@@ -0,0 +1,84 @@
+"""Time building and serializing the `/messages` response.
+
+Compares FastAPI's default path for returned dicts (jsonable_encoder and the
+standard json module), validating and dumping through the pydantic response
+model, and the API's orjson response, with all fields and with the columns
+of the table view only. Reports the query and serialization time and the
+payload size.
+
+Run with `python benchmarks/bench_serialization.py [n_listings]`.
+"""
+
+import asyncio
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_compression import build_plain, compress, make_rows
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from flattracker.api.app import ORJSONResponse
+from flattracker.api.queries import query_messages
+from flattracker.compression import load_dictionaries
+from flattracker.models import Message
+
+TABLE_FIELDS = "id,time_created,author,BHK,Rent,Deposit,Address,Furnished"
+MESSAGES = TypeAdapter(list[Message])
+
+
+def default_encoder(messages: list[dict]) -> bytes:
+    return JSONResponse(jsonable_encoder(messages)).body
+
+
+def response_model(messages: list[dict]) -> bytes:
+    return MESSAGES.dump_json(MESSAGES.validate_python(messages), exclude_unset=True)
+
+
+def orjson_response(messages: list[dict]) -> bytes:
+    return ORJSONResponse(messages).body
+
+
+def timed(fn, repeat: int = 5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "listings.db"
+        asyncio.run(build_plain(db_path, make_rows(n)))
+        asyncio.run(compress(db_path))
+        conn = sqlite3.connect(db_path)
+        load_dictionaries(conn)
+
+        print(f"\n{n} listings")
+        for name, fields, serialize in [
+            ("jsonable_encoder", None, default_encoder),
+            ("response model", None, response_model),
+            ("orjson", None, orjson_response),
+            ("orjson, table", TABLE_FIELDS, orjson_response),
+        ]:
+            messages, query = timed(
+                lambda fields=fields: query_messages(conn, fields=fields)
+            )
+            body, dump = timed(
+                lambda serialize=serialize, messages=messages: serialize(messages)
+            )
+            print(
+                f"{name:<17} query {query:7.1f} ms  serialize {dump:7.1f} ms  "
+                f"payload {len(body) / 1024**2:6.2f} MiB"
+            )
+        conn.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,95 @@
+"""Time similarity searches over a large synthetic listings index.
+
+Compares the index's matrix-vector product with `np.argpartition` against
+computing every difference and sorting all distances.
+
+Run with `python benchmarks/bench_similarity.py [n_listings]`.
+"""
+
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from flattracker.similarity import SimilarityIndex
+
+PLACES = [
+    "Hinjewadi Phase 1",
+    "Hinjewadi Phase 2",
+    "Wakad",
+    "Baner",
+    "Megapolis Sunway",
+    "Megapolis Splendour",
+    "Blue Ridge",
+    "Life Republic",
+]
+
+
+def make_listings(n: int) -> list[tuple]:
+    rng = random.Random(0)
+    listings = []
+    for i in range(1, n + 1):
+        bhk = rng.randint(1, 3)
+        rent = rng.randint(8, 45) * 1000
+        place = rng.choice(PLACES)
+        furnished = rng.choice(["Furnished", "Semi-Furnished", "Unfurnished"])
+        gender = rng.choice(["Male", "Female", "Family", "Male/Female"])
+        text = (
+            f"{bhk} BHK {furnished} flat available in {place}. Rent {rent // 1000}k, "
+            f"deposit {rent * 3 // 1000}k. {gender} preferred. No brokerage."
+        )
+        details = {
+            "BHK": bhk,
+            "Rent": rent,
+            "Deposit": rent * 3,
+            "Furnished": furnished,
+            "Gender": gender,
+            "Address": place,
+        }
+        listings.append((i, text, details))
+    return listings
+
+
+def naive_similar(index: SimilarityIndex, id: int, k: int) -> list[int]:
+    matrix = index.matrix[: index.size]
+    distances = np.linalg.norm(matrix - matrix[index.rows[id]], axis=1)
+    distances[index.rows[id]] = np.inf
+    return [int(index.ids[i]) for i in np.argsort(distances)[:k]]
+
+
+def timed(fn, queries: list[int]) -> list[float]:
+    timings = []
+    for id in queries:
+        start = time.perf_counter()
+        fn(id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(n: int) -> None:
+    listings = make_listings(n)
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.add(listings)
+    build = time.perf_counter() - start
+    print(
+        f"indexed {n} listings in {build:.1f}s "
+        f"({n / build:,.0f}/s, {index.matrix.nbytes / 1024**2:.0f} MiB)"
+    )
+
+    queries = random.Random(1).sample(range(1, n + 1), 200)
+    for name, fn in [
+        ("index.similar", lambda id: index.similar(id, 10)),
+        ("diff + sort", lambda id: naive_similar(index, id, 10)),
+    ]:
+        timings = sorted(timed(fn, queries))
+        print(
+            f"{name:<14} p50 {statistics.median(timings):6.2f} ms  "
+            f"p99 {timings[int(len(timings) * 0.99)]:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,3 @@
+from flattracker.cli import main
+
+main()
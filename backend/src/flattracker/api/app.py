@@ -1,13 +1,37 @@
 import json
-import math
 import sqlite3
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any
 
-from fastapi import Depends, FastAPI
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
-from flattracker.config import DB_PATH
+from flattracker.api.queries import _columns, parse_fields, query_messages, to_messages
+from flattracker.compression import CODEC, load_dictionaries
+from flattracker.config import DB_PATH, METRICS_DB_PATH, SNAPSHOT_PATH
+from flattracker.metrics import METRICS
+from flattracker.models import Message, SimilarMessage
+from flattracker.similarity import SimilarityIndex
+from flattracker.snapshot import SnapshotReader
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # every API worker adds its metrics to those of the pipeline processes
+    METRICS.share(METRICS_DB_PATH)
+    yield
+    METRICS.flush()
+
+
+app = FastAPI(lifespan=lifespan)
+# features of the stored listings, loaded by the first similarity search and
+# extended with the listings stored since then by every later one
+SIMILARITY_INDEX = SimilarityIndex()
+# the unfiltered /messages response, written by the ingester after every batch
+SNAPSHOT = SnapshotReader(SNAPSHOT_PATH)
 
 
 # enable CORS
@@ -21,39 +45,154 @@ app.add_middleware(
 )
 
 
+class ORJSONResponse(JSONResponse):
+    """JSON encoded by orjson, without FastAPI's jsonable_encoder and validation
+
+    The listings are cleaned when they are written, so the response models
+    only document them. Same as fastapi.responses.ORJSONResponse, which newer
+    FastAPI versions deprecate.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+FIELDS = Query(
+    None,
+    description="comma separated message and detail keys to return, "
+    "e.g. id,time_created,BHK,Rent; all of them by default",
+)
+
+
+def check_fields(fields: str | None) -> None:
+    try:
+        parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+
 # manage database connection
-def get_db():
+def connect() -> sqlite3.Connection:
     conn = sqlite3.connect(DB_PATH)
+    load_dictionaries(conn)
+    return conn
+
+
+def get_db():
+    conn = connect()
     try:
         yield conn
     finally:
         conn.close()
 
 
-def sanitize_floats(value):
-    if isinstance(value, float):
-        if not math.isfinite(value):
-            return False
-    return True
-
-
-@app.get("/messages")
-def get_messages(db: sqlite3.Connection = Depends(get_db)):
-    print(f"DB_PATH: {DB_PATH}")
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM message_data ORDER BY date DESC;")
-    messages = [
-        {
-            "id": row[0],
-            "raw_text": row[1],
-            "time_created": row[2],
-            "author": row[3],
-            "details": json.loads(row[4]),
-        }
-        for row in cursor.fetchall()
-    ]
-    for msg in messages:
-        print(msg["details"])
-    messages = [msg for msg in messages if sanitize_floats(msg["details"]["BHK"])]
-    print(f"Returning object with length: {len(messages)}")
-    return messages
+@app.get("/messages", response_model=list[Message])
+def get_messages(
+    available_after: date | None = None,
+    available_before: date | None = None,
+    is_broker: bool | None = None,
+    fields: str | None = FIELDS,
+):
+    """listings, optionally only those available within the given dates (inclusive)
+    and only those of authors flagged, or not flagged, as brokers
+
+    Unfiltered requests for every field are served from the snapshot file
+    when there is one.
+    """
+    check_fields(fields)
+    filters = (available_after, available_before, is_broker)
+    with METRICS.span("api_messages"):
+        if fields is None and all(value is None for value in filters):
+            body = SNAPSHOT.read()
+            if body is not None:
+                METRICS.inc("api_snapshot_hits")
+                return Response(body, media_type="application/json")
+            METRICS.inc("api_snapshot_misses")
+
+        print(f"DB_PATH: {DB_PATH}")
+        db = connect()
+        try:
+            listings = query_messages(
+                db,
+                available_after=available_after,
+                available_before=available_before,
+                is_broker=is_broker,
+                fields=fields,
+            )
+            return ORJSONResponse(listings)
+        finally:
+            db.close()
+
+
+@app.get("/messages/archived", response_model=list[Message])
+def get_archived_messages(
+    fields: str | None = FIELDS, db: sqlite3.Connection = Depends(get_db)
+):
+    """listings moved out of the hot table by the retention policy"""
+    check_fields(fields)
+    with METRICS.span("api_messages_archived"):
+        messages = query_messages(db, table="message_data_archive", fields=fields)
+        return ORJSONResponse(messages)
+
+
+@app.get("/messages/{message_id}/similar", response_model=list[SimilarMessage])
+def get_similar_messages(
+    message_id: int,
+    k: int = Query(10, ge=1, le=100),
+    db: sqlite3.Connection = Depends(get_db),
+):
+    """the `k` listings most comparable to listing `message_id`, closest first"""
+    with METRICS.span("api_similar"):
+        _refresh_index(db)
+        if message_id not in SIMILARITY_INDEX:
+            raise HTTPException(status_code=404, detail="Listing not found")
+        while True:
+            try:
+                distances = dict(SIMILARITY_INDEX.similar(message_id, k))
+            except KeyError:
+                # removed by a concurrent request since the check above
+                raise HTTPException(status_code=404, detail="Listing not found")
+            ids = [message_id, *distances]
+            cursor = db.execute(
+                f"SELECT * FROM message_data WHERE id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+            found = {message["id"]: message for message in to_messages(cursor)}
+            if message_id not in found:
+                SIMILARITY_INDEX.remove([message_id])
+                raise HTTPException(status_code=404, detail="Listing not found")
+            # listings archived since they were indexed; the next closest ones
+            # take their places
+            removed = [id for id in distances if id not in found]
+            if not removed:
+                break
+            SIMILARITY_INDEX.remove(removed)
+        return ORJSONResponse(
+            [dict(found[id], distance=distance) for id, distance in distances.items()]
+        )
+
+
+def _refresh_index(db: sqlite3.Connection) -> None:
+    """index the listings stored or rewritten since the last refresh"""
+    # rewritten listings are those normalized again since they were indexed;
+    # databases from before the revision column have none
+    column = "revision" if "revision" in _columns(db, "message_data") else "NULL"
+    rows = db.execute(
+        f"SELECT id, raw_text, structured_data, {column} FROM message_data "
+        f"WHERE id > ? OR {column} > ? ORDER BY id",
+        (SIMILARITY_INDEX.max_id, SIMILARITY_INDEX.revision),
+    ).fetchall()
+    added = SIMILARITY_INDEX.add(
+        (id, CODEC.decode(text), json.loads(CODEC.decode(data)) if data else None)
+        for id, text, data, _ in rows
+    )
+    revisions = [revision for *_, revision in rows if revision is not None]
+    SIMILARITY_INDEX.revision = max([SIMILARITY_INDEX.revision, *revisions])
+    if added:
+        print(f"Indexed {added} listings for similarity search")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """the metrics of every ingest, backfill and API process"""
+    return METRICS.shared().render_prometheus()
@@ -0,0 +1,119 @@
+import json
+import sqlite3
+from datetime import date
+
+from flattracker.compression import CODEC
+from flattracker.schema import DATA_SCHEMA
+
+# keys of a message in the API and the columns they are read from
+MESSAGE_COLUMNS = {
+    "id": "id",
+    "raw_text": "raw_text",
+    "time_created": "date",
+    "author": "author",
+    "details": "structured_data",
+    "available_from": "available_from",
+}
+
+
+def parse_fields(fields: str | None) -> tuple[list[str], list[str] | None]:
+    """split a `fields` parameter such as "id,author,Rent,BHK" into message keys
+    and detail keys
+
+    Detail keys are None when every detail is wanted, either because `fields`
+    is empty or because it names "details" itself. Raises ValueError for
+    unknown names.
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if not names:
+        return list(MESSAGE_COLUMNS), None
+    unknown = [n for n in names if n not in MESSAGE_COLUMNS and n not in DATA_SCHEMA]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    keys = [key for key in MESSAGE_COLUMNS if key in names]
+    if "details" in names:
+        return keys, None
+    details = [name for name in names if name in DATA_SCHEMA]
+    if details:
+        keys.append("details")
+    return keys, details or None
+
+
+def query_messages(
+    db: sqlite3.Connection,
+    table: str = "message_data",
+    available_after: date | None = None,
+    available_before: date | None = None,
+    is_broker: bool | None = None,
+    fields: str | None = None,
+) -> list[dict]:
+    keys, details = parse_fields(fields)
+    # columns and tables added by later migrations of the database read as
+    # NULL and empty until DatabaseManager.initialize has run on it
+    columns = _columns(db, table)
+    if not columns:
+        return []
+    available = "available_from" if "available_from" in columns else "NULL"
+    # dates are stored as ISO strings and compare as dates. A window with
+    # both bounds is a range search of the available_from index followed by
+    # a sort on date; an open ended bound usually matches most rows, so SQLite
+    # walks the date index instead, which needs no sort
+    conditions, params = [], []
+    if available_after:
+        conditions.append(f"{available} >= ?")
+        params.append(available_after.isoformat())
+    if available_before:
+        conditions.append(f"{available} <= ?")
+        params.append(available_before.isoformat())
+    # probes of the author index with the (small) set of brokers
+    brokers = "author IN (SELECT author FROM author_stats WHERE is_broker)"
+    if not _columns(db, "author_stats"):
+        brokers = "0"
+    if is_broker is True:
+        conditions.append(brokers)
+    elif is_broker is False:
+        conditions.append(f"(author IS NULL OR NOT {brokers})")
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    # only the requested columns are read and decompressed
+    selected = ", ".join(
+        column if column in columns else f"NULL AS {column}"
+        for column in (MESSAGE_COLUMNS[key] for key in keys)
+    )
+    cursor = db.execute(
+        f"SELECT {selected} FROM {table} {where}ORDER BY date DESC;", params
+    )
+    messages = to_messages(cursor, details)
+    print(f"Returning object with length: {len(messages)}")
+    return messages
+
+
+def _columns(db: sqlite3.Connection, table: str) -> set[str]:
+    """columns of `table`, none if it does not exist"""
+    return {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+
+
+def to_messages(cursor: sqlite3.Cursor, details: list[str] | None = None) -> list[dict]:
+    """messages of the rows of a query over the columns in MESSAGE_COLUMNS
+
+    With `details`, only those detail keys are returned.
+    """
+    keys = {column: key for key, column in MESSAGE_COLUMNS.items()}
+    names = [keys.get(d[0]) for d in cursor.description]
+    decoders = {
+        "raw_text": CODEC.decode,
+        "details": lambda value: _details(value, details),
+    }
+    readers = [(i, name, decoders.get(name)) for i, name in enumerate(names) if name]
+    return [
+        {name: decode(row[i]) if decode else row[i] for i, name, decode in readers}
+        for row in cursor.fetchall()
+    ]
+
+
+def _details(value: str | bytes | None, keys: list[str] | None) -> dict | None:
+    if value is None:
+        return None
+    details = json.loads(CODEC.decode(value))
+    if keys is None:
+        return details
+    return {key: details.get(key) for key in keys}
@@ -0,0 +1,144 @@
+import bisect
+import io
+import json
+import re
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import zstandard
+
+from flattracker.tg_extractor import TGResult
+
+SEGMENT_PATTERN = "segment-{:06d}.jsonl.zst"
+# ranges of the message ids already archived for a channel
+INDEX_NAME = "archived_ids.json"
+
+
+class IdRanges:
+    """a set of message ids kept as sorted, disjoint, inclusive ranges
+
+    The ids of a channel's messages are nearly consecutive, so the ids of its
+    whole history fit in a few ranges.
+    """
+
+    def __init__(self, ranges: list[list[int]] | None = None) -> None:
+        self.ranges = ranges or []
+        self._starts = [start for start, _ in self.ranges]
+
+    def __contains__(self, id_: int) -> bool:
+        i = bisect.bisect_right(self._starts, id_) - 1
+        return i >= 0 and id_ <= self.ranges[i][1]
+
+    def add(self, ids: list[int]) -> None:
+        merged: list[list[int]] = []
+        for start, end in sorted(self.ranges + [[id_, id_] for id_ in ids]):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.ranges = merged
+        self._starts = [start for start, _ in merged]
+
+
+class RawArchive:
+    """Append-only archive of the raw messages fetched from Telegram.
+
+    Messages are stored as JSON lines in zstd compressed segments partitioned
+    by channel and month: `<root>/<channel>/<YYYY-MM>/segment-000001.jsonl.zst`.
+    Every write appends one zstd frame to the newest segment of a partition,
+    so nothing is ever rewritten, and a segment is closed once it grows past
+    `segment_bytes`. The ids already archived are kept next to the partitions,
+    so messages fetched again are not archived twice.
+    """
+
+    def __init__(
+        self, root: str | Path, segment_bytes: int = 64 * 1024**2, level: int = 10
+    ) -> None:
+        self.root = Path(root)
+        self.segment_bytes = segment_bytes
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def write(self, channel: str, messages: list[TGResult]) -> int:
+        """append the `messages` of `channel` that are not archived yet,
+        returning their number"""
+        archived = self.archived_ids(channel)
+        new: dict[int, TGResult] = {}
+        for message in messages:
+            if message["id"] not in archived:
+                new.setdefault(message["id"], message)
+        if not new:
+            return 0
+
+        partitions: dict[str, list[str]] = defaultdict(list)
+        for message in new.values():
+            record = dict(message, channel=channel)
+            line = json.dumps(record, default=lambda o: o.isoformat())
+            partitions[f"{message['date']:%Y-%m}"].append(line)
+
+        for month, lines in partitions.items():
+            segment = self._open_segment(channel, month)
+            frame = self.compressor.compress(("\n".join(lines) + "\n").encode())
+            with segment.open("ab") as f:
+                f.write(frame)
+        archived.add(list(new))
+        index = self.root / _safe_name(channel) / INDEX_NAME
+        partial = index.with_suffix(".tmp")
+        partial.write_text(json.dumps(archived.ranges))
+        partial.replace(index)
+        return len(new)
+
+    def archived_ids(self, channel: str) -> IdRanges:
+        """ids of the archived messages of `channel`
+
+        Read from the index, which is built from the segments of archives
+        written before it existed.
+        """
+        index = self.root / _safe_name(channel) / INDEX_NAME
+        if index.exists():
+            return IdRanges(json.loads(index.read_text()))
+        archived = IdRanges()
+        archived.add([message["id"] for message in self.iter_messages(channel)])
+        return archived
+
+    def _open_segment(self, channel: str, month: str) -> Path:
+        partition = self.root / _safe_name(channel) / month
+        partition.mkdir(parents=True, exist_ok=True)
+        segments = sorted(partition.glob("segment-*.jsonl.zst"))
+        if segments and segments[-1].stat().st_size < self.segment_bytes:
+            return segments[-1]
+        return partition / SEGMENT_PATTERN.format(len(segments) + 1)
+
+    def channels(self) -> list[str]:
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def iter_messages(
+        self, channel: str, since: str | None = None, until: str | None = None
+    ) -> Iterator[TGResult]:
+        """stream archived messages of `channel`, oldest month first
+
+        `since` and `until` are inclusive YYYY-MM bounds.
+        """
+        channel_dir = self.root / _safe_name(channel)
+        if not channel_dir.exists():
+            return
+        for partition in sorted(p for p in channel_dir.iterdir() if p.is_dir()):
+            if (since and partition.name < since) or (until and partition.name > until):
+                continue
+            for segment in sorted(partition.glob("segment-*.jsonl.zst")):
+                yield from _read_segment(segment)
+
+
+def _read_segment(segment: Path) -> Iterator[TGResult]:
+    decompressor = zstandard.ZstdDecompressor()
+    with segment.open("rb") as f:
+        reader = decompressor.stream_reader(f, read_across_frames=True)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            message = json.loads(line)
+            message["date"] = datetime.fromisoformat(message["date"])
+            yield message
+
+
+def _safe_name(channel: str) -> str:
+    return re.sub(r"[^\w.-]", "_", channel)
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from flattracker.config import BROKER_RULES
+from flattracker.models import to_int
+
+# brokerage answers that mean there is none
+NO_BROKERAGE = {"", "0", "no", "none", "nil", "na", "n/a", "false", "zero"}
+
+
+@dataclass
+class BrokerRules:
+    # posts are counted in tumbling windows of this many days
+    window_days: int = 7
+    # more posts than this within one window flag an author
+    max_posts_per_window: int = 10
+    # rates are only trusted once an author has posted this often
+    min_posts: int = 3
+    # share of an author's posts that were reposts of a stored listing
+    max_repost_rate: float = 0.5
+    # share of an author's listings asking for a nonzero brokerage
+    max_brokerage_share: float = 0.5
+
+
+def has_brokerage(details: dict | None) -> bool:
+    """True if a listing asks for a brokerage"""
+    value = (details or {}).get("Brokerage")
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    number = to_int(value)
+    if number is not None:
+        return number > 0
+    return str(value).strip().lower() not in NO_BROKERAGE
+
+
+def count_post(stats: Any, posted: datetime | None, rules: BrokerRules) -> None:
+    """count a listing or repost of `stats.author` in its window"""
+    # telegram dates are timezone aware, the stored ones are naive UTC
+    posted = (posted or datetime.now()).replace(tzinfo=None)
+    window = timedelta(days=rules.window_days)
+    if stats.window_start is None or posted >= stats.window_start + window:
+        stats.window_start = posted
+        stats.window_posts = 0
+    # reposts of old listings can arrive out of order; they count as the
+    # current window
+    stats.window_posts += 1
+    stats.max_window_posts = max(stats.max_window_posts or 0, stats.window_posts)
+    if stats.last_seen is None or posted > stats.last_seen:
+        stats.last_seen = posted
+
+
+def count_listing(
+    stats: Any, posted: datetime | None, details: dict | None, rules: BrokerRules
+) -> None:
+    """count a stored listing of `stats.author` and flag the author again"""
+    stats.listings += 1
+    stats.brokered += has_brokerage(details)
+    count_post(stats, posted, rules)
+    stats.is_broker = is_broker(stats, rules)
+
+
+def is_broker(stats: Any, rules: BrokerRules) -> bool:
+    """whether the counters of an author look like a broker flooding the group"""
+    if (stats.max_window_posts or 0) > rules.max_posts_per_window:
+        return True
+    posts = stats.listings + stats.reposts
+    if posts < rules.min_posts:
+        return False
+    if stats.reposts / posts > rules.max_repost_rate:
+        return True
+    return stats.listings > 0 and (
+        stats.brokered / stats.listings > rules.max_brokerage_share
+    )
+
+
+# the rules from config, shared by ingestion and the database
+DEFAULT_RULES = BrokerRules(**BROKER_RULES)
@@ -0,0 +1,127 @@
+import calendar
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+
+# the flat can be moved into as soon as the listing is posted
+IMMEDIATE = "immediate"
+
+MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+# dates without a year that lie further in the past are taken to be next year's
+PAST_TOLERANCE = timedelta(days=90)
+
+IMMEDIATE_PATTERN = re.compile(r"\b(immediate(ly)?|now|asap|ready to move)\b")
+ISO_PATTERN = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_PATTERN = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2}|\d{4}))?\b")
+MONTH_PATTERN = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?(?!\w)"
+)
+DAY_PATTERN = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\b")
+YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+ORDINAL_PATTERN = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b")
+
+
+class PartialDate(NamedTuple):
+    day: int
+    month: int | None
+    year: int | None
+
+
+@lru_cache(maxsize=4096)
+def parse_available_date(text: str) -> PartialDate | str | None:
+    """parse the LLM's AvailableDate into a partial date or IMMEDIATE
+
+    Only depends on `text`, so results are cached: listings repeat the same
+    few hundred strings.
+    """
+    text = text.lower().strip()
+    if not text:
+        return None
+    if IMMEDIATE_PATTERN.search(text):
+        return IMMEDIATE
+
+    if match := ISO_PATTERN.search(text):
+        return _partial(int(match[3]), int(match[2]), int(match[1]))
+    if match := NUMERIC_PATTERN.search(text):
+        day, month = int(match[1]), int(match[2])
+        year = int(match[3]) if match[3] else None
+        if year is not None and year < 100:
+            year += 2000
+        return _partial(day, month, year)
+
+    year_match = YEAR_PATTERN.search(text)
+    year = int(year_match[1]) if year_match else None
+    # drop the year so that it is not mistaken for a day
+    text = YEAR_PATTERN.sub(" ", text)
+    if match := MONTH_PATTERN.search(text):
+        month = MONTHS[match[1]]
+        if "mid" in text:
+            return _partial(15, month, year)
+        day_match = DAY_PATTERN.search(text)
+        return _partial(int(day_match[1]) if day_match else 1, month, year)
+    if match := ORDINAL_PATTERN.search(text):
+        return _partial(int(match[1]), None, None)
+    return None
+
+
+def _partial(day: int, month: int | None, year: int | None) -> PartialDate | None:
+    if not 1 <= day <= 31 or (month is not None and not 1 <= month <= 12):
+        return None
+    return PartialDate(day, month, year)
+
+
+def _build(year: int, month: int, day: int) -> date:
+    # clamp e.g. 31 April to the last day of the month
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def resolve_available_date(
+    text: str | list | None, posted: datetime | date | None
+) -> date | None:
+    """date from which a listing posted at `posted` is available
+
+    Missing months and years are filled in from the posting date, assuming
+    the date refers to the upcoming occurrence.
+    """
+    if isinstance(text, list):
+        text = " ".join(map(str, text))
+    if not isinstance(text, str):
+        return None
+    parsed = parse_available_date(text)
+    if parsed is None:
+        return None
+    if isinstance(posted, datetime):
+        posted = posted.date()
+    if isinstance(parsed, str):
+        return posted
+    if parsed.year is not None and parsed.month is not None:
+        return _build(parsed.year, parsed.month, parsed.day)
+    if posted is None:
+        return None
+
+    if parsed.month is None:
+        # a bare day is the next such day of the month
+        result = _build(posted.year, posted.month, parsed.day)
+        if result < posted:
+            month = posted.month % 12 + 1
+            result = _build(posted.year + (month == 1), month, parsed.day)
+        return result
+
+    result = _build(posted.year, parsed.month, parsed.day)
+    if result < posted - PAST_TOLERANCE:
+        result = _build(posted.year + 1, parsed.month, parsed.day)
+    return result
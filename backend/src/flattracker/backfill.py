@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from flattracker.populate_database import Orchestrator
+
+
+class BackfillProgress:
+    """print throughput and, when a date floor is known, an ETA"""
+
+    def __init__(self, date_floor: datetime | None = None) -> None:
+        self.date_floor = date_floor
+        self.start = time.perf_counter()
+        self.newest: datetime | None = None
+        self.pages = 0
+        self.messages = 0
+
+    def update(self, page_size: int, oldest_date: datetime) -> str:
+        self.pages += 1
+        self.messages += page_size
+        self.newest = self.newest or oldest_date
+        elapsed = time.perf_counter() - self.start
+        line = (
+            f"Backfill: {self.pages} pages, {self.messages} messages "
+            f"({self.messages / elapsed:.1f}/s), reached {oldest_date:%Y-%m-%d}"
+        )
+        if self.date_floor and self.newest > self.date_floor:
+            span = (self.newest - self.date_floor).total_seconds()
+            done = min(1.0, (self.newest - oldest_date).total_seconds() / span)
+            if done > 0:
+                eta = elapsed / done * (1 - done)
+                line += f", {done:.0%} done, ETA {eta / 60:.1f} min"
+        print(line)
+        return line
+
+
+class Backfiller:
+    """Import the history of a channel, newest to oldest.
+
+    Fetching, preprocessing, LLM extraction and storage run as concurrent
+    tasks connected through the job queue, so the next page is downloaded
+    while earlier ones are being extracted. The offset reached is saved after
+    every page and a later run resumes from it.
+    """
+
+    def __init__(
+        self,
+        orchestrator: Orchestrator,
+        page_size: int = 500,
+        date_floor: datetime | None = None,
+        extract_workers: int = 4,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.orc = orchestrator
+        self.page_size = page_size
+        self.date_floor = date_floor
+        self.extract_workers = extract_workers
+        self.poll_interval = poll_interval
+
+    async def run(self, resume: bool = True) -> int:
+        """backfill the channel, returning the number of listings stored"""
+        await self.orc.initialize()
+        stored_before = self.orc.stored_count
+
+        fetch = asyncio.create_task(self._fetch(resume))
+        preprocess = asyncio.create_task(self._stage(self.orc.preprocess_jobs, [fetch]))
+        extract = [
+            asyncio.create_task(self._stage(self.orc.extract_jobs, [preprocess]))
+            for _ in range(self.extract_workers)
+        ]
+        store = asyncio.create_task(self._stage(self.orc.store_jobs, extract))
+        tasks = [fetch, preprocess, *extract, store]
+        try:
+            with self.orc.llm_processor.usage_run(f"backfill {self.orc.channel}"):
+                await asyncio.gather(*tasks)
+        finally:
+            # on failure stop the other stages; unfinished jobs stay queued
+            for task in tasks:
+                task.cancel()
+
+        await self.orc.write_snapshot()
+        stored = self.orc.stored_count - stored_before
+        print(f"Backfill finished, stored {stored} listings")
+        print(f"Job counts: {self.orc.job_queue.counts()}")
+        return stored
+
+    async def _fetch(self, resume: bool) -> None:
+        queue = self.orc.job_queue
+        offset_id = queue.load_offset(self.orc.channel)[0] if resume else 0
+        if offset_id:
+            print(f"Resuming backfill of {self.orc.channel} before message {offset_id}")
+
+        progress = BackfillProgress(self.date_floor)
+        pages = self.orc.telegram_extractor.iter_pages(
+            page_size=self.page_size, offset_id=offset_id, min_date=self.date_floor
+        )
+        async for page, oldest_id, oldest_date in pages:
+            queue.enqueue(self.orc.channel, page)
+            queue.save_offset(self.orc.channel, oldest_id, oldest_date)
+            progress.update(len(page), oldest_date)
+
+    async def _stage(
+        self, step: Callable[[], Awaitable[int]], upstream: list[asyncio.Task]
+    ) -> None:
+        """run `step` until it finds no work after its upstream tasks finished"""
+        while True:
+            # checked before claiming so that work produced by an upstream task
+            # right before it finished is not missed
+            finished = all(task.done() for task in upstream)
+            if await step():
+                # let the other stages run between batches
+                await asyncio.sleep(0)
+            elif finished:
+                return
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+
+if __name__ == "__main__":
+    from flattracker.cli import main
+
+    main(["backfill", *sys.argv[1:]])
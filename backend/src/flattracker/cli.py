@@ -0,0 +1,212 @@
+"""Command line entry point: `flattracker <command>`.
+
+Only argparse and the light config modules are imported here; each command
+imports the pipeline, pandas or the web stack when it actually runs, so
+`flattracker --help` and argument errors return immediately.
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+from flattracker.config import GROUP_NAMES, METRICS_DB_PATH, RETENTION_DAYS
+from flattracker.job_queue import EXTRACTED, PREPROCESSED, STORED
+
+
+def _share_metrics() -> None:
+    from flattracker.metrics import METRICS
+
+    METRICS.share(METRICS_DB_PATH)
+
+
+def ingest(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from flattracker.populate_database import Orchestrator
+
+    _share_metrics()
+    if args.replay:
+        from flattracker.database_manager import DatabaseManager
+        from flattracker.job_queue import JobQueue
+
+        orc = Orchestrator(
+            channel=args.channel,
+            db_manager=DatabaseManager(f"sqlite+aiosqlite:///{args.replay}"),
+            job_queue=JobQueue(args.replay),
+        )
+        print(asyncio.run(orc.replay(since=args.since)))
+        return
+
+    orc = Orchestrator(channel=args.channel)
+    if args.worker:
+        asyncio.run(orc.work(args.worker))
+        return
+    print(asyncio.run(orc.run(args.batch_size, report_path=args.report)))
+
+
+def backfill(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from flattracker.backfill import Backfiller
+    from flattracker.populate_database import Orchestrator
+
+    _share_metrics()
+    backfiller = Backfiller(
+        Orchestrator(channel=args.channel),
+        page_size=args.page_size,
+        date_floor=args.since,
+        extract_workers=args.extract_workers,
+    )
+    asyncio.run(backfiller.run(resume=not args.restart))
+
+
+def archive(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from flattracker.config import DB_PATH, SNAPSHOT_PATH
+    from flattracker.database_manager import DatabaseManager
+    from flattracker.snapshot import write_snapshot
+
+    async def _archive() -> int:
+        db_manager = DatabaseManager()
+        await db_manager.initialize()
+        return await db_manager.archive_stale(args.days)
+
+    if asyncio.run(_archive()):
+        write_snapshot(DB_PATH, SNAPSHOT_PATH)
+
+
+def compress(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from flattracker.database_manager import DatabaseManager
+
+    async def _compress() -> int:
+        db_manager = DatabaseManager()
+        await db_manager.initialize()
+        return await db_manager.train_compression(args.dict_size)
+
+    asyncio.run(_compress())
+
+
+def authors(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from flattracker.database_manager import DatabaseManager
+
+    async def _authors() -> set[str]:
+        db_manager = DatabaseManager()
+        await db_manager.initialize()
+        await db_manager.rebuild_author_stats()
+        return await db_manager.brokers()
+
+    for author in sorted(asyncio.run(_authors())):
+        print(author)
+
+
+def normalize(args: argparse.Namespace) -> None:
+    from flattracker.config import DB_PATH, SNAPSHOT_PATH
+    from flattracker.data_normalization import renormalize
+
+    counts = renormalize(
+        DB_PATH, workers=args.workers, batch_size=args.batch_size, save=args.save
+    )
+    if args.save and (counts["changed"] or counts["excluded"]):
+        from flattracker.snapshot import write_snapshot
+
+        write_snapshot(DB_PATH, SNAPSHOT_PATH)
+
+
+def serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "flattracker.api.app:app",
+        host=args.host,
+        port=args.port,
+        reload=args.reload,
+        workers=args.workers,
+    )
+
+
+def _utc_date(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="flattracker", description="Telegram flat listings tracker"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("ingest", help="fetch and process the latest messages")
+    cmd.add_argument("--channel", default=GROUP_NAMES[0])
+    cmd.add_argument("--batch-size", type=int, default=50)
+    cmd.add_argument("--report", help="write the metrics of this run as JSON")
+    cmd.add_argument(
+        "--worker",
+        choices=[PREPROCESSED, EXTRACTED, STORED],
+        help="only run this stage of the job queue, polling for new jobs",
+    )
+    cmd.add_argument(
+        "--replay",
+        metavar="DB_PATH",
+        help="re-process the raw message archive into the database at DB_PATH",
+    )
+    cmd.add_argument("--since", help="first archive month to replay (YYYY-MM)")
+    cmd.set_defaults(func=ingest)
+
+    cmd = commands.add_parser("backfill", help="import the history of a channel")
+    cmd.add_argument("--channel", default=GROUP_NAMES[0])
+    cmd.add_argument("--page-size", type=int, default=500)
+    cmd.add_argument(
+        "--since", type=_utc_date, help="oldest date to import (YYYY-MM-DD)"
+    )
+    cmd.add_argument("--extract-workers", type=int, default=4)
+    cmd.add_argument("--restart", action="store_true", help="ignore the saved offset")
+    cmd.set_defaults(func=backfill)
+
+    cmd = commands.add_parser(
+        "archive", help="move listings not posted recently to the archive table"
+    )
+    cmd.add_argument("--days", type=int, default=RETENTION_DAYS)
+    cmd.set_defaults(func=archive)
+
+    cmd = commands.add_parser(
+        "compress", help="train a new compression dictionary and recompress listings"
+    )
+    cmd.add_argument("--dict-size", type=int, default=16 * 1024)
+    cmd.set_defaults(func=compress)
+
+    cmd = commands.add_parser(
+        "authors", help="recount the author stats and list the flagged brokers"
+    )
+    cmd.set_defaults(func=authors)
+
+    cmd = commands.add_parser("normalize", help="clean the stored listings")
+    cmd.add_argument(
+        "-s", "--save", action="store_true", help="write the result to the database"
+    )
+    cmd.add_argument(
+        "--workers", type=int, help="worker processes, one per core by default"
+    )
+    cmd.add_argument(
+        "--batch-size", type=int, default=1000, help="listings ids per worker task"
+    )
+    cmd.set_defaults(func=normalize)
+
+    cmd = commands.add_parser("serve", help="run the API server")
+    cmd.add_argument("--host", default="127.0.0.1")
+    cmd.add_argument("--port", type=int, default=8000)
+    cmd.add_argument("--reload", action="store_true")
+    cmd.add_argument("--workers", type=int, default=1)
+    cmd.set_defaults(func=serve)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
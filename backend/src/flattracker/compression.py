@@ -0,0 +1,159 @@
+import json
+import math
+import sqlite3
+import threading
+from typing import Any, overload
+
+import zstandard
+from sqlalchemy import String
+from sqlalchemy.types import TypeDecorator
+
+# size of the dictionaries trained on the stored listings
+DICT_SIZE = 16 * 1024
+
+
+class Codec:
+    """Compress short texts with zstd dictionaries trained on our listings.
+
+    Every frame records the id of the dictionary it was compressed with, so
+    values stay readable after a newer dictionary is trained, as long as the
+    old one was registered with `add`. Texts that do not get smaller are kept
+    as plain strings, which is also how rows written before compression was
+    introduced are read.
+    """
+
+    def __init__(self, level: int = 10) -> None:
+        self.level = level
+        self.dictionaries: dict[int, zstandard.ZstdCompressionDict] = {}
+        self.active: int | None = None
+        # zstd contexts must not be shared between threads, e.g. API workers
+        self._local = threading.local()
+
+    def add(self, dict_id: int, data: bytes) -> None:
+        if dict_id not in self.dictionaries:
+            self.dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+
+    def use(self, dict_id: int | None) -> None:
+        """compress new values with dictionary `dict_id`, or without one"""
+        if dict_id is not None and dict_id not in self.dictionaries:
+            raise LookupError(f"zstd dictionary {dict_id} is not loaded")
+        self.active = dict_id
+
+    def _contexts(self) -> dict:
+        if not hasattr(self._local, "contexts"):
+            self._local.contexts = {}
+        return self._local.contexts
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        contexts = self._contexts()
+        key = ("c", self.active)
+        if key not in contexts:
+            dictionary = self.dictionaries[self.active] if self.active else None
+            contexts[key] = zstandard.ZstdCompressor(
+                level=self.level, dict_data=dictionary
+            )
+        return contexts[key]
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        contexts = self._contexts()
+        key = ("d", dict_id)
+        if key not in contexts:
+            if dict_id and dict_id not in self.dictionaries:
+                raise LookupError(f"zstd dictionary {dict_id} is not loaded")
+            dictionary = self.dictionaries[dict_id] if dict_id else None
+            contexts[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return contexts[key]
+
+    def encode(self, text: str | None) -> str | bytes | None:
+        if not text:
+            return text
+        raw = text.encode()
+        compressed = self._compressor().compress(raw)
+        return compressed if len(compressed) < len(raw) else text
+
+    @overload
+    def decode(self, value: str | bytes) -> str: ...
+
+    @overload
+    def decode(self, value: None) -> None: ...
+
+    def decode(self, value: str | bytes | None) -> str | None:
+        if not isinstance(value, bytes):
+            return value
+        dict_id = zstandard.get_frame_parameters(value).dict_id
+        return self._decompressor(dict_id).decompress(value).decode()
+
+
+# shared by the column types, which have no reference to the database they
+# read from; DatabaseManager.initialize and the API load the dictionaries
+CODEC = Codec()
+
+
+def train_dictionary(samples: list[str], dict_size: int = DICT_SIZE):
+    """train a zstd dictionary, returning its id and content"""
+    dictionary = zstandard.train_dictionary(
+        dict_size, [s.encode() for s in samples if s]
+    )
+    return dictionary.dict_id(), dictionary.as_bytes()
+
+
+def load_dictionaries(conn: sqlite3.Connection) -> None:
+    """register the dictionaries of a database opened with sqlite3"""
+    try:
+        ids = conn.execute(
+            "SELECT dict_id FROM compression_dictionaries ORDER BY version"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # written before compression existed
+        CODEC.use(None)
+        return
+    for (dict_id,) in ids:
+        if dict_id not in CODEC.dictionaries:
+            (data,) = conn.execute(
+                "SELECT data FROM compression_dictionaries WHERE dict_id = ?",
+                (dict_id,),
+            ).fetchone()
+            CODEC.add(dict_id, data)
+    CODEC.use(ids[-1][0] if ids else None)
+
+
+class CompressedText(TypeDecorator):
+    """text column stored zstd compressed where that saves space"""
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return CODEC.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return CODEC.decode(value)
+
+
+def drop_non_finite(value: Any) -> Any:
+    """replace NaN and infinities, which are not valid JSON, with None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: drop_non_finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [drop_non_finite(v) for v in value]
+    return value
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON column stored zstd compressed where that saves space
+
+    NaN and infinities are stored as null, so readers never have to check.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return CODEC.encode(json.dumps(drop_non_finite(value), allow_nan=False))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else json.loads(CODEC.decode(value))
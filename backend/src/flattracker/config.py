@@ -1,4 +1,51 @@
 from pathlib import Path
+from typing import Any
 
 DB_PATH = Path(__file__).parent.parent.parent / "telegram_data.db"
 GROUP_NAMES = ["Megapolis_Hinjewadi_Pune"]
+# which messages are listings; used when ingesting and when cleaning the database
+MESSAGE_FILTER: dict[str, Any] = {
+    "exclude": ["changed", "lead", "external", "car rental"],
+    "exclude_words": [],
+    "include": [],
+    "min_length": 50,
+}
+# the ingestion job queue lives in the same SQLite database as the listings
+JOBS_DB_PATH = DB_PATH
+# counters and spans of the ingest, backfill and API processes are summed here
+# for the API's /metrics endpoint
+METRICS_DB_PATH = JOBS_DB_PATH
+# compressed archive of every raw message fetched from Telegram
+ARCHIVE_PATH = DB_PATH.parent / "archive"
+# pre-serialized /messages response, rewritten after every ingested batch
+SNAPSHOT_PATH = DB_PATH.parent / "messages_snapshot.json"
+# listings not (re)posted for this many days are moved to the archive table
+RETENTION_DAYS = 60
+# an author is flagged as a broker when any of these thresholds is exceeded,
+# see authors.BrokerRules
+BROKER_RULES: dict[str, Any] = {
+    "window_days": 7,
+    "max_posts_per_window": 10,
+    "min_posts": 3,
+    "max_repost_rate": 0.5,
+    "max_brokerage_share": 0.5,
+}
+# messages of these authors are skipped before LLM extraction
+BLOCKED_AUTHORS: list[str] = []
+# also skip the messages of authors flagged as brokers
+SKIP_BROKERS = False
+
+# OpenAI compatible endpoints tried by the LLM router, fastest healthy one first.
+# The api key of each endpoint is read from the environment variable `api_key_env`.
+LLM_ENDPOINTS: list[dict[str, Any]] = [
+    {
+        "name": "openrouter",
+        "base_url": "https://openrouter.ai/api/v1",
+        "api_key_env": "OPENAI_API_KEY",
+        "model": "google/gemma-3-27b-it:free",
+    },
+]
+# seconds to wait for an endpoint before hedging the request on the next one
+LLM_HEDGE_AFTER = 20.0
+# longer messages are truncated before being sent to the LLM
+LLM_MAX_MESSAGE_TOKENS = 1000
@@ -1,14 +1,31 @@
 import json
+import math
+import os
 import re
 import sqlite3
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable
 
-import pandas as pd
-
+from flattracker.authors import DEFAULT_RULES, count_listing, is_broker
+from flattracker.available_date import resolve_available_date
+from flattracker.compression import CODEC, drop_non_finite, load_dictionaries
 from flattracker.config import DB_PATH
+from flattracker.filters import DEFAULT_FILTER
+from flattracker.models import to_int
+from flattracker.schema import DATA_SCHEMA
+
+# pandas is only needed by `cleanse`, not by the workers of `renormalize`
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def map_bedroom(text: str) -> str:
+    if not isinstance(text, str):
+        return text
     mappa = {
         "non-master bedroom": "Non-master Bedroom",
         "master": "Master Bedroom",
@@ -22,7 +39,7 @@ def map_bedroom(text: str) -> str:
 
 
 def process_gender(text: str | list) -> list[str]:
-    if isinstance(text, list):
+    if not isinstance(text, str):
         return text
     # convert to title case
     text = text.title()
@@ -33,10 +50,12 @@ def process_gender(text: str | list) -> list[str]:
 
 
 def map_restrictions(text: str | list) -> list[str]:
+    if isinstance(text, str):
+        text = text.split(",")
     if not isinstance(text, list):
-        text_list = text.split(",")
+        return text
 
-    text_list: list[str] = list(map(str.strip, text))  # ignore no-redef
+    text_list: list[str] = [str(x).strip() for x in text]
     mappa = {
         "no smoking": "NO_SMOKING",
         "non smoker": "NO_SMOKING",
@@ -61,6 +80,8 @@ def map_restrictions(text: str | list) -> list[str]:
 
 
 def map_furnished(text: str) -> str:
+    if not isinstance(text, str):
+        return text
     text = text.replace("-", " ").replace(" ", "")
     mappa = {
         "semifurnished": "SEMI_FURNISHED",
@@ -74,6 +95,8 @@ def map_furnished(text: str) -> str:
 
 
 def process_available_date(text: str) -> str:
+    if not isinstance(text, str):
+        return text
     text = text.lower()
     text = re.sub(r"\bapr\b", "april", text)
     text = re.sub(r"(?<=\d)(th|st|rd|nd)", "", text)
@@ -89,66 +112,234 @@ def process_available_date(text: str) -> str:
 
 
 def process_address(text: str) -> str:
-    text = text.title()
-    text = text.replace("  ", " ")
-    return text
+    if not isinstance(text, str):
+        return text
+    return re.sub(r"\s+", " ", text.title()).strip()
 
 
 def process_contact_details(text: str) -> str:
+    if not isinstance(text, str):
+        return text
     if "ping" in text.lower():
         text = "DM"
     return text
 
 
-def cleanse(df: pd.DataFrame) -> pd.DataFrame:
-    df["Bedroom"] = df["Bedroom"].apply(map_bedroom)
-    df["Gender"] = df["Gender"].apply(process_gender)
-    df["Address"] = df["Address"].apply(process_address)
-    df["Rent"] = df["Rent"].apply(lambda x: 0 if not x else x)
-    df["Rent"] = df["Rent"]["astyp"](int)
-    df["Deposit"] = df["Deposit"].apply(lambda x: 0 if not x else x)
-    df["Deposit"] = df["Deposit"]["astyp"](int)
-    df["Restrictions"] = df["Restrictions"].apply(map_restrictions)
-    df["Furnished"] = df["Furnished"].apply(map_furnished)
-    df["Brokerage"] = df["Brokerage"].apply(lambda x: 0 if not x else x)
-    df["Brokerage"] = df["Brokerage"]["astyp"](int)
-    df["AvailableDate"] = df["AvailableDate"].apply(process_available_date)
-    df["ContactDetail"] = df["ContactDetail"].apply(process_contact_details)
+def amount(value: Any) -> int:
+    return to_int(value) or 0
+
+
+# normalization of each detail, shared by `cleanse` and `normalize_details`
+NORMALIZERS: dict[str, Callable[[Any], Any]] = {
+    "Bedroom": map_bedroom,
+    "Gender": process_gender,
+    "Address": process_address,
+    "Rent": amount,
+    "Deposit": amount,
+    "Restrictions": map_restrictions,
+    "Furnished": map_furnished,
+    "Brokerage": amount,
+    "AvailableDate": process_available_date,
+    "ContactDetail": process_contact_details,
+}
+
+
+def cleanse(df: "pd.DataFrame") -> "pd.DataFrame":
+    for column, normalize in NORMALIZERS.items():
+        df[column] = df[column].apply(normalize)
     return df
 
 
+def _missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def normalize_details(details: dict) -> dict:
+    """`cleanse` of a single listing, missing details become "" """
+    row = {key: "" for key in DATA_SCHEMA}
+    row.update({k: "" if _missing(v) else v for k, v in details.items()})
+    for key, normalize in NORMALIZERS.items():
+        row[key] = normalize(row[key])
+    return row
+
+
 def count_empty(obj: dict) -> int:
     res = [1 for x in obj.values() if not x]
     return sum(res)
 
 
-def main() -> None:
-    conn = sqlite3.connect(DB_PATH)
-    master_df = pd.read_sql_query("SELECT * FROM message_data;", conn)
-    conn.close()
+def _normalize_range(db_path: str, start: int, stop: int) -> tuple[list, list, int]:
+    """normalize the listings with ids in [start, stop), in a worker process
+
+    Returns the (structured_data, available_from, id) of the changed listings,
+    the ids of listings excluded by the ingestion filter and the number of
+    listings read.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        load_dictionaries(conn)
+        rows = conn.execute(
+            "SELECT id, raw_text, date, structured_data, available_from "
+            "FROM message_data WHERE id >= ? AND id < ? ORDER BY id",
+            (start, stop),
+        ).fetchall()
+    finally:
+        conn.close()
 
-    dicts = master_df["structured_data"].apply(lambda x: json.loads(x)).to_list()
-    df = pd.DataFrame(dicts)
-    df = df.fillna("")
-    df = cleanse(df)
-    cleaned_dicts = df.to_dict(orient="records")
-    master_df["structured_data"] = [json.dumps(x) for x in cleaned_dicts]
+    updates, excluded = [], []
+    for id, raw_text, posted, data, available_from in rows:
+        if DEFAULT_FILTER.is_excluded(CODEC.decode(raw_text) or ""):
+            excluded.append(id)
+            continue
+        details = json.loads(CODEC.decode(data)) if data else {}
+        # available_from is resolved from the LLM output when a listing is
+        # stored; normalizing drops the year from AvailableDate, so it is only
+        # resolved here for listings stored before the column existed
+        resolved = available_from
+        if resolved is None:
+            resolved_date = resolve_available_date(
+                details.get("AvailableDate"),
+                datetime.fromisoformat(posted) if posted else None,
+            )
+            resolved = resolved_date.isoformat() if resolved_date else None
+        normalized = drop_non_finite(normalize_details(details))
+        if normalized != details or resolved != available_from:
+            encoded = CODEC.encode(json.dumps(normalized, allow_nan=False))
+            updates.append((encoded, resolved, id))
+    return updates, excluded, len(rows)
 
-    # remove rows which have "car rental", "lead" and "external" in their `raw_text` column
-    mask = (
-        master_df["raw_text"]
-        .str.lower()
-        .str.contains("lead|car rental|external", regex=True)
-    )
-    filter_df = master_df[~(mask)]
 
-    # save to database only if "-s" flag is passed
-    if len(sys.argv) > 1 and sys.argv[1] == "-s":
-        import shutil
+def renormalize(
+    db_path: str | Path = DB_PATH,
+    workers: int | None = None,
+    batch_size: int = 1000,
+    save: bool = False,
+) -> dict[str, int]:
+    """normalize every listing again, e.g. after a change to the mappings above
 
-        print("SAVING")
-        shutil.copy("telegram_data.db", "telegram_data_backup_2.db")
-        conn = sqlite3.connect("telegram_data.db")
-        conn.execute("DELETE FROM message_data;")
-        filter_df.to_sql("message_data", conn, if_exists="append", index=False)
+    `message_data` is split into ranges of `batch_size` ids, normalized by a
+    pool of `workers` processes, one per core by default. The results are
+    written by this process only, one transaction per range, in id order, so
+    the output does not depend on the number of workers. The author stats
+    of the authors of excluded listings are counted again. Nothing is written
+    unless `save`.
+    """
+    from tqdm import tqdm  # type: ignore[import-untyped]
+
+    db_path = str(db_path)
+    workers = workers or os.cpu_count() or 1
+    conn = sqlite3.connect(db_path, timeout=30)
+    low, high = conn.execute("SELECT MIN(id), MAX(id) FROM message_data").fetchone()
+    total = conn.execute("SELECT COUNT(*) FROM message_data").fetchone()[0]
+    starts = list(range(low, high + 1, batch_size)) if total else []
+    counts = {"listings": 0, "changed": 0, "excluded": 0}
+    authors: set[str] = set()
+    try:
+        with ProcessPoolExecutor(workers) as pool, tqdm(total=total) as progress:
+            results = pool.map(
+                _normalize_range,
+                [db_path] * len(starts),
+                starts,
+                [start + batch_size for start in starts],
+            )
+            for updates, excluded, read in results:
+                if save:
+                    with conn:
+                        conn.executemany(
+                            "UPDATE message_data SET structured_data = ?, "
+                            "available_from = ?, revision = "
+                            "(SELECT COALESCE(MAX(revision), 0) + 1 FROM message_data) "
+                            "WHERE id = ?",
+                            updates,
+                        )
+                        authors.update(_authors(conn, excluded))
+                        conn.executemany(
+                            "DELETE FROM message_data WHERE id = ?",
+                            [(id,) for id in excluded],
+                        )
+                counts["listings"] += read
+                counts["changed"] += len(updates)
+                counts["excluded"] += len(excluded)
+                progress.update(read)
+        if authors:
+            with conn:
+                _recount_authors(conn, authors)
+    finally:
         conn.close()
+    action = "Saved" if save else "Found (not saved)"
+    print(
+        f"{action} {counts['changed']} changed and {counts['excluded']} excluded "
+        f"of {counts['listings']} listings"
+    )
+    return counts
+
+
+def _authors(conn: sqlite3.Connection, ids: list[int]) -> set[str]:
+    rows = conn.execute(
+        f"SELECT DISTINCT author FROM message_data "
+        f"WHERE id IN ({', '.join('?' * len(ids))}) AND author IS NOT NULL",
+        ids,
+    )
+    return {author for (author,) in rows if author}
+
+
+def _recount_authors(conn: sqlite3.Connection, authors: set[str]) -> None:
+    """count the listings of `authors` again, as rebuild_author_stats does, after
+    some of them were deleted"""
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    if "author_stats" not in tables:
+        return
+    sources = [t for t in ("message_data", "message_data_archive") if t in tables]
+    for author in sorted(authors):
+        row = conn.execute(
+            "SELECT reposts FROM author_stats WHERE author = ?", (author,)
+        ).fetchone()
+        if row is None:
+            continue
+        stats = SimpleNamespace(
+            listings=0,
+            reposts=row[0],
+            brokered=0,
+            window_start=None,
+            window_posts=0,
+            max_window_posts=0,
+            last_seen=None,
+            is_broker=False,
+        )
+        posts = []
+        for table in sources:
+            posts += conn.execute(
+                f"SELECT date, structured_data FROM {table} WHERE author = ?",
+                (author,),
+            ).fetchall()
+        for posted, data in sorted(posts, key=lambda post: post[0] or ""):
+            details = json.loads(CODEC.decode(data)) if data else None
+            posted = datetime.fromisoformat(posted) if posted else None
+            count_listing(stats, posted, details, DEFAULT_RULES)
+        stats.is_broker = is_broker(stats, DEFAULT_RULES)
+        conn.execute(
+            "UPDATE author_stats SET listings = ?, brokered = ?, window_start = ?, "
+            "window_posts = ?, max_window_posts = ?, last_seen = ?, is_broker = ? "
+            "WHERE author = ?",
+            (
+                stats.listings,
+                stats.brokered,
+                _sql_datetime(stats.window_start),
+                stats.window_posts,
+                stats.max_window_posts,
+                _sql_datetime(stats.last_seen),
+                stats.is_broker,
+                author,
+            ),
+        )
+
+
+def _sql_datetime(value: datetime | None) -> str | None:
+    # the format SQLAlchemy stores DateTime columns in
+    return value.isoformat(" ", "microseconds") if value else None
+
+
+if __name__ == "__main__":
+    from flattracker.cli import main
+
+    main(["normalize", *sys.argv[1:]])
@@ -1,63 +1,264 @@
-from datetime import datetime
-from typing import Any
+import json
+from datetime import date as date_type
+from datetime import datetime, timedelta, timezone
+from typing import Any, cast
 
-from sqlalchemy import JSON, DateTime, Integer, String, select, update
+from sqlalchemy import (
+    Boolean,
+    Date,
+    DateTime,
+    Integer,
+    LargeBinary,
+    String,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Connection, CursorResult
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from flattracker.authors import DEFAULT_RULES, count_listing, count_post, is_broker
+from flattracker.available_date import resolve_available_date
+from flattracker.compression import (
+    CODEC,
+    DICT_SIZE,
+    CompressedJSON,
+    CompressedText,
+    drop_non_finite,
+    train_dictionary,
+)
 from flattracker.config import DB_PATH
+from flattracker.job_queue import text_hash
+
+# `PRAGMA user_version` once the stored data has been cleaned up:
+# 1: NaN and infinite values of structured_data replaced with null
+DATA_VERSION = 1
 
 
 class Base(DeclarativeBase):
     pass
 
 
-class MessageData(Base):
-    __tablename__ = "message_data"
+class MessageColumns:
+    """columns shared by the hot listings table and its archive
+
+    Rows get a new id whenever they move between the two tables: SQLite reuses
+    the ids of deleted rows, so keeping them could collide.
+    """
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    raw_text: Mapped[str] = mapped_column(String, nullable=True)
-    date: Mapped[datetime] = mapped_column(DateTime, nullable=True)
-    author: Mapped[str] = mapped_column(String, nullable=True)
-    structured_data: Mapped[dict] = mapped_column(JSON, nullable=True)
+    raw_text: Mapped[str] = mapped_column(CompressedText, nullable=True)
+    date: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    author: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    structured_data: Mapped[dict] = mapped_column(CompressedJSON, nullable=True)
+    # telegram message the listing was extracted from
+    message_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    channel: Mapped[str] = mapped_column(String, nullable=True)
+    # AvailableDate resolved against `date`, for range queries
+    available_from: Mapped[date_type | None] = mapped_column(
+        Date, nullable=True, index=True
+    )
+    # sha256 of raw_text, to look up compressed texts
+    text_hash: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    # set above every earlier revision when structured_data is rewritten in
+    # place, so that copies such as the similarity index pick up the change
+    revision: Mapped[int] = mapped_column(Integer, nullable=True, index=True)
+
+
+class MessageData(MessageColumns, Base):
+    __tablename__ = "message_data"
+
+
+class ArchivedMessageData(MessageColumns, Base):
+    """listings not (re)posted within the retention period"""
+
+    __tablename__ = "message_data_archive"
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class AuthorStats(Base):
+    """listing counters per author, updated with every stored listing and repost"""
+
+    __tablename__ = "author_stats"
+
+    author: Mapped[str] = mapped_column(String, primary_key=True)
+    listings: Mapped[int] = mapped_column(Integer, default=0)
+    # cache hits that moved a stored listing to a newer date
+    reposts: Mapped[int] = mapped_column(Integer, default=0)
+    # listings asking for a nonzero brokerage
+    brokered: Mapped[int] = mapped_column(Integer, default=0)
+    # listings and reposts in the window starting at window_start
+    window_start: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    window_posts: Mapped[int] = mapped_column(Integer, default=0)
+    max_window_posts: Mapped[int] = mapped_column(Integer, default=0)
+    last_seen: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    is_broker: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
+
+
+def _new_author(author: str) -> AuthorStats:
+    return AuthorStats(
+        author=author,
+        listings=0,
+        reposts=0,
+        brokered=0,
+        window_posts=0,
+        max_window_posts=0,
+        is_broker=False,
+    )
+
+
+class CompressionDictionary(Base):
+    """zstd dictionaries for the compressed columns, the newest one is in use"""
+
+    __tablename__ = "compression_dictionaries"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    dict_id: Mapped[int] = mapped_column(Integer, unique=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+def _migrate(conn: Connection) -> set[str]:
+    """add columns and indexes that were added to the models after a table was created
+
+    Returns the added columns as `table.column`.
+    """
+    inspector = inspect(conn)
+    added = set()
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(conn.dialect)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                )
+                added.add(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    return added
+
+
+def _moved_columns() -> list[str]:
+    return [c.name for c in MessageData.__table__.columns if c.name != "id"]
 
 
 class DatabaseManager:
     def __init__(self, db_url=f"sqlite+aiosqlite:///{DB_PATH}") -> None:
         self.engine = create_async_engine(db_url)
         self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.broker_rules = DEFAULT_RULES
+        # number of writes that changed the listings, for copies of them such
+        # as the API snapshot
+        self.changes = 0
 
     async def initialize(self) -> None:
         """create tables if they don't exist"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            added = await conn.run_sync(_migrate)
+            version = (await conn.exec_driver_sql("PRAGMA user_version")).scalar() or 0
+        await self._load_dictionaries()
+        if version < DATA_VERSION:
+            await self._drop_non_finite()
+        if "message_data.text_hash" in added:
+            await self._hash_texts()
+        if "message_data.available_from" in added:
+            await self.resolve_available_dates()
+        if not await self._has_author_stats():
+            await self.rebuild_author_stats()
         print("Database initialized")
 
+    async def _load_dictionaries(self) -> None:
+        async with self.session_factory() as session:
+            statement = select(CompressionDictionary).order_by(
+                CompressionDictionary.version
+            )
+            dictionaries = (await session.execute(statement)).scalars().all()
+        for dictionary in dictionaries:
+            CODEC.add(dictionary.dict_id, dictionary.data)
+        CODEC.use(dictionaries[-1].dict_id if dictionaries else None)
+
+    async def _hash_texts(self) -> None:
+        async with self.session_factory() as session, session.begin():
+            for model in (MessageData, ArchivedMessageData):
+                statement = select(model.id, model.raw_text).where(
+                    model.text_hash.is_(None)
+                )
+                rows = [
+                    {"id": id, "text_hash": text_hash(raw_text or "")}
+                    for id, raw_text in await session.execute(statement)
+                ]
+                if rows:
+                    await session.execute(update(model), rows)
+
+    async def _drop_non_finite(self) -> None:
+        """rewrite listings stored with NaN or infinities before they were dropped"""
+        async with self.session_factory() as session, session.begin():
+            for model in (MessageData, ArchivedMessageData):
+                statement = select(model.id, model.structured_data)
+                latest = select(func.max(model.revision))
+                revision = ((await session.execute(latest)).scalar() or 0) + 1
+                rows = [
+                    {"id": id, "structured_data": data, "revision": revision}
+                    for id, data in await session.execute(statement)
+                    # NaN is not equal to itself
+                    if data is not None and drop_non_finite(data) != data
+                ]
+                if rows:
+                    await session.execute(update(model), rows)
+                    print(f"Dropped non-finite values of {len(rows)} listings")
+            await session.execute(text(f"PRAGMA user_version = {DATA_VERSION}"))
+
     async def store_messages(self, processed_data: list[dict]) -> None:
         """store processed messages in the database"""
+        stored = []
         async with self.session_factory() as session:
             async with session.begin():
                 for data in processed_data:
+                    original = data.get("original_message", {})
+                    available_from = resolve_available_date(
+                        data.get("AvailableDate"), original.get("date")
+                    )
                     message = MessageData(
-                        date=data.get("original_message", {}).get("date"),
-                        raw_text=data.get("original_message", {}).get("text", ""),
-                        author=data.get("original_message", {}).get("sender_name", ""),
+                        date=original.get("date"),
+                        raw_text=original.get("text", ""),
+                        text_hash=text_hash(original.get("text", "")),
+                        author=original.get("sender_name", ""),
+                        message_id=original.get("id"),
+                        channel=original.get("channel"),
+                        available_from=available_from,
                         structured_data={
                             k: v for k, v in data.items() if k != "original_message"
                         },
                     )
                     session.add(message)
+                    stored.append(message)
+                await self._count_posts(
+                    session, [(m.author, m.date, m.structured_data) for m in stored]
+                )
             await session.commit()
+        self.changes += bool(stored)
         print(f"Stored {len(processed_data)} messages in database")
 
     async def get_message_by_text(self, message: dict) -> dict | None:
         """retrieve message dict by raw text"""
         async with self.session_factory() as session:
             statement = select(MessageData).where(
-                MessageData.raw_text == message["text"]
+                MessageData.text_hash == text_hash(message["text"])
             )
-            result_obj = await session.execute(statement)
-            result = result_obj.scalar_one_or_none()
+            # a message with several listings is stored as several rows
+            statement = statement.order_by(MessageData.id)
+            result = (await session.execute(statement)).scalars().first()
+            if not result and await self._restore(session, message["text"]):
+                result = (await session.execute(statement)).scalars().first()
             if result:
                 val = result.structured_data
                 val["original_message"] = {
@@ -69,9 +270,212 @@ class DatabaseManager:
                 return val
             return None
 
+    async def resolve_available_dates(self) -> int:
+        """fill in `available_from` of listings stored before it existed"""
+        async with self.session_factory() as session, session.begin():
+            statement = select(MessageData).where(MessageData.available_from.is_(None))
+            updated = 0
+            for message in (await session.execute(statement)).scalars():
+                message.available_from = resolve_available_date(
+                    (message.structured_data or {}).get("AvailableDate"),
+                    message.date,
+                )
+                updated += message.available_from is not None
+        self.changes += bool(updated)
+        print(f"Resolved the available date of {updated} listings")
+        return updated
+
     async def update_record_timestamp(self, id: int, val: Any) -> None:
+        """move the date of listing `id` and the other listings of its message"""
         async with self.session_factory() as session:
-            statement = update(MessageData).where(MessageData.id == id).values(date=val)
-            result = await session.execute(statement)
+            same_text = select(MessageData.text_hash).where(MessageData.id == id)
+            statement = (
+                update(MessageData)
+                .where(MessageData.text_hash == same_text.scalar_subquery())
+                .values(date=val)
+            )
+            result = cast(CursorResult, await session.execute(statement))
+            # the listing was posted again, which counts as a repost of its author
+            author = await session.scalar(
+                select(MessageData.author).where(MessageData.id == id)
+            )
+            await self._count_posts(session, [(author, val, None)], repost=True)
             await session.commit()
-            print(f"Rows updated: {result.rowcount}")
+        self.changes += bool(result.rowcount)
+        print(f"Rows updated: {result.rowcount}")
+
+    async def _count_posts(
+        self,
+        session,
+        posts: list[tuple[str | None, datetime | None, dict | None]],
+        repost: bool = False,
+    ) -> None:
+        """add (author, date, structured_data) listings or reposts to the author stats"""
+        authors = {author for author, _, _ in posts if author}
+        if not authors:
+            return
+        statement = select(AuthorStats).where(AuthorStats.author.in_(authors))
+        stats = {s.author: s for s in (await session.execute(statement)).scalars()}
+        for author, posted, details in posts:
+            if not author:
+                continue
+            if author not in stats:
+                stats[author] = _new_author(author)
+                session.add(stats[author])
+            self._count_post(stats[author], posted, details, repost)
+
+    def _count_post(
+        self,
+        stats: AuthorStats,
+        posted: datetime | None,
+        details: dict | None,
+        repost: bool = False,
+    ) -> None:
+        if not repost:
+            count_listing(stats, posted, details, self.broker_rules)
+            return
+        stats.reposts += 1
+        count_post(stats, posted, self.broker_rules)
+        stats.is_broker = is_broker(stats, self.broker_rules)
+
+    async def _has_author_stats(self) -> bool:
+        async with self.session_factory() as session:
+            counted = await session.scalar(select(AuthorStats.author).limit(1))
+            stored = await session.scalar(select(MessageData.id).limit(1))
+        return counted is not None or stored is None
+
+    async def rebuild_author_stats(self) -> int:
+        """recount the author stats from the stored and archived listings
+
+        Reposts are only known from the moment they are counted, so they
+        are kept. Run after changing the broker rules. Returns the number of
+        brokers.
+        """
+        async with self.session_factory() as session, session.begin():
+            statement = select(AuthorStats.author, AuthorStats.reposts)
+            reposts = dict((await session.execute(statement)).all())
+            await session.execute(delete(AuthorStats))
+            stats: dict[str, AuthorStats] = {}
+            posts: list[Any] = []
+            for model in (MessageData, ArchivedMessageData):
+                statement = select(
+                    model.author, model.date, model.structured_data
+                ).where(model.author.is_not(None), model.author != "")
+                posts += (await session.execute(statement)).all()
+            for author, posted, details in sorted(
+                posts, key=lambda post: post[1] or datetime.min
+            ):
+                if author not in stats:
+                    stats[author] = _new_author(author)
+                    stats[author].reposts = reposts.pop(author, 0)
+                self._count_post(stats[author], posted, details)
+            # authors whose listings were all removed keep their reposts
+            for author, count in reposts.items():
+                stats[author] = _new_author(author)
+                stats[author].reposts = count
+                stats[author].is_broker = is_broker(stats[author], self.broker_rules)
+            session.add_all(stats.values())
+        brokers = sum(s.is_broker for s in stats.values())
+        print(f"Counted the listings of {len(stats)} authors, {brokers} brokers")
+        return brokers
+
+    async def brokers(self) -> set[str]:
+        """authors flagged as brokers"""
+        async with self.session_factory() as session:
+            statement = select(AuthorStats.author).where(AuthorStats.is_broker)
+            return set((await session.execute(statement)).scalars())
+
+    async def archive_stale(
+        self, max_age_days: int, now: datetime | None = None
+    ) -> int:
+        """move listings last posted more than `max_age_days` ago to the archive"""
+        # dates are stored as naive UTC
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = now - timedelta(days=max_age_days)
+        columns = _moved_columns()
+        async with self.session_factory() as session, session.begin():
+            stale = select(
+                *[MessageData.__table__.c[c] for c in columns],
+                literal(now, DateTime),
+            ).where(MessageData.date < cutoff)
+            await session.execute(
+                insert(ArchivedMessageData).from_select(
+                    [*columns, "archived_at"], stale
+                )
+            )
+            result = cast(
+                CursorResult,
+                await session.execute(
+                    delete(MessageData).where(MessageData.date < cutoff)
+                ),
+            )
+        self.changes += bool(result.rowcount)
+        print(f"Archived {result.rowcount} listings older than {cutoff:%Y-%m-%d}")
+        return result.rowcount
+
+    async def _restore(self, session, text: str) -> bool:
+        """move an archived listing back to the hot table, e.g. when it is reposted"""
+        archived = select(ArchivedMessageData.id).where(
+            ArchivedMessageData.text_hash == text_hash(text)
+        )
+        ids = (await session.execute(archived)).scalars().all()
+        if not ids:
+            return False
+        columns = _moved_columns()
+        await session.execute(
+            insert(MessageData).from_select(
+                columns,
+                select(*[ArchivedMessageData.__table__.c[c] for c in columns]).where(
+                    ArchivedMessageData.id.in_(ids)
+                ),
+            )
+        )
+        await session.execute(
+            delete(ArchivedMessageData).where(ArchivedMessageData.id.in_(ids))
+        )
+        await session.commit()
+        self.changes += 1
+        print(f"Restored {len(ids)} archived listings")
+        return True
+
+    async def train_compression(self, dict_size: int = DICT_SIZE) -> int:
+        """train a new zstd dictionary on the stored listings and recompress them
+
+        Returns the id of the new dictionary.
+        """
+        async with self.session_factory() as session:
+            statement = select(MessageData.raw_text, MessageData.structured_data)
+            rows = (await session.execute(statement)).all()
+        samples = [text for text, _ in rows]
+        samples += [json.dumps(data) for _, data in rows if data is not None]
+        dict_id, data = train_dictionary(samples, dict_size)
+
+        async with self.session_factory() as session, session.begin():
+            session.add(
+                CompressionDictionary(
+                    dict_id=dict_id, data=data, created_at=datetime.now()
+                )
+            )
+        CODEC.add(dict_id, data)
+        CODEC.use(dict_id)
+        recompressed = await self.recompress()
+        print(f"Trained dictionary {dict_id}, recompressed {recompressed} listings")
+        return dict_id
+
+    async def recompress(self) -> int:
+        """rewrite the compressed columns with the dictionary in use and vacuum"""
+        count = 0
+        async with self.session_factory() as session, session.begin():
+            for model in (MessageData, ArchivedMessageData):
+                statement = select(model.id, model.raw_text, model.structured_data)
+                rows = [
+                    {"id": id, "raw_text": raw_text, "structured_data": data}
+                    for id, raw_text, data in await session.execute(statement)
+                ]
+                if rows:
+                    await session.execute(update(model), rows)
+                count += len(rows)
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM")
+        return count
@@ -0,0 +1,106 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+from flattracker.config import MESSAGE_FILTER
+
+
+@dataclass
+class FilterRules:
+    # messages containing any of these, case-insensitively, are dropped
+    exclude: list[str] = field(default_factory=list)
+    # like `exclude` but only matched as whole words
+    exclude_words: list[str] = field(default_factory=list)
+    # when given, a message has to contain at least one of these
+    include: list[str] = field(default_factory=list)
+    # messages must be longer than this many characters
+    min_length: int = 0
+
+
+# with fewer keywords checking each with `in` is faster than any regex
+TRIE_MIN_KEYWORDS = 40
+
+
+def _trie(words: list[str]) -> str:
+    """an alternation of `words` that shares their common prefixes
+
+    At every position of the text the regex engine then follows the one branch
+    of the next character instead of trying each keyword in turn.
+    """
+    root: dict = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def alternation(node: dict) -> str:
+        branches = [re.escape(c) + alternation(n) for c, n in sorted(node.items()) if c]
+        if not branches:
+            return ""
+        if "" in node:
+            # the longer keyword is tried first, as the group is greedy
+            return f"(?:{'|'.join(branches)})?"
+        return branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+
+    return alternation(root)
+
+
+def _word_pattern(words: list[str]) -> re.Pattern | None:
+    if not words:
+        return None
+    return re.compile(rf"\b(?:{_trie([w.lower() for w in words])})\b")
+
+
+def _substring_matcher(keywords: list[str]) -> Callable[[str], bool]:
+    """a check whether a lowercased text contains any of `keywords`"""
+    keywords = [k.lower() for k in keywords]
+    if len(keywords) >= TRIE_MIN_KEYWORDS:
+        pattern = re.compile(_trie(keywords))
+        return lambda lowered: pattern.search(lowered) is not None
+
+    def contains(lowered: str) -> bool:
+        for keyword in keywords:
+            if keyword in lowered:
+                return True
+        return False
+
+    return contains
+
+
+class KeywordFilter:
+    """Apply FilterRules with a single lowercasing per message.
+
+    Long keyword lists are matched in one pass over the text by a regex shaped
+    like a trie of the keywords. Below TRIE_MIN_KEYWORDS a plain alternation or
+    the trie loses to checking each keyword with `in`, which runs at C speed,
+    so short lists are checked that way (see benchmarks/bench_filters.py).
+    """
+
+    def __init__(self, rules: FilterRules) -> None:
+        self.rules = rules
+        self.exclude = _substring_matcher(rules.exclude)
+        self.exclude_words = _word_pattern(rules.exclude_words)
+        self.include = _substring_matcher(rules.include) if rules.include else None
+
+    def _excludes(self, lowered: str) -> bool:
+        if self.exclude(lowered):
+            return True
+        return bool(self.exclude_words and self.exclude_words.search(lowered))
+
+    def is_excluded(self, text: str) -> bool:
+        """True if `text` contains an excluded keyword"""
+        return self._excludes(text.lower())
+
+    def accepts(self, text: str) -> bool:
+        """True if `text` passes the length, exclude and include rules"""
+        if len(text) <= self.rules.min_length:
+            return False
+        lowered = text.lower()
+        if self._excludes(lowered):
+            return False
+        return self.include is None or self.include(lowered)
+
+
+# the rules from config, shared by ingestion and the database cleanup
+DEFAULT_FILTER = KeywordFilter(FilterRules(**MESSAGE_FILTER))
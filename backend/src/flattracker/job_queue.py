@@ -0,0 +1,246 @@
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+# a job's stage is the last pipeline stage it completed
+FETCHED = "fetched"
+PREPROCESSED = "preprocessed"
+EXTRACTED = "extracted"
+STORED = "stored"
+# terminal stages for messages that are filtered out, duplicates or cache hits,
+# and for jobs that ran out of attempts
+SKIPPED = "skipped"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    text_hash TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (channel, message_id)
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_stage ON jobs (stage, lease_expires);
+CREATE INDEX IF NOT EXISTS ix_jobs_text_hash ON jobs (text_hash);
+CREATE TABLE IF NOT EXISTS backfill_state (
+    channel TEXT PRIMARY KEY,
+    offset_id INTEGER NOT NULL,
+    oldest_date TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=lambda o: o.isoformat())
+
+
+def _load_message(payload: str) -> dict:
+    message = json.loads(payload)
+    if isinstance(message.get("date"), str):
+        message["date"] = datetime.fromisoformat(message["date"])
+    return message
+
+
+@dataclass
+class Job:
+    id: int
+    channel: str
+    message_id: int
+    stage: str
+    message: dict
+    result: list[dict] | None
+    attempts: int
+
+
+class JobQueue:
+    """SQLite backed queue of messages moving through the ingestion stages.
+
+    Every message is a job that remembers the last stage it completed together
+    with the output of that stage, so paid LLM work survives a crash and a
+    restarted pipeline resumes where it left off. Workers claim jobs with a
+    time limited lease, which lets several processes share one database.
+    """
+
+    def __init__(
+        self, db_path: str | Path, lease_seconds: float = 300, max_attempts: int = 3
+    ) -> None:
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def enqueue(self, channel: str, messages: Sequence[Mapping[str, Any]]) -> int:
+        """add fetched messages, ignoring ones that are already queued"""
+        now = time.time()
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO jobs (channel, message_id, stage, payload, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(channel, m["id"], FETCHED, _dumps(m), now) for m in messages],
+        )
+        return cursor.rowcount
+
+    def claim(self, stage: str, worker: str, limit: int = 10) -> list[Job]:
+        """lease up to `limit` jobs that completed `stage`"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT id, channel, message_id, stage, payload, result, attempts "
+                "FROM jobs WHERE stage = ? AND (lease_expires IS NULL OR lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (stage, now, limit),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(worker, now + self.lease_seconds, row[0]) for row in rows],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return [
+            Job(
+                id=row[0],
+                channel=row[1],
+                message_id=row[2],
+                stage=row[3],
+                message=_load_message(row[4]),
+                result=json.loads(row[5]) if row[5] else None,
+                attempts=row[6] + 1,
+            )
+            for row in rows
+        ]
+
+    def advance(
+        self,
+        job: Job,
+        worker: str,
+        stage: str,
+        message: dict | None = None,
+        result: list[dict] | None = None,
+    ) -> bool:
+        """record that `job` completed `stage` and release its lease
+
+        Returns False if the lease was lost to another worker, in which case
+        nothing is written.
+        """
+        cursor = self.conn.execute(
+            "UPDATE jobs SET stage = ?, payload = COALESCE(?, payload), "
+            "result = COALESCE(?, result), text_hash = COALESCE(?, text_hash), "
+            "lease_owner = NULL, lease_expires = NULL, attempts = 0, error = NULL, "
+            "updated_at = ? WHERE id = ? AND lease_owner = ?",
+            (
+                stage,
+                _dumps(message) if message is not None else None,
+                _dumps(result) if result is not None else None,
+                text_hash(message["text"]) if message and message.get("text") else None,
+                time.time(),
+                job.id,
+                worker,
+            ),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, worker: str, error: Exception | str) -> None:
+        """release a job after an error; it is retried until `max_attempts`"""
+        stage = FAILED if job.attempts >= self.max_attempts else job.stage
+        self.conn.execute(
+            "UPDATE jobs SET stage = ?, error = ?, lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+            (stage, str(error), time.time(), job.id, worker),
+        )
+
+    def release(self, jobs: list[Job], worker: str) -> None:
+        """give up the leases `worker` still holds on `jobs`"""
+        self.conn.executemany(
+            "UPDATE jobs SET lease_owner = NULL, lease_expires = NULL "
+            "WHERE id = ? AND lease_owner = ?",
+            [(job.id, worker) for job in jobs],
+        )
+
+    def renew(self, jobs: list[Job], worker: str) -> set[int]:
+        """extend the leases `worker` still holds on `jobs`, returning their ids"""
+        if not jobs:
+            return set()
+        expires = time.time() + self.lease_seconds
+        ids = [job.id for job in jobs]
+        self.conn.executemany(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+            [(expires, id_, worker) for id_ in ids],
+        )
+        rows = self.conn.execute(
+            f"SELECT id FROM jobs WHERE lease_owner = ? "
+            f"AND id IN ({', '.join('?' * len(ids))})",
+            (worker, *ids),
+        )
+        return {row[0] for row in rows}
+
+    def is_duplicate(self, job: Job, hash_: str) -> bool:
+        """True if another job with the same text is waiting to be extracted or stored
+
+        Reposts of stored texts are not duplicates, they go on to the cache
+        check, which moves the stored listing's date forward.
+        """
+        row = self.conn.execute(
+            "SELECT 1 FROM jobs WHERE text_hash = ? AND id != ? AND stage IN (?, ?) "
+            "LIMIT 1",
+            (hash_, job.id, PREPROCESSED, EXTRACTED),
+        ).fetchone()
+        return row is not None
+
+    def purge_finished(self, max_age_days: float) -> int:
+        """delete stored and skipped jobs not touched for `max_age_days`
+
+        Failed jobs are kept, their payload and error are needed to retry them.
+        """
+        cursor = self.conn.execute(
+            "DELETE FROM jobs WHERE stage IN (?, ?) AND updated_at < ?",
+            (STORED, SKIPPED, time.time() - max_age_days * 86400),
+        )
+        return cursor.rowcount
+
+    def counts(self) -> dict[str, int]:
+        """number of jobs in every stage"""
+        rows = self.conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage")
+        return dict(rows.fetchall())
+
+    def save_offset(self, channel: str, offset_id: int, oldest_date: datetime) -> None:
+        """remember how far back the history of `channel` has been fetched"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO backfill_state VALUES (?, ?, ?, ?)",
+            (channel, offset_id, oldest_date.isoformat(), time.time()),
+        )
+
+    def load_offset(self, channel: str) -> tuple[int, datetime | None]:
+        """offset id and date to resume a backfill of `channel` from"""
+        row = self.conn.execute(
+            "SELECT offset_id, oldest_date FROM backfill_state WHERE channel = ?",
+            (channel,),
+        ).fetchone()
+        if not row:
+            return 0, None
+        return row[0], datetime.fromisoformat(row[1]) if row[1] else None
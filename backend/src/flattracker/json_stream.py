@@ -0,0 +1,107 @@
+import json
+import re
+from typing import Any
+
+_CLOSERS = {"{": "}", "[": "]"}
+_PY_LITERALS = {"None": "null", "True": "true", "False": "false"}
+
+
+class JSONStreamParser:
+    """Incrementally pull JSON values out of free-form LLM output.
+
+    Text can be fed in chunks as it arrives. Prose, markdown fences and other
+    text between values are skipped. Each top-level object or array is decoded
+    as soon as its closing bracket is seen, so a completion is scanned once.
+    Common model mistakes (trailing commas, Python literals) are repaired and a
+    value truncated by the token limit is closed off by `close`.
+    """
+
+    def __init__(self) -> None:
+        self._buffer: list[str] = []
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list[Any]:
+        """consume `chunk` and return the values completed by it"""
+        values = []
+        for char in chunk:
+            if not self._stack:
+                if char in _CLOSERS:
+                    self._stack.append(char)
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+            elif char in "}]":
+                if _CLOSERS[self._stack[-1]] != char:
+                    # unbalanced brackets, drop the value and resync
+                    self._reset()
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    value = loads_lenient("".join(self._buffer))
+                    if value is not None:
+                        values.append(value)
+                    self._reset()
+        return values
+
+    def close(self) -> list[Any]:
+        """finish the stream, closing a value that was cut off mid-way"""
+        if not self._stack:
+            return []
+        text = "".join(self._buffer)
+        if self._in_string:
+            text += '"'
+        # drop a dangling separator or a key that never got its value
+        text = re.sub(r'(,?\s*"(?:[^"\\]|\\.)*"\s*:|,)\s*$', "", text)
+        text += "".join(_CLOSERS[opener] for opener in reversed(self._stack))
+        self._reset()
+        value = loads_lenient(text)
+        return [] if value is None else [value]
+
+    def _reset(self) -> None:
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+
+def loads_lenient(text: str) -> Any | None:
+    """json.loads with a repair pass; None if the text is not recoverable"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_repair(text))
+    except json.JSONDecodeError:
+        return None
+
+
+def _repair(text: str) -> str:
+    """fix Python literals and trailing commas outside of string literals"""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    for i in range(0, len(parts), 2):
+        part = re.sub(
+            r"\b(None|True|False)\b", lambda m: _PY_LITERALS[m.group(1)], parts[i]
+        )
+        parts[i] = re.sub(r",(\s*[}\]])", r"\1", part)
+    return "".join(parts)
+
+
+def parse_json_values(text: str | None) -> list[Any]:
+    """return every JSON value found in `text`"""
+    parser = JSONStreamParser()
+    return parser.feed(text or "") + parser.close()
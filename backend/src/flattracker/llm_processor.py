@@ -1,80 +1,225 @@
-import json
 import os
-import re
+import time
+from contextlib import contextmanager
+from typing import Iterator
 
 from dotenv import load_dotenv
 from openai import OpenAI
+from pydantic import ValidationError
 from tqdm import tqdm
 
+from flattracker.config import LLM_ENDPOINTS, LLM_HEDGE_AFTER, LLM_MAX_MESSAGE_TOKENS
+from flattracker.json_stream import parse_json_values
+from flattracker.llm_router import Endpoint, LLMRouter
+from flattracker.metrics import METRICS
+from flattracker.models import LISTINGS_RESPONSE_FORMAT, Listing
+from flattracker.usage import UsageLog, completion_usage
+
 load_dotenv()
 
+DEFAULT_INSTRUCTIONS = "Extract structured information from the given message according to the provided schema."
+# rough size of a token, for truncating messages without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """cut `text` at a word boundary to roughly `max_tokens` tokens"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    METRICS.inc("messages_truncated")
+    cut = text.rfind(" ", 0, limit)
+    return text[: cut if cut > 0 else limit] + " …"
+
+
+def _validate_listing(candidate: dict) -> dict | None:
+    """the validated listing with the fields that fail validation left blank,
+    None if no field is valid"""
+    # extra keys are ignored, so without a schema key it would validate as
+    # an all blank listing
+    if not candidate.keys() & Listing.model_fields.keys():
+        return None
+    try:
+        return Listing.model_validate(candidate).model_dump()
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+    print(f"Blanking invalid fields {sorted(invalid)} of {candidate}")
+    METRICS.inc("llm_invalid_fields", len(invalid))
+    valid = {key: value for key, value in candidate.items() if key not in invalid}
+    if not valid:
+        return None
+    try:
+        return Listing.model_validate(valid).model_dump()
+    except ValidationError:
+        return None
+
 
 class LLMProcessor:
-    def __init__(self, api_key=os.getenv("OPENAI_API_KEY")) -> None:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        structured_outputs: bool = True,
+        router: LLMRouter | None = None,
+        usage_log: UsageLog | None = None,
+        max_message_tokens: int = LLM_MAX_MESSAGE_TOKENS,
+    ) -> None:
         print(f"Creating OpenAI client: {type(OpenAI)}")
-        self.client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
+        self.router = router or LLMRouter(
+            self._build_endpoints(api_key), hedge_after=LLM_HEDGE_AFTER
+        )
+        self.client = self.router.endpoints[0].client
+        # ask the provider for schema constrained JSON; providers without
+        # structured outputs fall back to the tolerant parser in `extract_json`
+        self.structured_outputs = structured_outputs
+        # where the tokens and latency of every call are persisted, if anywhere
+        self.usage_log = usage_log
+        self.max_message_tokens = max_message_tokens
+
+    def _build_endpoints(self, api_key: str | None) -> list[Endpoint]:
+        """create a client for every configured endpoint"""
+        endpoints = []
+        for i, config in enumerate(LLM_ENDPOINTS):
+            # an explicit api key overrides the environment for the primary endpoint
+            key = api_key if i == 0 and api_key else os.getenv(config["api_key_env"])
+            client = OpenAI(base_url=config["base_url"], api_key=key)
+            endpoints.append(
+                Endpoint(
+                    name=config["name"],
+                    client=client,
+                    model=config["model"],
+                    structured_outputs=config.get("structured_outputs", True),
+                )
+            )
+        return endpoints
+
+    @contextmanager
+    def usage_run(self, label: str) -> Iterator[None]:
+        """group the calls made inside the block into one run of the usage log"""
+        if not self.usage_log:
+            yield
+            return
+        self.usage_log.start_run(label)
+        try:
+            yield
+        finally:
+            self.usage_log.finish_run()
 
     def extract_structured_data(self, message: dict, schema: dict) -> str | None:
         """extract structured data from message using LLM"""
-        prompt = self._build_prompt(message, schema)
+        instructions = self._build_instructions(schema)
+        prompt = self._build_prompt(message)
 
         try:
-            output = self.infer_llm(prompt)
+            output = self.infer_llm(prompt, instructions)
             return output
         except Exception as e:
             print(f"Error processing message with LLM: {e}")
             raise
 
-    def infer_llm(self, prompt: str) -> str | None:
-        completion = self.client.chat.completions.create(
-            model="google/gemma-3-27b-it:free",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Extract structured information from the given message according to the provided schema.",
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-        )
-        print(completion)
+    def infer_llm(self, prompt: str, instructions: str | None = None) -> str | None:
+        """complete `prompt`; `instructions` go first in the system turn so that
+        providers can cache them across calls"""
+        kwargs = {}
+        if self.structured_outputs:
+            kwargs["response_format"] = LISTINGS_RESPONSE_FORMAT
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            with METRICS.span("llm_call"):
+                completion, endpoint = self.router.complete(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": instructions or DEFAULT_INSTRUCTIONS,
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt,
+                        },
+                    ],
+                    **kwargs,
+                )
+        except Exception as e:
+            if self.usage_log:
+                latency = time.perf_counter() - start
+                self.usage_log.record(None, None, started_at, latency, error=e)
+            raise
+        latency = time.perf_counter() - start
+        print(f"Completion from {endpoint.name}: {completion}")
+        usage = self._record_usage(completion)
+        if self.usage_log:
+            self.usage_log.record(
+                endpoint.name, endpoint.model, started_at, latency, usage
+            )
         try:
             return completion.choices[0].message.content
         except Exception as e:
             print(f"Exception occured: {e}")
             return None
 
-    def _build_prompt(self, message: dict, schema: dict) -> str:
+    def _record_usage(self, completion) -> dict[str, int | None]:
+        """add the token usage reported by the provider to the metrics"""
+        usage = completion_usage(completion)
+        for field, value in usage.items():
+            if value is not None:
+                METRICS.inc(f"llm_{field}", value)
+        return usage
+
+    def _build_instructions(self, schema: dict) -> str:
+        """the static part of the prompt, identical for every message"""
         schema_description = "\n".join(
             f"- {key}: {value}" for key, value in schema.items()
         )
-        return f"""Extract the following information from this message:
+        return f"""Extract the following information from the message:
 {schema_description}
-Return the information as JSON object. If the text doesn't contain any information, leave the value field blank.
+Return the information as a JSON object {{"listings": [...]}} with one object per listing in the message. If the text doesn't contain any information, leave the value field blank."""
 
-Message:
-Text: {message.get("text")}"""
+    def _build_prompt(self, message: dict) -> str:
+        """the per message part of the prompt"""
+        text = truncate_text(message.get("text") or "", self.max_message_tokens)
+        return f"""Message:
+Text: {text}"""
 
-    def extract_json(self, text: str | None) -> dict:
-        pat = re.compile(r"```json\s*\n([\s\S]*?)\n```")
-        matches = re.findall(pat, text or "")
-        try:
-            obj = json.loads(matches[0])
-        except Exception:
+    def extract_json(self, text: str | None) -> dict | list:
+        """return the first JSON value in the completion, fenced or not"""
+        with METRICS.span("json_parse"):
+            values = parse_json_values(text)
+        if not values:
             print(f"No JSON found in this: {text}")
-            obj = {}
+            METRICS.inc("llm_parse_failures")
+            return {}
+        return values[0]
+
+    def extract_listings(self, text: str | None) -> list[dict]:
+        """parse the completion into validated listings
+
+        Fields that fail validation are left blank, so one mistyped field does
+        not cost the rest of the listing. Listings without a valid field are
+        dropped.
+        """
+        obj = self.extract_json(text)
+        if isinstance(obj, dict) and isinstance(obj.get("listings"), list):
+            obj = obj["listings"]
+        candidates = obj if isinstance(obj, list) else [obj]
 
-        return obj
+        listings: list[dict] = []
+        for candidate in candidates:
+            if not isinstance(candidate, dict) or not candidate:
+                continue
+            listing = _validate_listing(candidate)
+            if listing is None:
+                print(f"Invalid listing {candidate}")
+                METRICS.inc("llm_validation_failures")
+                continue
+            listings.append(listing)
+        return listings
 
-    def batch_process(self, messages: list[dict], schema: dict) -> list[dict]:
-        """process a batch of messages"""
-        results: list[dict] = []
+    def batch_process(self, messages: list[dict], schema: dict) -> list[list[dict]]:
+        """process a batch of messages, returning the listings of each message"""
+        results: list[list[dict]] = []
         for message in tqdm(messages):
             result = self.extract_structured_data(message, schema)
-            result_json = self.extract_json(result)
-            results.append(result_json)
+            results.append(self.extract_listings(result))
 
         print(f"Processed {len(results)} messages with LLM")
         return results
@@ -0,0 +1,176 @@
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+
+from flattracker.metrics import METRICS
+
+
+@dataclass
+class Endpoint:
+    """an OpenAI compatible chat completions endpoint serving one model"""
+
+    name: str
+    client: Any
+    model: str
+    structured_outputs: bool = True
+
+
+@dataclass
+class EndpointStats:
+    """rolling latency and error rate of the last `window` requests"""
+
+    window: int = 20
+    latencies: deque = field(default_factory=deque)
+    outcomes: deque = field(default_factory=deque)
+    cooldown_until: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(maxlen=self.window)
+        self.outcomes = deque(maxlen=self.window)
+
+    def record(self, latency: float | None) -> None:
+        """record a request, `latency` is None if it failed"""
+        self.outcomes.append(latency is not None)
+        if latency is not None:
+            self.latencies.append(latency)
+
+    @property
+    def latency(self) -> float:
+        # untried endpoints rank first so that every endpoint gets measured
+        return statistics.median(self.latencies) if self.latencies else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class AllEndpointsFailed(Exception):
+    pass
+
+
+class LLMRouter:
+    """Send chat completions to the fastest healthy endpoint.
+
+    Endpoints are ranked by median latency. One whose error rate goes above
+    `max_error_rate` is benched for `cooldown` seconds. If the chosen endpoint
+    has not answered `hedge_after` seconds after the request was sent the same
+    request is also sent to the next endpoint and whichever answers first wins.
+    A failed request is retried on the next endpoint until every endpoint has
+    been tried. Requests run on a pool with room for every endpoint of
+    `concurrency` simultaneous callers.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        hedge_after: float | None = 20.0,
+        max_error_rate: float = 0.5,
+        cooldown: float = 60.0,
+        window: int = 20,
+        concurrency: int = 4,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.stats = {e.name: EndpointStats(window=window) for e in endpoints}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency * len(endpoints), thread_name_prefix="llm-router"
+        )
+
+    def ranked(self) -> list[Endpoint]:
+        """endpoints in the order they should be tried"""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(
+                self.endpoints,
+                key=lambda e: (
+                    self.stats[e.name].cooldown_until > now,
+                    self.stats[e.name].latency,
+                ),
+            )
+
+    def complete(self, **kwargs) -> tuple[Any, Endpoint]:
+        """create a chat completion, returning it with the endpoint that served it"""
+        candidates = self.ranked()
+        pending: dict[Future, Endpoint] = {}
+        last_error: Exception | None = None
+        # when the latest request was sent, empty while it waits for a thread
+        started: list[float] = []
+
+        def launch() -> None:
+            nonlocal started
+            endpoint = candidates.pop(0)
+            started = []
+            future = self._executor.submit(self._call, endpoint, kwargs, started)
+            pending[future] = endpoint
+
+        launch()
+        while pending:
+            hedge_at = None
+            if candidates and self.hedge_after is not None:
+                # the hedge timer starts when the request is sent, time spent
+                # queued behind the requests of other callers does not count
+                hedge_at = (
+                    started[0] if started else time.monotonic()
+                ) + self.hedge_after
+            timeout = (
+                None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            )
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # a request that was still queued when the timer was set gets
+                # its full `hedge_after` once it is sent
+                sent = started[0] if started else time.monotonic()
+                if time.monotonic() - sent >= (self.hedge_after or 0.0):
+                    METRICS.inc("llm_hedges")
+                    launch()
+                continue
+
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    return future.result(), endpoint
+                except Exception as e:
+                    print(f"LLM endpoint {endpoint.name} failed: {e}")
+                    last_error = e
+            if not pending and candidates:
+                METRICS.inc("llm_retries")
+                launch()
+
+        raise AllEndpointsFailed(f"every LLM endpoint failed: {last_error}")
+
+    def _call(self, endpoint: Endpoint, kwargs: dict, started: list[float]) -> Any:
+        started.append(time.monotonic())
+        if not endpoint.structured_outputs:
+            kwargs = {k: v for k, v in kwargs.items() if k != "response_format"}
+        start = time.perf_counter()
+        try:
+            completion = endpoint.client.chat.completions.create(
+                model=endpoint.model, **kwargs
+            )
+        except Exception:
+            METRICS.inc("llm_endpoint_errors")
+            self._record(endpoint, None)
+            raise
+        latency = time.perf_counter() - start
+        METRICS.observe(f"llm_endpoint_{endpoint.name}", latency)
+        self._record(endpoint, latency)
+        return completion
+
+    def _record(self, endpoint: Endpoint, latency: float | None) -> None:
+        with self._lock:
+            stats = self.stats[endpoint.name]
+            stats.record(latency)
+            # a success only lowers the error rate, it never benches an endpoint
+            if latency is None and stats.error_rate > self.max_error_rate:
+                stats.cooldown_until = time.monotonic() + self.cooldown
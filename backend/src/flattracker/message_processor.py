@@ -1,11 +1,14 @@
 import emoji
 
+from flattracker.filters import DEFAULT_FILTER, KeywordFilter
+from flattracker.metrics import METRICS
 from flattracker.tg_extractor import TGResult
 
 
 class MessageProcessor:
-    def __init__(self) -> None:
+    def __init__(self, keyword_filter: KeywordFilter = DEFAULT_FILTER) -> None:
         self.processed_count = 0
+        self.keyword_filter = keyword_filter
 
     def preprocess_message(self, message: TGResult) -> dict:
         """clean and normalize a single message"""
@@ -32,19 +35,20 @@ class MessageProcessor:
         return emoji.replace_emoji(text, "").strip()
 
     def filter_message(self, message: TGResult) -> bool:
-        flag1 = len(message["text"]) > 50
-        flag2 = "changed" not in message["text"].lower()
-        flag3 = "lead" not in message["text"].lower()
-        flag4 = "external" not in message["text"].lower()
-        return flag1 and flag2 and flag3 and flag4
+        return self.keyword_filter.accepts(message["text"])
 
     def batch_process(self, messages: list[TGResult]) -> list[dict]:
         """Process a batch of messages"""
-        processed_messages: list[dict] = [
-            self.preprocess_message(msg) for msg in messages if self.filter_message(msg)
-        ]
-        # remove duplicate messages
-        unique_dicts = list({d["text"]: d for d in processed_messages}.values())
+        with METRICS.span("preprocess"):
+            processed_messages: list[dict] = [
+                self.preprocess_message(msg)
+                for msg in messages
+                if self.filter_message(msg)
+            ]
+            # remove duplicate messages
+            unique_dicts = list({d["text"]: d for d in processed_messages}.values())
+        METRICS.inc("messages_filtered", len(messages) - len(processed_messages))
+        METRICS.inc("messages_duplicate", len(processed_messages) - len(unique_dicts))
         self.processed_count += len(unique_dicts)
         print(f"Processed {len(unique_dicts)} messages")
         return unique_dicts
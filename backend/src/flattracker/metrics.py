@@ -0,0 +1,242 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# upper bounds (seconds) of the latency buckets exposed for every span
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# the shared totals of every process: counters, span counts and span totals
+# have bucket -1, span buckets the index of their upper bound
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (kind, name, bucket)
+);
+"""
+
+
+class Metrics:
+    """In-process counters and timing spans for the ingestion pipeline.
+
+    Recording a value is a dict update under a lock, so the registry is cheap
+    enough to stay enabled in production. Once shared, what a process
+    recorded is added to a SQLite table every `flush_interval` seconds and
+    when it exits, so the API can expose the totals of the ingest, backfill
+    and API processes together.
+    """
+
+    def __init__(self, prefix: str = "flattracker") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.counters: dict[str, float] = defaultdict(float)
+        self.span_counts: dict[str, int] = defaultdict(int)
+        self.span_totals: dict[str, float] = defaultdict(float)
+        self.span_buckets: dict[str, list[int]] = {}
+        self.db_path: Path | None = None
+        self.flush_interval = 10.0
+        self._flush_lock = threading.Lock()
+        self._flushed: dict[tuple[str, str, int], float] = {}
+        self._last_flush = time.monotonic()
+
+    def share(self, db_path: str | Path, flush_interval: float = 10.0) -> "Metrics":
+        """add the metrics of this process to the totals kept in `db_path`"""
+        if self.db_path is None:
+            atexit.register(self.flush)
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval
+        return self
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """increment a counter"""
+        with self._lock:
+            self.counters[name] += value
+        self._maybe_flush()
+
+    def observe(self, name: str, seconds: float) -> None:
+        """record the duration of one occurrence of a stage"""
+        with self._lock:
+            self.span_counts[name] += 1
+            self.span_totals[name] += seconds
+            buckets = self.span_buckets.setdefault(name, [0] * len(BUCKETS))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+        self._maybe_flush()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """time the enclosed block as one occurrence of stage `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.span_counts.clear()
+            self.span_totals.clear()
+            self.span_buckets.clear()
+            self._flushed.clear()
+
+    def _state(self) -> dict[tuple[str, str, int], float]:
+        with self._lock:
+            state = {("counter", n, -1): v for n, v in self.counters.items()}
+            for name, count in self.span_counts.items():
+                state["span_count", name, -1] = count
+                state["span_total", name, -1] = self.span_totals[name]
+                for i, hits in enumerate(self.span_buckets[name]):
+                    state["span_bucket", name, i] = hits
+        return state
+
+    def _maybe_flush(self) -> None:
+        if self.db_path and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """add what was recorded since the last flush to the shared totals"""
+        if not self.db_path:
+            return
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            state = self._state()
+            deltas = [
+                (*key, value - self._flushed.get(key, 0))
+                for key, value in state.items()
+                if value != self._flushed.get(key, 0)
+            ]
+            if not deltas:
+                return
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                with conn:
+                    conn.executescript(SCHEMA)
+                    conn.executemany(
+                        "INSERT INTO metrics VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (kind, name, bucket) "
+                        "DO UPDATE SET value = value + excluded.value",
+                        deltas,
+                    )
+            finally:
+                conn.close()
+            self._flushed = state
+
+    def shared(self) -> "Metrics":
+        """the totals of every process sharing this one's database, or this
+        process's own metrics when it is not shared"""
+        if not self.db_path:
+            return self
+        self.flush()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executescript(SCHEMA)
+            rows = conn.execute(
+                "SELECT kind, name, bucket, value FROM metrics"
+            ).fetchall()
+        finally:
+            conn.close()
+        totals = Metrics(self.prefix)
+        for kind, name, bucket, value in rows:
+            if kind == "counter":
+                totals.counters[name] = value
+            elif kind == "span_count":
+                totals.span_counts[name] = int(value)
+            elif kind == "span_total":
+                totals.span_totals[name] = value
+            else:
+                buckets = totals.span_buckets.setdefault(name, [0] * len(BUCKETS))
+                buckets[bucket] = int(value)
+        for name in totals.span_counts:
+            totals.span_buckets.setdefault(name, [0] * len(BUCKETS))
+        return totals
+
+    def snapshot(self) -> dict:
+        """return a JSON serializable copy of all counters and spans"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "spans": {
+                    name: {
+                        "count": count,
+                        "total_seconds": self.span_totals[name],
+                        "mean_seconds": self.span_totals[name] / count,
+                    }
+                    for name, count in self.span_counts.items()
+                },
+            }
+
+    def write_report(self, path: str | Path, since: dict | None = None) -> dict:
+        """write the metrics of a run to `path` as JSON
+
+        If `since` is an earlier snapshot, only the difference is reported.
+        """
+        report = self.snapshot()
+        if since:
+            report = _diff(report, since)
+        report["generated_at"] = time.time()
+        Path(path).write_text(json.dumps(report, indent=2))
+        return report
+
+    def render_prometheus(self) -> str:
+        """render all metrics in the Prometheus text exposition format"""
+        lines: list[str] = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value:g}")
+
+            if self.span_counts:
+                metric = f"{self.prefix}_stage_duration_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+            for name, count in sorted(self.span_counts.items()):
+                cumulative = 0
+                for bound, hits in zip(BUCKETS, self.span_buckets[name]):
+                    cumulative += hits
+                    lines.append(
+                        f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+                lines.append(
+                    f'{metric}_sum{{stage="{name}"}} {self.span_totals[name]:.6f}'
+                )
+                lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _diff(current: dict, since: dict) -> dict:
+    counters = {
+        name: value - since["counters"].get(name, 0)
+        for name, value in current["counters"].items()
+    }
+    spans = {}
+    for name, span in current["spans"].items():
+        before = since["spans"].get(name, {"count": 0, "total_seconds": 0.0})
+        count = span["count"] - before["count"]
+        if not count:
+            continue
+        total = span["total_seconds"] - before["total_seconds"]
+        spans[name] = {
+            "count": count,
+            "total_seconds": total,
+            "mean_seconds": total / count,
+        }
+    return {
+        "counters": {k: v for k, v in counters.items() if v},
+        "spans": spans,
+    }
+
+
+# process wide registry used by the pipeline and the API
+METRICS = Metrics()
@@ -0,0 +1,117 @@
+import math
+import re
+from datetime import date
+from typing import Annotated, Any, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, create_model
+
+from flattracker.schema import DATA_SCHEMA
+
+
+def to_int(value: Any) -> int | None:
+    """coerce LLM output such as "20k", "6,500" or 2.0 into an integer"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        pattern = r"(?:rs\.?|₹)?\s*([\d,]*\.?\d+)\s*(k)?"
+        match = re.fullmatch(pattern, value.strip().lower())
+        if not match:
+            return None
+        number = float(match.group(1).replace(",", ""))
+        return int(number * 1000 if match.group(2) else number)
+    return None
+
+
+def _to_bool(value: Any) -> bool | None:
+    if isinstance(value, str):
+        return {"true": True, "yes": True, "false": False, "no": False}.get(
+            value.strip().lower()
+        )
+    return value if isinstance(value, bool) else None
+
+
+def _to_text(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+# python type of a field, chosen from the trailing "(type)" hint of its description
+_HINT_TYPES: dict[str, Any] = {
+    "integer": Annotated[Optional[int], BeforeValidator(to_int)],
+    "bool": Annotated[Optional[bool], BeforeValidator(_to_bool)],
+}
+_DEFAULT_TYPE = Annotated[str | list[str], BeforeValidator(_to_text)]
+
+
+def _field_type(description: str) -> Any:
+    hint = re.search(r"\(([^()]*)\)\s*$", description)
+    return _HINT_TYPES.get(hint.group(1).strip().lower() if hint else "", _DEFAULT_TYPE)
+
+
+def build_listing_model(schema: dict[str, str]) -> type[BaseModel]:
+    """create a pydantic model with one field per schema key"""
+    fields: dict[str, Any] = {}
+    for key, description in schema.items():
+        field_type = _field_type(description)
+        fields[key] = (field_type, "" if field_type is _DEFAULT_TYPE else None)
+    return create_model("Listing", __config__=ConfigDict(extra="ignore"), **fields)
+
+
+def _strict_schema(node: Any) -> Any:
+    """drop keywords that strict structured outputs reject"""
+    if isinstance(node, dict):
+        return {
+            k: _strict_schema(v)
+            for k, v in node.items()
+            if k not in ("title", "default")
+        }
+    if isinstance(node, list):
+        return [_strict_schema(x) for x in node]
+    return node
+
+
+def build_response_format(model: type[BaseModel]) -> dict:
+    """OpenAI `response_format` asking for {"listings": [<model>, ...]}"""
+    listing = _strict_schema(model.model_json_schema())
+    listing["required"] = list(listing["properties"])
+    listing["additionalProperties"] = False
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "listings",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"listings": {"type": "array", "items": listing}},
+                "required": ["listings"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+Listing = build_listing_model(DATA_SCHEMA)
+LISTINGS_RESPONSE_FORMAT = build_response_format(Listing)
+
+
+class Message(BaseModel):
+    """a stored listing as returned by the API
+
+    Every field is optional as the `fields` parameter can leave any out.
+    """
+
+    id: int | None = None
+    raw_text: str | None = None
+    time_created: str | None = None
+    author: str | None = None
+    details: Listing | None = None  # type: ignore[valid-type]
+    available_from: date | None = None
+
+
+class SimilarMessage(Message):
+    distance: float
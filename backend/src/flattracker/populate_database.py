@@ -1,25 +1,87 @@
 import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
 
-from flattracker.config import GROUP_NAMES
-from flattracker.database_manager import DatabaseManager
-from flattracker.llm_processor import LLMProcessor
-from flattracker.message_processor import MessageProcessor
+from flattracker.config import (
+    ARCHIVE_PATH,
+    BLOCKED_AUTHORS,
+    GROUP_NAMES,
+    JOBS_DB_PATH,
+    RETENTION_DAYS,
+    SKIP_BROKERS,
+    SNAPSHOT_PATH,
+)
+from flattracker.job_queue import (
+    EXTRACTED,
+    FETCHED,
+    PREPROCESSED,
+    SKIPPED,
+    STORED,
+    JobQueue,
+    text_hash,
+)
+from flattracker.metrics import METRICS
 from flattracker.schema import DATA_SCHEMA
-from flattracker.tg_extractor import TelegramExtractor
+
+# the pipeline components pull in telethon, openai, sqlalchemy, emoji and
+# zstandard, so they are only imported once an Orchestrator is created
+if TYPE_CHECKING:
+    from flattracker.archive import RawArchive
+    from flattracker.database_manager import DatabaseManager
+    from flattracker.llm_processor import LLMProcessor
+    from flattracker.tg_extractor import TGResult
 
 
 class Orchestrator:
-    def __init__(self) -> None:
-        self.telegram_extractor = TelegramExtractor(channel_name=GROUP_NAMES[0])
+    def __init__(
+        self,
+        channel: str = GROUP_NAMES[0],
+        db_manager: "DatabaseManager | None" = None,
+        llm_processor: "LLMProcessor | None" = None,
+        job_queue: JobQueue | None = None,
+        archive: "RawArchive | None" = None,
+        snapshot_path: Path | None = None,
+    ) -> None:
+        from flattracker.archive import RawArchive
+        from flattracker.database_manager import DatabaseManager
+        from flattracker.llm_processor import LLMProcessor
+        from flattracker.message_processor import MessageProcessor
+        from flattracker.tg_extractor import TelegramExtractor
+        from flattracker.usage import UsageLog
+
+        self.channel = channel
+        self.archive = archive or RawArchive(ARCHIVE_PATH)
+        self.telegram_extractor = TelegramExtractor(
+            channel_name=channel, archive=self.archive
+        )
         self.message_processor = MessageProcessor()
-        self.db_manager = DatabaseManager()
-        self.llm_processor = LLMProcessor()
+        self.db_manager = db_manager or DatabaseManager()
+        self.llm_processor = llm_processor or LLMProcessor(
+            usage_log=UsageLog(JOBS_DB_PATH)
+        )
+        self.job_queue = job_queue or JobQueue(JOBS_DB_PATH)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
         self.schema = DATA_SCHEMA
+        self.stored_count = 0
+        # messages of these authors never reach the LLM
+        self.blocked_authors = set(BLOCKED_AUTHORS)
+        self.skip_brokers = SKIP_BROKERS
+        # the API snapshot belongs to the default database
+        self.snapshot_path = snapshot_path or (
+            SNAPSHOT_PATH if not db_manager else None
+        )
+        # db_manager.changes when the snapshot was last written
+        self.snapshot_changes = 0
 
     async def cache_check(self, message: dict) -> bool:
         """Check if the message has already been stored in DB"""
-        cached_data = await self.db_manager.get_message_by_text(message)
+        with METRICS.span("cache_check"):
+            cached_data = await self.db_manager.get_message_by_text(message)
         if cached_data:
+            METRICS.inc("cache_hits")
             # if a cache hit happens, then update the date of the message with the latest one
             # convert both datetimes to offset naive i.e. without timezone information
             if cached_data["original_message"]["date"] < message["date"].replace(
@@ -31,59 +93,214 @@ class Orchestrator:
             sender_name = cached_data.get("original_message", {}).get("author", "")
             print(f"Cache hit. Sender name: {sender_name}")
             return False
+        METRICS.inc("cache_misses")
         return True
 
     async def initialize(self) -> None:
         """initialize all components"""
         await self.db_manager.initialize()
 
-    async def process_batch(self, batch_size: int = 50, offset_id: int = 0) -> int:
-        """Process a batch of messages end to end"""
+    async def fetch(self, batch_size: int = 50, offset_id: int = 0) -> int:
+        """Fetch a batch of messages from Telegram into the job queue"""
         raw_messages = await self.telegram_extractor.extract_messages(
             limit=batch_size, offset_id=offset_id
         )
+        queued = self.job_queue.enqueue(self.channel, raw_messages)
+        print(f"Queued {queued} new messages")
+        return queued
 
-        if not raw_messages:
-            print("No messages to process")
-            return 0
-
-        # preprocess messages
-        processed_messages = self.message_processor.batch_process(raw_messages)
+    async def preprocess_jobs(self, limit: int = 50) -> int:
+        """Clean fetched messages, skipping filtered ones and duplicates"""
+        jobs = self.job_queue.claim(FETCHED, self.worker_id, limit)
+        blocked = self.blocked_authors
+        if jobs and self.skip_brokers:
+            blocked = blocked | await self.db_manager.brokers()
+        with METRICS.span("preprocess"):
+            for job in jobs:
+                fetched = cast("TGResult", job.message)
+                if not self.message_processor.filter_message(fetched):
+                    METRICS.inc("messages_filtered")
+                    self.job_queue.advance(job, self.worker_id, SKIPPED)
+                    continue
+                message = self.message_processor.preprocess_message(fetched)
+                if message["sender_name"] in blocked:
+                    METRICS.inc("messages_blocked")
+                    self.job_queue.advance(job, self.worker_id, SKIPPED)
+                    continue
+                if self.job_queue.is_duplicate(job, text_hash(message["text"])):
+                    METRICS.inc("messages_duplicate")
+                    self.job_queue.advance(job, self.worker_id, SKIPPED)
+                    continue
+                self.job_queue.advance(job, self.worker_id, PREPROCESSED, message)
+        return len(jobs)
 
-        # cache check
-        cache_misses = [
-            message for message in processed_messages if await self.cache_check(message)
-        ]
+    async def extract_jobs(self, limit: int = 10) -> int:
+        """Run LLM extraction on cache misses, persisting each result as it arrives"""
+        from tqdm import tqdm  # type: ignore[import-untyped]
 
-        # structured data
-        structured_data = self.llm_processor.batch_process(cache_misses, self.schema)
+        jobs = self.job_queue.claim(PREPROCESSED, self.worker_id, limit)
+        try:
+            for i, job in enumerate(tqdm(jobs)):
+                # the leases of the claimed jobs run while the ones before them
+                # are extracted; jobs another worker took over are left to it
+                if job.id not in self.job_queue.renew(jobs[i:], self.worker_id):
+                    continue
+                try:
+                    if not await self.cache_check(job.message):
+                        self.job_queue.advance(job, self.worker_id, SKIPPED)
+                        continue
+                    try:
+                        # run the blocking LLM call in a thread so fetching and
+                        # other stages keep going while we wait
+                        output = await asyncio.to_thread(
+                            self.llm_processor.extract_structured_data,
+                            job.message,
+                            self.schema,
+                        )
+                    except Exception:
+                        METRICS.inc("llm_failures")
+                        raise
+                    listings = self.llm_processor.extract_listings(output)
+                except Exception as e:  # noqa: BLE001 - the job is failed, not the worker
+                    print(f"Extracting job {job.id} failed: {e!r}")
+                    self.job_queue.fail(job, self.worker_id, e)
+                    continue
+                self.job_queue.advance(job, self.worker_id, EXTRACTED, result=listings)
+        finally:
+            # jobs not finished, e.g. when the task is cancelled, go back to the queue
+            self.job_queue.release(jobs, self.worker_id)
+        return len(jobs)
 
-        # prepare final data for storage
+    async def store_jobs(self, limit: int = 50) -> int:
+        """Store the listings of extracted jobs"""
+        jobs = self.job_queue.claim(EXTRACTED, self.worker_id, limit)
         final_data = []
-        for i, data in enumerate(structured_data):
-            if isinstance(data, list):
-                for d in data:
-                    d["original_message"] = cache_misses[i]
-                    final_data.append(d)
-            else:
-                data["original_message"] = cache_misses[i]
-                final_data.append(data)
-
-        # store in database
-        await self.db_manager.store_messages(final_data)
-        return len(final_data)
-
-    async def run(self, batch_size: int = 10):
+        stored_jobs = []
+        try:
+            for job in jobs:
+                try:
+                    # a listing stored before a crash is not stored a second time
+                    stored = await self.db_manager.get_message_by_text(job.message)
+                except Exception as e:  # noqa: BLE001 - the job is failed, not the worker
+                    print(f"Storing job {job.id} failed: {e!r}")
+                    self.job_queue.fail(job, self.worker_id, e)
+                    continue
+                stored_jobs.append(job)
+                if stored:
+                    continue
+                for listing in job.result or []:
+                    listing["original_message"] = dict(job.message, channel=job.channel)
+                    final_data.append(listing)
+
+            # store in database
+            try:
+                with METRICS.span("db_write"):
+                    await self.db_manager.store_messages(final_data)
+            except Exception as e:  # noqa: BLE001 - the jobs are failed, not the worker
+                print(f"Storing {len(final_data)} listings failed: {e!r}")
+                for job in stored_jobs:
+                    self.job_queue.fail(job, self.worker_id, e)
+                return len(jobs)
+            for job in stored_jobs:
+                self.job_queue.advance(job, self.worker_id, STORED)
+        finally:
+            self.job_queue.release(jobs, self.worker_id)
+        METRICS.inc("messages_stored", len(final_data))
+        self.stored_count += len(final_data)
+        return len(jobs)
+
+    async def write_snapshot(self) -> None:
+        """regenerate the API's /messages snapshot if the listings changed
+
+        Called once the stages run out of work rather than after every
+        batch, since each call rewrites the snapshot of the whole table.
+        """
+        changes = self.db_manager.changes
+        database = self.db_manager.engine.url.database
+        if not self.snapshot_path or not database or changes == self.snapshot_changes:
+            return
+        from flattracker.snapshot import write_snapshot
+
+        with METRICS.span("snapshot_write"):
+            await asyncio.to_thread(write_snapshot, database, self.snapshot_path)
+        self.snapshot_changes = changes
+
+    async def drain(self) -> None:
+        """Move every claimable job through the remaining stages"""
+        while True:
+            claimed = await self.preprocess_jobs()
+            claimed += await self.extract_jobs()
+            claimed += await self.store_jobs()
+            if not claimed:
+                await self.write_snapshot()
+                return
+
+    async def work(self, stage: str, poll_interval: float = 5.0) -> None:
+        """Run one stage forever, e.g. as one of several extraction processes"""
+        steps = {
+            PREPROCESSED: self.preprocess_jobs,
+            EXTRACTED: self.extract_jobs,
+            STORED: self.store_jobs,
+        }
         await self.initialize()
-        a = await self.process_batch(batch_size)
-        return a
+        print(f"Worker {self.worker_id} running stage {stage}")
+        while True:
+            if not await steps[stage]():
+                await self.write_snapshot()
+                METRICS.flush()
+                await asyncio.sleep(poll_interval)
 
+    async def process_batch(self, batch_size: int = 50, offset_id: int = 0) -> int:
+        """Process a batch of messages end to end"""
+        stored_before = self.stored_count
+        await self.fetch(batch_size, offset_id)
+        # also finishes jobs left behind by an earlier run
+        await self.drain()
+        print(f"Job counts: {self.job_queue.counts()}")
+        return self.stored_count - stored_before
 
-async def main():
-    orc = Orchestrator()
-    ans = await orc.run(50)
-    print(ans)
+    async def replay(
+        self, since: str | None = None, until: str | None = None, batch_size: int = 500
+    ) -> int:
+        """Run archived messages of the channel through the pipeline, no Telegram
+
+        Point the orchestrator at a fresh database to re-extract the whole
+        archive after a change to the filters or to DATA_SCHEMA.
+        """
+        await self.initialize()
+        stored_before = self.stored_count
+        batch: list[TGResult] = []
+        with self.llm_processor.usage_run(f"replay {self.channel}"):
+            for message in self.archive.iter_messages(self.channel, since, until):
+                batch.append(message)
+                if len(batch) >= batch_size:
+                    self.job_queue.enqueue(self.channel, batch)
+                    await self.drain()
+                    batch = []
+            self.job_queue.enqueue(self.channel, batch)
+            await self.drain()
+        print(f"Job counts: {self.job_queue.counts()}")
+        return self.stored_count - stored_before
+
+    async def run(self, batch_size: int = 10, report_path: str | None = None):
+        """Process one batch, optionally writing the run's metrics to `report_path`"""
+        before = METRICS.snapshot()
+        await self.initialize()
+        with METRICS.span("run"), self.llm_processor.usage_run(
+            f"ingest {self.channel}"
+        ):
+            a = await self.process_batch(batch_size)
+            archived = await self.db_manager.archive_stale(RETENTION_DAYS)
+            await self.write_snapshot()
+            purged = self.job_queue.purge_finished(RETENTION_DAYS)
+        METRICS.inc("messages_archived", archived)
+        METRICS.inc("jobs_purged", purged)
+        if report_path:
+            METRICS.write_report(report_path, since=before)
+        return a
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    from flattracker.cli import main
+
+    main(["ingest", *sys.argv[1:]])
@@ -0,0 +1,226 @@
+import math
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import Any, Iterable
+
+import numpy as np
+
+from flattracker.models import to_int
+
+LOCALITY_BUCKETS = 32
+TEXT_BUCKETS = 64
+# how much each group of features contributes to the distance between listings
+WEIGHTS = {
+    "rent": 2.0,
+    "deposit": 0.5,
+    "bhk": 1.5,
+    "furnished": 0.5,
+    "gender": 1.0,
+    "locality": 1.5,
+    "text": 1.0,
+}
+# typical values, missing numbers count as these
+TYPICAL_RENT = 15000
+TYPICAL_DEPOSIT = 50000
+TYPICAL_BHK = 2
+FURNISHED = ["furnished", "semi", "unfurnished"]
+GENDERS = ["male", "female", "family"]
+# whole words, as "female" contains "male"
+GENDER_PATTERNS = [re.compile(rf"\b{name}\b") for name in GENDERS]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# offsets of the feature groups in a row of the matrix
+_SLICES: dict[str, slice] = {}
+_offset = 0
+for _name, _size in [
+    ("rent", 1),
+    ("deposit", 1),
+    ("bhk", 1),
+    ("furnished", len(FURNISHED)),
+    ("gender", len(GENDERS)),
+    ("locality", LOCALITY_BUCKETS),
+    ("text", TEXT_BUCKETS),
+]:
+    _SLICES[_name] = slice(_offset, _offset + _size)
+    _offset += _size
+DIMENSIONS = _offset
+
+
+def _number(value: Any) -> int | None:
+    return None if isinstance(value, bool) else to_int(value)
+
+
+def _log_ratio(value: Any, typical: float) -> float:
+    number = _number(value)
+    if not number or number < 0:
+        return 0.0
+    # rents are compared by ratio: 10k vs 20k is as far apart as 20k vs 40k
+    return math.log2(number / typical)
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, list):
+        return " ".join(map(str, value))
+    return value if isinstance(value, str) else ""
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(token: str, buckets: int) -> int:
+    # listings share most of their words, so hashing is memoized
+    return zlib.crc32(token.encode()) % buckets
+
+
+def _buckets(tokens: Iterable[str], buckets: int) -> list[int]:
+    return [_bucket(token, buckets) for token in tokens]
+
+
+def _ngrams(text: str) -> list[str]:
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _furnished(value: Any) -> int | None:
+    furnished = re.sub(r"[^a-z]", "", _text(value).lower())
+    if "semi" in furnished:
+        return 1
+    if furnished.startswith("un"):
+        return 2
+    if "furnished" in furnished:
+        return 0
+    return None
+
+
+def _weights() -> np.ndarray:
+    weights = np.zeros(DIMENSIONS, dtype=np.float32)
+    for name, weight in WEIGHTS.items():
+        weights[_SLICES[name]] = weight
+    return weights
+
+
+def listing_matrix(listings: list[tuple[str | None, dict | None]]) -> np.ndarray:
+    """weighted feature vectors of (raw_text, structured_data) listings
+
+    Similar listings are close in L2 distance. Only the parsing runs per
+    listing; the token counts, normalization and weighting are vectorized.
+    """
+    matrix = np.zeros((len(listings), DIMENSIONS), dtype=np.float32)
+    # (row, column) of every hashed token, counted with one np.add.at per group
+    locality: tuple[list[int], list[int]] = ([], [])
+    text: tuple[list[int], list[int]] = ([], [])
+    for i, (raw_text, details) in enumerate(listings):
+        details = details or {}
+        matrix[i, _SLICES["rent"].start] = _log_ratio(details.get("Rent"), TYPICAL_RENT)
+        matrix[i, _SLICES["deposit"].start] = _log_ratio(
+            details.get("Deposit"), TYPICAL_DEPOSIT
+        )
+        bhk = _number(details.get("BHK")) or TYPICAL_BHK
+        matrix[i, _SLICES["bhk"].start] = bhk - TYPICAL_BHK
+
+        furnished = _furnished(details.get("Furnished"))
+        if furnished is not None:
+            matrix[i, _SLICES["furnished"].start + furnished] = 1
+        gender = _text(details.get("Gender")).lower()
+        for j, pattern in enumerate(GENDER_PATTERNS):
+            if pattern.search(gender):
+                matrix[i, _SLICES["gender"].start + j] = 1
+
+        address = TOKEN_PATTERN.findall(_text(details.get("Address")).lower())
+        columns = _buckets(address, LOCALITY_BUCKETS)
+        locality[0].extend([i] * len(columns))
+        locality[1].extend(columns)
+        columns = _buckets(_ngrams(raw_text or ""), TEXT_BUCKETS)
+        text[0].extend([i] * len(columns))
+        text[1].extend(columns)
+
+    for name, (rows, columns) in [("locality", locality), ("text", text)]:
+        block = np.zeros((len(listings), _SLICES[name].stop - _SLICES[name].start))
+        np.add.at(block, (rows, columns), 1)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[:, _SLICES[name]] = block / np.where(norms > 0, norms, 1)
+    return matrix * _weights()
+
+
+def listing_features(raw_text: str | None, details: dict | None) -> np.ndarray:
+    """weighted feature vector of a single listing"""
+    return listing_matrix([(raw_text, details)])[0]
+
+
+class SimilarityIndex:
+    """In-memory feature matrix of the listings with a vectorized top-k search.
+
+    Rows are appended as listings are stored, growing the matrix by doubling,
+    and removed rows are only masked out. A search is one matrix-vector
+    product over all listings followed by `np.argpartition`.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.rows: dict[int, int] = {}
+        self.size = 0
+        self.max_id = 0
+        # highest `revision` of the indexed listings, see MessageData
+        self.revision = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.rows
+
+    def add(self, listings: Iterable[tuple[int, str | None, dict | None]]) -> int:
+        """add or replace (id, raw_text, structured_data) listings"""
+        listings = list(listings)
+        features = listing_matrix([(text, details) for _, text, details in listings])
+        with self.lock:
+            for (id, _, _), row in zip(listings, features):
+                index = self.rows.get(id)
+                if index is None:
+                    if self.size == len(self.ids):
+                        self._grow()
+                    index = self.size
+                    self.size += 1
+                    self.rows[id] = index
+                    self.ids[index] = id
+                self.matrix[index] = row
+                self.sq_norms[index] = row @ row
+                self.max_id = max(self.max_id, id)
+        return len(listings)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        with self.lock:
+            for id in ids:
+                index = self.rows.pop(id, None)
+                if index is not None:
+                    self.ids[index] = -1
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.ids)
+        self.matrix = np.resize(self.matrix, (capacity, DIMENSIONS))
+        self.sq_norms = np.resize(self.sq_norms, capacity)
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[: self.size] = self.ids[: self.size]
+        self.ids = ids
+
+    def similar(self, id: int, k: int = 10) -> list[tuple[int, float]]:
+        """the `k` listings closest to listing `id` as (id, distance), closest first"""
+        with self.lock:
+            query = self.matrix[self.rows[id]]
+            n = self.size
+            # squared distances without materializing the differences
+            distances = self.sq_norms[:n] - 2 * (self.matrix[:n] @ query)
+            distances += query @ query
+            distances[self.ids[:n] < 0] = np.inf
+            distances[self.rows[id]] = np.inf
+            ids = self.ids[:n]
+
+        k = min(k, len(self.rows) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(int(ids[i]), float(np.sqrt(max(distances[i], 0.0)))) for i in top]
@@ -0,0 +1,85 @@
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import orjson
+
+from flattracker.api.queries import query_messages
+from flattracker.compression import load_dictionaries
+
+
+def write_snapshot(db_path: str | Path, snapshot_path: str | Path) -> int:
+    """serialize the `/messages` response to `snapshot_path`, atomically
+
+    The file is written next to its destination and renamed over it, so
+    readers see either the old or the new snapshot, never a partial one.
+    Returns the number of listings written.
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        load_dictionaries(conn)
+        messages = query_messages(conn)
+    finally:
+        conn.close()
+    body = orjson.dumps(messages)
+
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=snapshot_path.parent, prefix=f".{snapshot_path.name}."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print(
+        f"Wrote snapshot of {len(messages)} listings ({len(body) / 1024:.0f} KiB) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return len(messages)
+
+
+class SnapshotReader:
+    """Memory-map the snapshot file and remap it when it is replaced.
+
+    Every API worker maps the same file, so they share one copy of it in the
+    page cache instead of each holding the parsed listings. Maps of replaced
+    snapshots stay valid until the responses using them are sent.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self._key: tuple | None = None
+        self._view: memoryview | None = None
+
+    def read(self) -> memoryview | None:
+        """the current snapshot, or None if there is none"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if key != self._key:
+                self._view = self._map() if stat.st_size else None
+                self._key = key
+            return self._view
+
+    def _map(self) -> memoryview | None:
+        try:
+            with open(self.path, "rb") as f:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            # replaced again between the stat and the open
+            return None
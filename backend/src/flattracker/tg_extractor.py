@@ -1,11 +1,17 @@
 import asyncio
 import os
-from typing import TypedDict
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, TypedDict
 
 from dotenv import load_dotenv
 from telethon import TelegramClient
 
 from flattracker.config import GROUP_NAMES
+from flattracker.metrics import METRICS
+
+if TYPE_CHECKING:
+    from flattracker.archive import RawArchive
 
 load_dotenv()
 
@@ -22,13 +28,17 @@ class TelegramExtractor:
     def __init__(
         self,
         channel_name: str,
+        archive: "RawArchive | None" = None,
     ) -> None:
         self.channel_name = channel_name
+        # every fetched message is also appended to the raw archive
+        self.archive = archive
 
     async def extract_messages(
         self, limit: int = 10, offset_id: int = 0
     ) -> list[TGResult]:
         results: list[TGResult] = []
+        start = time.perf_counter()
         try:
             async with TelegramClient(
                 "test",
@@ -41,20 +51,74 @@ class TelegramExtractor:
                 )
                 for message in messages:
                     if message.message:
-                        results.append(
-                            {
-                                "id": message.id,
-                                "date": message.date,
-                                "text": message.message,
-                                "sender_first_name": message.sender.first_name,
-                                "sender_last_name": message.sender.last_name,
-                            }
-                        )
+                        results.append(self._to_result(message))
                 print(f"Extracted {len(results)} messages")
+                METRICS.inc("messages_fetched", len(results))
+                self._archive(results)
                 return results
         except Exception as e:
             print(f"Error extracting messages: {e}")
+            METRICS.inc("telegram_fetch_errors")
             raise
+        finally:
+            METRICS.observe("telegram_fetch", time.perf_counter() - start)
+
+    async def iter_pages(
+        self,
+        page_size: int = 500,
+        offset_id: int = 0,
+        min_date: datetime | None = None,
+    ) -> AsyncIterator[tuple[list[TGResult], int, datetime]]:
+        """walk the channel history backwards from `offset_id` in pages
+
+        Yields the text messages of each page together with the id and date of
+        the oldest message seen so far; that id is the offset to resume from.
+        Stops at the first message older than `min_date`.
+        """
+        async with TelegramClient(
+            "test",
+            api_hash=os.getenv("API_HASH", ""),
+            api_id=os.getenv("API_ID"),  # type: ignore
+        ) as client:
+            channel_info = await client.get_entity(self.channel_name)
+            page: list[TGResult] = []
+            oldest_id, oldest_date = offset_id, None
+            yielded_id = offset_id
+            start = time.perf_counter()
+            async for message in client.iter_messages(
+                channel_info, offset_id=offset_id, wait_time=1
+            ):
+                if min_date and message.date < min_date:
+                    break
+                oldest_id, oldest_date = message.id, message.date
+                if message.message:
+                    page.append(self._to_result(message))
+                if len(page) >= page_size:
+                    METRICS.observe("telegram_fetch", time.perf_counter() - start)
+                    METRICS.inc("messages_fetched", len(page))
+                    self._archive(page)
+                    yield page, oldest_id, oldest_date
+                    page, yielded_id = [], oldest_id
+                    start = time.perf_counter()
+            if oldest_date and oldest_id != yielded_id:
+                METRICS.observe("telegram_fetch", time.perf_counter() - start)
+                METRICS.inc("messages_fetched", len(page))
+                self._archive(page)
+                yield page, oldest_id, oldest_date
+
+    def _archive(self, messages: list[TGResult]) -> None:
+        if self.archive and messages:
+            self.archive.write(self.channel_name, messages)
+
+    @staticmethod
+    def _to_result(message) -> TGResult:
+        return {
+            "id": message.id,
+            "date": message.date,
+            "text": message.message,
+            "sender_first_name": message.sender.first_name,
+            "sender_last_name": message.sender.last_name,
+        }
 
 
 async def main():
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_runs (
+    id INTEGER PRIMARY KEY,
+    label TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    calls INTEGER,
+    failures INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    llm_seconds REAL
+);
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES llm_runs (id),
+    endpoint TEXT,
+    model TEXT,
+    started_at REAL NOT NULL,
+    latency REAL NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_llm_calls_run_id ON llm_calls (run_id);
+"""
+
+
+# columns of llm_runs filled in by finish_run
+RUN_TOTALS = [
+    "calls",
+    "failures",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "llm_seconds",
+]
+
+
+def _int(value: Any) -> int | None:
+    return value if isinstance(value, int) else None
+
+
+def completion_usage(completion: Any) -> dict[str, int | None]:
+    """token counts reported with a chat completion, None where missing"""
+    usage = getattr(completion, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": _int(getattr(usage, "prompt_tokens", None)),
+        "completion_tokens": _int(getattr(usage, "completion_tokens", None)),
+        # prompt tokens served from the provider's prefix cache
+        "cached_tokens": _int(getattr(details, "cached_tokens", None)),
+    }
+
+
+class UsageLog:
+    """Persist the tokens and latency of every LLM call, grouped into runs.
+
+    Calls are recorded from the extraction worker threads, so the connection
+    is shared behind a lock. `finish_run` stores the totals of the current
+    run in `llm_runs` for cost and throughput tracking.
+    """
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.conn = sqlite3.connect(
+            db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.run_id: int | None = None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def start_run(self, label: str | None = None) -> int | None:
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO llm_runs (label, started_at) VALUES (?, ?)",
+                (label, time.time()),
+            )
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def record(
+        self,
+        endpoint: str | None,
+        model: str | None,
+        started_at: float,
+        latency: float,
+        usage: dict[str, int | None] | None = None,
+        error: Exception | str | None = None,
+    ) -> None:
+        usage = usage or {}
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO llm_calls (run_id, endpoint, model, started_at, latency, "
+                "prompt_tokens, completion_tokens, cached_tokens, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.run_id,
+                    endpoint,
+                    model,
+                    started_at,
+                    latency,
+                    usage.get("prompt_tokens"),
+                    usage.get("completion_tokens"),
+                    usage.get("cached_tokens"),
+                    str(error) if error is not None else None,
+                ),
+            )
+
+    def finish_run(self) -> dict[str, Any]:
+        """store and return the totals of the current run"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*), COUNT(error), COALESCE(SUM(prompt_tokens), 0), "
+                "COALESCE(SUM(completion_tokens), 0), COALESCE(SUM(cached_tokens), 0), "
+                "COALESCE(SUM(latency), 0) FROM llm_calls WHERE run_id = ?",
+                (self.run_id,),
+            ).fetchone()
+            totals = dict(zip(RUN_TOTALS, row))
+            self.conn.execute(
+                "UPDATE llm_runs SET finished_at = ?, calls = ?, failures = ?, "
+                "prompt_tokens = ?, completion_tokens = ?, cached_tokens = ?, "
+                "llm_seconds = ? WHERE id = ?",
+                (time.time(), *row, self.run_id),
+            )
+            self.run_id = None
+        cached = totals["cached_tokens"] / max(totals["prompt_tokens"], 1)
+        print(
+            f"LLM usage: {totals['calls']} calls, {totals['prompt_tokens']} prompt "
+            f"tokens ({cached:.0%} cached), {totals['completion_tokens']} completion "
+            f"tokens, {totals['llm_seconds']:.1f}s"
+        )
+        return totals
@@ -0,0 +1,75 @@
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+import pytest_asyncio
+
+from flattracker.database_manager import DatabaseManager
+from flattracker.job_queue import JobQueue
+from flattracker.llm_processor import LLMProcessor
+from flattracker.llm_router import Endpoint, LLMRouter
+from flattracker.populate_database import Orchestrator
+
+
+@pytest.fixture
+def make_listing():
+    """factory of extracted listings together with the message they came from"""
+
+    def make(
+        text: str, date: datetime = datetime(2025, 4, 1), author="Owner", **details
+    ) -> dict:
+        return {
+            "BHK": 2,
+            "Rent": 20000,
+            **details,
+            "original_message": {"text": text, "date": date, "sender_name": author},
+        }
+
+    return make
+
+
+@pytest.fixture
+def make_message():
+    """factory of telegram messages as returned by the extractor"""
+
+    def make(i: int, text: str, sender="Owner", date: datetime | None = None) -> dict:
+        return {
+            "id": i,
+            "date": date or datetime(2025, 3, 19, 8, i),
+            "text": text,
+            "sender_first_name": sender,
+            "sender_last_name": None,
+        }
+
+    return make
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "data.db"
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_path):
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    yield manager
+    await manager.engine.dispose()
+
+
+@pytest.fixture
+def make_orchestrator(db_manager, tmp_path):
+    """factory of orchestrators sharing `db_manager` and a job queue, with a
+    fake LLM endpoint"""
+
+    def make(**kwargs) -> Orchestrator:
+        router = LLMRouter([Endpoint("fake", client=Mock(), model="fake")])
+        defaults = {
+            "channel": "test_channel",
+            "db_manager": db_manager,
+            "llm_processor": LLMProcessor(api_key="test", router=router),
+            "job_queue": JobQueue(tmp_path / "jobs.db"),
+        }
+        return Orchestrator(**{**defaults, **kwargs})
+
+    return make
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from flattracker.archive import INDEX_NAME, RawArchive
+from flattracker.job_queue import SKIPPED, STORED
+
+
+@pytest.fixture
+def message(make_message):
+    """factory of listing messages posted in `month` of 2025"""
+
+    def make(i, month, text=None):
+        text = text or f"2 BHK flat in Hinjewadi phase {i}, rent {i}k, call the owner"
+        date = datetime(2025, month, 1 + i % 28, 9, 30, tzinfo=timezone.utc)
+        return make_message(i, text, date=date)
+
+    return make
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return RawArchive(tmp_path / "archive")
+
+
+def test_roundtrip_partitioned_by_month(archive, message):
+    messages = [message(1, 3), message(2, 4), message(3, 3)]
+    archive.write("Some Channel", messages)
+
+    partitions = sorted(
+        p.relative_to(archive.root).as_posix()
+        for p in archive.root.rglob("*.jsonl.zst")
+    )
+    assert partitions == [
+        "Some_Channel/2025-03/segment-000001.jsonl.zst",
+        "Some_Channel/2025-04/segment-000001.jsonl.zst",
+    ]
+    restored = list(archive.iter_messages("Some Channel"))
+    assert [m["id"] for m in restored] == [1, 3, 2]
+    assert restored[0]["date"] == messages[0]["date"]
+    assert restored[0]["channel"] == "Some Channel"
+
+
+def test_appends_and_rotates_segments(tmp_path, message):
+    archive = RawArchive(tmp_path, segment_bytes=1)
+    archive.write("chan", [message(1, 3)])
+    archive.write("chan", [message(2, 3)])
+    assert len(list(tmp_path.rglob("*.jsonl.zst"))) == 2
+
+    archive = RawArchive(tmp_path / "big")
+    archive.write("chan", [message(1, 3)])
+    archive.write("chan", [message(2, 3)])
+    assert len(list((tmp_path / "big").rglob("*.jsonl.zst"))) == 1
+    assert [m["id"] for m in archive.iter_messages("chan")] == [1, 2]
+
+
+def test_skips_archived_messages(archive, message):
+    assert archive.write("chan", [message(i, 3) for i in (5, 6, 8)]) == 3
+    # the latest messages fetched again, and a backfilled older page
+    assert archive.write("chan", [message(i, 3) for i in (6, 7, 8, 9)]) == 2
+    assert archive.write("chan", [message(i, 3) for i in (2, 3, 4, 5)]) == 3
+    assert archive.write("chan", [message(9, 3), message(9, 3)]) == 0
+    assert sorted(m["id"] for m in archive.iter_messages("chan")) == list(range(2, 10))
+    assert archive.archived_ids("chan").ranges == [[2, 9]]
+
+    # archives written before the index existed are indexed from their segments
+    (archive.root / "chan" / INDEX_NAME).unlink()
+    fresh = RawArchive(archive.root)
+    assert fresh.write("chan", [message(i, 3) for i in (9, 10)]) == 1
+
+
+def test_month_bounds(archive, message):
+    archive.write("chan", [message(i, month) for i, month in enumerate([2, 3, 4])])
+    assert [m["id"] for m in archive.iter_messages("chan", since="2025-03")] == [1, 2]
+    assert [m["id"] for m in archive.iter_messages("chan", until="2025-03")] == [0, 1]
+    assert list(archive.iter_messages("missing")) == []
+
+
+@pytest.mark.asyncio
+async def test_replay_into_fresh_database(archive, make_orchestrator, message):
+    archive.write(
+        "chan",
+        [message(1, 3), message(2, 3, text="too short"), message(3, 4)],
+    )
+    orc = make_orchestrator(channel="chan", archive=archive)
+    orc.llm_processor.extract_structured_data = Mock(
+        return_value=json.dumps({"BHK": 2})
+    )
+    orc.telegram_extractor = None
+
+    assert await orc.replay(batch_size=2) == 2
+    assert orc.job_queue.counts() == {STORED: 2, SKIPPED: 1}
+    stored = await orc.db_manager.get_message_by_text({"text": message(3, 4)["text"]})
+    assert stored["BHK"] == 2
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from flattracker.api import app as api
+from flattracker.api.app import app
+from flattracker.authors import BrokerRules, has_brokerage
+from flattracker.database_manager import AuthorStats
+from flattracker.job_queue import PREPROCESSED, SKIPPED
+
+START = datetime(2025, 4, 1)
+
+
+@pytest.fixture
+def listing(make_listing):
+    def make(author, i, brokerage=0, posted=None):
+        return make_listing(
+            f"2 BHK flat in Wakad number {i}, rent {20 + i}k. DM {author}",
+            posted or START + timedelta(days=i),
+            author,
+            Rent=20000 + i,
+            Brokerage=brokerage,
+        )
+
+    return make
+
+
+async def author_stats(manager):
+    async with manager.session_factory() as session:
+        rows = (await session.execute(select(AuthorStats))).scalars().all()
+    return {s.author: s for s in rows}
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    db_manager.broker_rules = BrokerRules(window_days=7, max_posts_per_window=4)
+    return db_manager
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(0, False), ("0", False), (None, False), ("No", False), ("", False)]
+    + [(5000, True), ("5k", True), ("1 month rent", True), (True, True)],
+)
+def test_has_brokerage(value, expected):
+    assert has_brokerage({"Brokerage": value}) is expected
+
+
+@pytest.mark.asyncio
+async def test_counters_flag_brokers(db_manager, listing):
+    await db_manager.store_messages(
+        [listing("Owner", 0), listing("Owner", 10)]
+        + [listing("Agent", i, brokerage="1 month") for i in range(3)]
+        # five posts within a week
+        + [listing("Flooder", 20, posted=START + timedelta(hours=h)) for h in range(5)]
+    )
+    stats = await author_stats(db_manager)
+    assert (stats["Owner"].listings, stats["Owner"].brokered) == (2, 0)
+    assert stats["Owner"].max_window_posts == 1
+    assert stats["Agent"].brokered == 3
+    assert stats["Flooder"].max_window_posts == 5
+    assert {a for a, s in stats.items() if s.is_broker} == {"Agent", "Flooder"}
+
+    # each repost of a stored listing counts towards the repost rate
+    stored = await db_manager.get_message_by_text(
+        {"text": listing("Owner", 0)["original_message"]["text"]}
+    )
+    for day in (1, 2, 3):
+        await db_manager.update_record_timestamp(
+            stored["original_message"]["id"],
+            datetime(2025, 5, day, tzinfo=timezone.utc),
+        )
+    stats = await author_stats(db_manager)
+    assert stats["Owner"].reposts == 3
+    assert stats["Owner"].is_broker
+    assert await db_manager.brokers() == {"Owner", "Agent", "Flooder"}
+
+    # a rebuild recounts the listings and keeps the reposts
+    assert await db_manager.rebuild_author_stats() == 3
+    rebuilt = await author_stats(db_manager)
+    assert rebuilt["Owner"].reposts == 3
+    assert rebuilt["Flooder"].max_window_posts == 5
+
+
+@pytest.mark.asyncio
+async def test_initialize_counts_existing_listings(db_manager, listing):
+    await db_manager.store_messages([listing("Owner", 0)])
+    async with db_manager.session_factory() as session, session.begin():
+        await session.execute(AuthorStats.__table__.delete())
+    await db_manager.initialize()
+    assert (await author_stats(db_manager))["Owner"].listings == 1
+
+
+@pytest.mark.asyncio
+async def test_is_broker_filter(db_path, db_manager, listing, monkeypatch):
+    await db_manager.store_messages(
+        [listing("Owner", 0), listing(None, 1)]
+        + [listing("Agent", i, brokerage=10000) for i in range(2, 5)]
+    )
+    monkeypatch.setattr(api, "DB_PATH", db_path)
+    client = TestClient(app)
+
+    def authors(**params):
+        response = client.get("/messages", params=params)
+        assert response.status_code == 200
+        return sorted(str(m["author"]) for m in response.json())
+
+    assert authors(is_broker=True) == ["Agent"] * 3
+    assert authors(is_broker=False) == ["None", "Owner"]
+
+
+@pytest.mark.asyncio
+async def test_blocked_authors_skip_extraction(
+    db_manager, listing, make_orchestrator, make_message
+):
+    orc = make_orchestrator()
+    await db_manager.store_messages(
+        [listing("Agent", i, brokerage=10000) for i in range(3)]
+    )
+    text = "2 BHK flat available in Hinjewadi phase 1, rent 20k, deposit 40k. DM {}"
+    messages = [
+        make_message(i, text.format(i), name)
+        for i, name in enumerate(["Owner", "Spammer", "Agent"])
+    ]
+    orc.blocked_authors = {"Spammer"}
+    orc.skip_brokers = True
+    orc.job_queue.enqueue(orc.channel, messages)
+    await orc.preprocess_jobs()
+    assert orc.job_queue.counts() == {PREPROCESSED: 1, SKIPPED: 2}
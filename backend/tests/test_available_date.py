@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+
+from flattracker.available_date import (
+    IMMEDIATE,
+    PartialDate,
+    parse_available_date,
+    resolve_available_date,
+)
+
+POSTED = datetime(2025, 4, 14, 18, 5)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("1 April", PartialDate(1, 4, None)),
+        ("01 April", PartialDate(1, 4, None)),
+        ("April 15th, 2025", PartialDate(15, 4, 2025)),
+        ("1st apr 2025", PartialDate(1, 4, 2025)),
+        ("May", PartialDate(1, 5, None)),
+        ("mid May", PartialDate(15, 5, None)),
+        ("10/05/2025", PartialDate(10, 5, 2025)),
+        ("2025-06-01", PartialDate(1, 6, 2025)),
+        ("from 20th", PartialDate(20, None, None)),
+        ("Immediate", IMMEDIATE),
+        ("available now", IMMEDIATE),
+        ("", None),
+        ("flexible", None),
+        ("32 May", None),
+    ],
+)
+def test_parse_available_date(text, expected):
+    assert parse_available_date(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Immediate", date(2025, 4, 14)),
+        ("1 April", date(2025, 4, 1)),
+        ("1 May", date(2025, 5, 1)),
+        ("31 June", date(2025, 6, 30)),
+        ("January", date(2026, 1, 1)),
+        ("10th", date(2025, 5, 10)),
+        ("20th", date(2025, 4, 20)),
+        (["1", "May"], date(2025, 5, 1)),
+        ("1/2/2024", date(2024, 2, 1)),
+        (None, None),
+        (3, None),
+    ],
+)
+def test_resolve_available_date(text, expected):
+    assert resolve_available_date(text, POSTED) == expected
+
+
+def test_resolve_without_posting_date():
+    assert resolve_available_date("1 May 2025", None) == date(2025, 5, 1)
+    assert resolve_available_date("1 May", None) is None
+    assert resolve_available_date("Immediate", None) is None
+
+
+def test_parse_is_memoized():
+    parse_available_date.cache_clear()
+    for _ in range(3):
+        resolve_available_date("15 April", POSTED)
+    info = parse_available_date.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
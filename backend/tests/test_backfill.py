@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from flattracker.backfill import Backfiller, BackfillProgress
+from flattracker.job_queue import STORED
+
+NEWEST = datetime(2025, 3, 31, tzinfo=timezone.utc)
+
+
+def history(n):
+    """n text messages, newest first, one per day"""
+    return [
+        {
+            "id": i,
+            "date": NEWEST - timedelta(days=n - i),
+            "text": f"1 BHK flat for rent in Hinjewadi phase {i}, rent {i}k. Call owner.",
+            "sender_first_name": "Owner",
+            "sender_last_name": None,
+        }
+        for i in range(n, 0, -1)
+    ]
+
+
+class FakeExtractor:
+    """replays `messages` the way TelegramExtractor.iter_pages pages them"""
+
+    def __init__(self, messages, fail_after_pages=None):
+        self.messages = messages
+        self.fail_after_pages = fail_after_pages
+        self.offsets = []
+
+    async def iter_pages(self, page_size, offset_id=0, min_date=None):
+        self.offsets.append(offset_id)
+        older = [m for m in self.messages if not offset_id or m["id"] < offset_id]
+        older = [m for m in older if not min_date or m["date"] >= min_date]
+        for n, i in enumerate(range(0, len(older), page_size)):
+            if n == self.fail_after_pages:
+                raise ConnectionError("flood wait")
+            page = older[i : i + page_size]
+            yield page, page[-1]["id"], page[-1]["date"]
+
+
+@pytest.fixture
+def make_backfiller(make_orchestrator):
+    def make(extractor, **kwargs):
+        orc = make_orchestrator()
+        orc.llm_processor.extract_structured_data = Mock(
+            return_value=json.dumps({"BHK": 1})
+        )
+        orc.telegram_extractor = extractor
+        return Backfiller(orc, page_size=4, poll_interval=0.01, **kwargs)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_backfill_whole_history(make_backfiller):
+    backfiller = make_backfiller(FakeExtractor(history(10)), extract_workers=3)
+    assert await backfiller.run() == 10
+    assert backfiller.orc.job_queue.counts() == {STORED: 10}
+    assert backfiller.orc.job_queue.load_offset("test_channel")[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_saved_offset(make_backfiller):
+    failing = make_backfiller(FakeExtractor(history(10), fail_after_pages=2))
+    with pytest.raises(ConnectionError):
+        await failing.run()
+    assert failing.orc.job_queue.load_offset("test_channel")[0] == 3
+
+    extractor = FakeExtractor(history(10))
+    resumed = make_backfiller(extractor)
+    await resumed.run()
+    assert extractor.offsets == [3]
+    assert resumed.orc.job_queue.counts() == {STORED: 10}
+
+
+@pytest.mark.asyncio
+async def test_backfill_date_floor(make_backfiller):
+    backfiller = make_backfiller(
+        FakeExtractor(history(10)), date_floor=NEWEST - timedelta(days=3)
+    )
+    assert await backfiller.run() == 4
+
+
+def test_progress_eta():
+    progress = BackfillProgress(date_floor=datetime(2025, 1, 1))
+    progress.update(100, datetime(2025, 3, 1))
+    line = progress.update(100, datetime(2025, 2, 1))
+    assert "200 messages" in line
+    assert "reached 2025-02-01" in line
+    assert "% done" in line
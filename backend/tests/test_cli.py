@@ -0,0 +1,80 @@
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from flattracker.cli import backfill, build_parser, ingest
+
+HEAVY_MODULES = {
+    "telethon",
+    "openai",
+    "sqlalchemy",
+    "pandas",
+    "emoji",
+    "tqdm",
+    "fastapi",
+    "uvicorn",
+    "pydantic",
+    "zstandard",
+}
+# cumulative import time budget in microseconds
+IMPORT_BUDGET_US = 150_000
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """cumulative import time of every module, from `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        [],
+        ["ingest"],
+        ["backfill"],
+        ["archive"],
+        ["compress"],
+        ["authors"],
+        ["normalize"],
+        ["serve"],
+    ],
+)
+def test_help_import_budget(command):
+    times = import_times("-m", "flattracker", *command, "--help")
+    top_level = {name.split(".")[0] for name in times}
+    assert not top_level & HEAVY_MODULES
+    assert times["flattracker.cli"] < IMPORT_BUDGET_US
+
+
+def test_populate_database_import_is_light():
+    times = import_times("-c", "import flattracker.populate_database")
+    top_level = {name.split(".")[0] for name in times}
+    assert not top_level & HEAVY_MODULES
+    assert times["flattracker.populate_database"] < IMPORT_BUDGET_US
+
+
+def test_parse_commands():
+    parser = build_parser()
+    args = parser.parse_args(["ingest", "--worker", "extracted"])
+    assert args.func is ingest
+    assert args.worker == "extracted"
+
+    args = parser.parse_args(["backfill", "--since", "2024-06-01"])
+    assert args.func is backfill
+    assert args.since == datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+    with pytest.raises(SystemExit):
+        parser.parse_args(["ingest", "--worker", "fetched"])
@@ -0,0 +1,107 @@
+import random
+import sqlite3
+from datetime import datetime
+
+import pytest
+import zstandard
+
+from flattracker.api.queries import query_messages
+from flattracker.compression import Codec, load_dictionaries, train_dictionary
+from flattracker.database_manager import DatabaseManager
+
+PLACES = ["Hinjewadi Phase 1", "Wakad", "Baner", "Megapolis Sunway", "Blue Ridge"]
+
+
+def random_listing(rng: random.Random, i: int) -> dict:
+    place = rng.choice(PLACES)
+    rent = rng.randint(5, 40)
+    return {
+        "BHK": rng.randint(1, 3),
+        "Address": place,
+        "Rent": rent * 1000,
+        "Furnished": rng.choice(["Furnished", "Semi-Furnished"]),
+        "original_message": {
+            "id": i,
+            "date": datetime(2025, 4, 1 + i % 28),
+            "text": f"{rng.randint(1, 3)} BHK fully furnished flat available in "
+            f"{place}, rent {rent}k, deposit {rng.randint(10, 99)}k. No brokerage. "
+            f"Gated society with gym and pool. Contact {rng.randint(7, 9)}"
+            f"{rng.randint(100000000, 999999999)}",
+            "sender_name": "Owner",
+        },
+    }
+
+
+def make_listings(n: int) -> list[dict]:
+    rng = random.Random(0)
+    return [random_listing(rng, i) for i in range(n)]
+
+
+def test_codec_keeps_short_and_legacy_values_as_text():
+    codec = Codec()
+    assert codec.encode("hi") == "hi"
+    assert codec.encode("") == ""
+    assert codec.encode(None) is None
+    assert codec.decode("plain old row") == "plain old row"
+
+    long_text = "no brokerage " * 20
+    encoded = codec.encode(long_text)
+    assert isinstance(encoded, bytes)
+    assert codec.decode(encoded) == long_text
+
+
+def test_codec_dictionary_versions():
+    texts = [m["original_message"]["text"] for m in make_listings(500)]
+    codec = Codec()
+    plain = codec.encode(texts[0])
+
+    first_id, first = train_dictionary(texts[:250], dict_size=2048)
+    codec.add(first_id, first)
+    codec.use(first_id)
+    with_first = codec.encode(texts[0])
+    assert len(with_first) < len(texts[0].encode()) // 2
+    assert not isinstance(plain, bytes) or len(with_first) < len(plain)
+    assert zstandard.get_frame_parameters(with_first).dict_id == first_id
+
+    second_id, second = train_dictionary(texts[250:], dict_size=2048)
+    codec.add(second_id, second)
+    codec.use(second_id)
+    assert codec.decode(with_first) == texts[0]
+    assert codec.decode(codec.encode(texts[1])) == texts[1]
+
+    with pytest.raises(LookupError):
+        Codec().decode(with_first)
+
+
+@pytest.mark.asyncio
+async def test_train_compression_roundtrip(db_path, db_manager):
+    listings = make_listings(300)
+    await db_manager.store_messages(listings)
+
+    dict_id = await db_manager.train_compression(dict_size=2048)
+    text = listings[7]["original_message"]["text"]
+    found = await db_manager.get_message_by_text({"text": text})
+    assert found["Address"] == listings[7]["Address"]
+    assert found["original_message"]["raw_text"] == text
+    await db_manager.engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    raw, data = conn.execute(
+        "SELECT raw_text, structured_data FROM message_data WHERE id = 8"
+    ).fetchone()
+    assert zstandard.get_frame_parameters(raw).dict_id == dict_id
+    assert zstandard.get_frame_parameters(data).dict_id == dict_id
+
+    load_dictionaries(conn)
+    messages = query_messages(conn)
+    assert len(messages) == 300
+    assert {m["raw_text"] for m in messages} == {
+        m["original_message"]["text"] for m in listings
+    }
+    conn.close()
+
+    # a new manager on the same database can read and look up the rows
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    assert await manager.get_message_by_text({"text": text})
+    await manager.engine.dispose()
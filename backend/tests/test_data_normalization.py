@@ -0,0 +1,152 @@
+import shutil
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from flattracker.data_normalization import cleanse, normalize_details, renormalize
+
+DETAILS = {
+    "BHK": 2,
+    "Bedroom": "master",
+    "Gender": "male/female",
+    "Address": "megapolis  sunway",
+    "Rent": "20k",
+    "Deposit": None,
+    "Restrictions": "no smoking, Non Drinker",
+    "Furnished": "Semi-Furnished",
+    "Brokerage": "",
+    "AvailableDate": "1st May 2025",
+    "ContactDetail": "ping me",
+}
+
+
+def test_normalize_details():
+    assert normalize_details(DETAILS) == {
+        "BHK": 2,
+        "Bedroom": "Master Bedroom",
+        "Sharing": "",
+        "Gender": ["Male", "Female"],
+        "Address": "Megapolis Sunway",
+        "Rent": 20000,
+        "Deposit": 0,
+        "Restrictions": ["NO_DRINKING", "NO_SMOKING"],
+        "Furnished": "SEMI_FURNISHED",
+        "Brokerage": 0,
+        "AvailableDate": "1 May",
+        "ContactDetail": "DM",
+    }
+    # normalized listings stay as they are
+    normalized = normalize_details(DETAILS)
+    assert normalize_details(normalized) == normalized
+    # values of unexpected types are kept
+    assert normalize_details({"Bedroom": ["hall"], "Address": 5})["Address"] == 5
+
+
+@pytest.mark.parametrize(
+    "details",
+    [
+        {"Address": "megapolis   sunway ,  phase 3 "},
+        {"AvailableDate": "10th April, 2025", "Gender": "female"},
+        {"AvailableDate": "after 1st may 2026", "Restrictions": ["No Boys", ""]},
+        {"Furnished": "semi furnished flat", "Rent": "20,000", "Deposit": 4.5},
+    ],
+)
+def test_normalize_details_is_idempotent(details):
+    normalized = normalize_details(details)
+    assert normalize_details(normalized) == normalized
+
+
+def test_cleanse_matches_normalize_details():
+    rows = [DETAILS, {**DETAILS, "Gender": ["Family"], "Restrictions": None}]
+    df = cleanse(pd.DataFrame(rows).fillna(""))
+    expected = [normalize_details(row) for row in rows]
+    for row, normalized in zip(df.to_dict(orient="records"), expected):
+        assert row == {key: normalized[key] for key in row}
+
+
+def author_stats(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT * FROM author_stats ORDER BY author").fetchall()
+    conn.close()
+    return rows
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT id, structured_data, available_from FROM message_data ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_renormalize(db_path, db_manager, make_listing, tmp_path):
+    texts = [f"2 BHK flat number {i} in Wakad, no brokerage" for i in range(9)]
+    texts.append("Car rental available in Hinjewadi, call now")
+    await db_manager.store_messages(
+        [
+            make_listing(
+                text,
+                datetime(2025, 4, 1, i),
+                "Agent" if i >= 8 else "Owner",
+                **{**DETAILS, "Rent": f"{20 + i}k"},
+            )
+            for i, text in enumerate(texts)
+        ]
+    )
+    await db_manager.engine.dispose()
+    before = dump(db_path)
+
+    counts = renormalize(db_path, workers=1, batch_size=4)
+    assert counts == {"listings": 10, "changed": 9, "excluded": 1}
+    assert dump(db_path) == before
+
+    copy = tmp_path / "copy.db"
+    shutil.copy(db_path, copy)
+    renormalize(db_path, workers=1, batch_size=4, save=True)
+    renormalize(copy, workers=3, batch_size=3, save=True)
+    # the output does not depend on the number of workers or the ranges
+    assert dump(db_path) == dump(copy)
+    assert len(dump(db_path)) == 9
+    # every rewritten listing gets a new revision, for the similarity index
+    with sqlite3.connect(db_path) as conn:
+        revisions = conn.execute("SELECT revision FROM message_data ORDER BY id")
+        assert [revision for (revision,) in revisions] == list(range(1, 10))
+    assert renormalize(db_path, workers=2, batch_size=4)["changed"] == 0
+    # the author of the excluded listing is counted again
+    recounted = author_stats(db_path)
+    assert [(author, listings) for author, listings, *_ in recounted] == [
+        ("Agent", 1),
+        ("Owner", 8),
+    ]
+    await db_manager.rebuild_author_stats()
+    assert author_stats(db_path) == recounted
+
+    stored = await db_manager.get_message_by_text(
+        {"text": "2 BHK flat number 3 in Wakad, no brokerage"}
+    )
+    assert stored["Rent"] == 23000
+    assert stored["Restrictions"] == ["NO_DRINKING", "NO_SMOKING"]
+
+
+@pytest.mark.asyncio
+async def test_renormalize_twice_changes_nothing(db_path, db_manager, make_listing):
+    posted = datetime(2025, 8, 1)
+    await db_manager.store_messages(
+        [
+            make_listing(
+                "2 BHK flat in Wakad from April", posted, AvailableDate="10 April 2025"
+            )
+        ]
+    )
+    await db_manager.engine.dispose()
+
+    assert renormalize(db_path, workers=1, save=True)["changed"] == 1
+    after_first = dump(db_path)
+    # the year dropped from AvailableDate does not move the available date
+    assert after_first[0][2] == "2025-04-10"
+    assert renormalize(db_path, workers=1, save=True)["changed"] == 0
+    assert dump(db_path) == after_first
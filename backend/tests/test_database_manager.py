@@ -1,18 +1,16 @@
-from datetime import datetime
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
-import pytest_asyncio
 from sqlalchemy import select
 
-from flattracker.database_manager import Base, DatabaseManager, MessageData
-
-
-@pytest_asyncio.fixture
-async def db_manager():
-    manager = DatabaseManager(db_url="sqlite+aiosqlite:///:memory:")
-    await manager.initialize()
-    yield manager
-    await manager.engine.dispose()
+from flattracker.database_manager import (
+    ArchivedMessageData,
+    Base,
+    DatabaseManager,
+    MessageData,
+)
 
 
 @pytest.mark.asyncio
@@ -22,7 +20,18 @@ async def test_initialize_create_tables(db_manager):
         assert result is not None
         assert "message_data" in Base.metadata.tables
         columns = Base.metadata.tables["message_data"].columns.keys()
-        assert set(columns) == {"id", "raw_text", "date", "author", "structured_data"}
+        assert set(columns) == {
+            "id",
+            "raw_text",
+            "date",
+            "author",
+            "structured_data",
+            "message_id",
+            "channel",
+            "available_from",
+            "text_hash",
+            "revision",
+        }
 
 
 @pytest.mark.asyncio
@@ -193,3 +202,118 @@ async def test_update_record_timestamp_success(db_manager):
         assert updated_message.date == new_timestamp
 
 
+@pytest.mark.asyncio
+async def test_store_messages_keeps_telegram_origin(db_manager):
+    message_data = {
+        "original_message": {
+            "id": 42,
+            "channel": "some_channel",
+            "date": datetime(2023, 1, 1),
+            "text": "Message with origin",
+            "sender_name": "Eve",
+        },
+    }
+    await db_manager.store_messages([message_data])
+
+    async with db_manager.session_factory() as session:
+        message = (await session.execute(select(MessageData))).scalars().one()
+        assert message.message_id == 42
+        assert message.channel == "some_channel"
+
+
+@pytest.mark.asyncio
+async def test_initialize_adds_missing_columns(tmp_path):
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE message_data (id INTEGER NOT NULL, raw_text VARCHAR, "
+        "date DATETIME, author VARCHAR, structured_data JSON, PRIMARY KEY (id))"
+    )
+    conn.execute("INSERT INTO message_data (raw_text) VALUES ('old row')")
+    conn.execute(
+        "INSERT INTO message_data (raw_text, date, structured_data) VALUES "
+        """('old listing', '2025-03-19 10:00:00.000000', '{"AvailableDate": "Immediate"}')"""
+    )
+    conn.commit()
+    conn.close()
+
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    async with manager.session_factory() as session:
+        messages = (await session.execute(select(MessageData))).scalars().all()
+        message, listing = messages
+        assert message.raw_text == "old row"
+        assert message.message_id is None
+        assert message.available_from is None
+        assert listing.available_from == date(2025, 3, 19)
+    assert await manager.get_message_by_text({"text": "old listing"})
+    await manager.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_archive_stale_moves_old_listings(db_manager, make_listing):
+    now = datetime(2024, 6, 1)
+    await db_manager.store_messages(
+        [
+            make_listing("fresh listing", now - timedelta(days=3)),
+            make_listing("stale listing", now - timedelta(days=90)),
+        ]
+    )
+
+    assert await db_manager.archive_stale(60, now=now) == 1
+    async with db_manager.session_factory() as session:
+        hot = (await session.execute(select(MessageData))).scalars().all()
+        cold = (await session.execute(select(ArchivedMessageData))).scalars().all()
+    assert [m.raw_text for m in hot] == ["fresh listing"]
+    assert [m.raw_text for m in cold] == ["stale listing"]
+    assert cold[0].archived_at == now
+    assert cold[0].structured_data == {"BHK": 2, "Rent": 20000}
+
+    assert await db_manager.archive_stale(60, now=now) == 0
+
+
+@pytest.mark.asyncio
+async def test_archive_stale_compares_in_utc(db_manager, make_listing, monkeypatch):
+    # twelve hours ahead of UTC, so a local clock would archive this listing
+    monkeypatch.setenv("TZ", "Etc/GMT-12")
+    time.tzset()
+    utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+    await db_manager.store_messages(
+        [make_listing("almost stale", utc_now - timedelta(days=60, hours=-6))]
+    )
+    try:
+        assert await db_manager.archive_stale(60) == 0
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+@pytest.mark.asyncio
+async def test_get_message_by_text_restores_archived(db_manager, make_listing):
+    now = datetime(2024, 6, 1)
+    await db_manager.store_messages(
+        [make_listing("reposted", now - timedelta(days=90))]
+    )
+    await db_manager.archive_stale(60, now=now)
+
+    result = await db_manager.get_message_by_text({"text": "reposted"})
+    assert result["BHK"] == 2
+    await db_manager.update_record_timestamp(result["original_message"]["id"], now)
+
+    assert await db_manager.archive_stale(60, now=now) == 0
+    async with db_manager.session_factory() as session:
+        hot = (await session.execute(select(MessageData))).scalars().one()
+        cold = (await session.execute(select(ArchivedMessageData))).scalars().all()
+    assert hot.date == now
+    assert cold == []
+
+
+@pytest.mark.asyncio
+async def test_store_messages_resolves_available_date(db_manager, make_listing):
+    listing = make_listing("available in may", datetime(2025, 4, 14, 9, 30))
+    listing["AvailableDate"] = "1st May"
+    await db_manager.store_messages([listing])
+
+    async with db_manager.session_factory() as session:
+        message = (await session.execute(select(MessageData))).scalars().one()
+    assert message.available_from == date(2025, 5, 1)
@@ -0,0 +1,87 @@
+from flattracker.filters import (
+    DEFAULT_FILTER,
+    TRIE_MIN_KEYWORDS,
+    FilterRules,
+    KeywordFilter,
+)
+from flattracker.message_processor import MessageProcessor
+
+LISTING = "2 BHK flat available in Hinjewadi phase 1 for 20k, contact the owner"
+
+
+def test_default_rules_match_previous_filter():
+    processor = MessageProcessor()
+    assert processor.filter_message({"text": LISTING})
+    assert not processor.filter_message({"text": "short"})
+    assert not processor.filter_message({"text": LISTING + " Changed my number"})
+    assert not processor.filter_message({"text": LISTING + " LEADS available"})
+    assert not processor.filter_message({"text": LISTING + " (External)"})
+    assert DEFAULT_FILTER.is_excluded("Car Rental at cheap prices")
+    assert not DEFAULT_FILTER.is_excluded(LISTING)
+
+
+def test_word_boundaries():
+    keyword_filter = KeywordFilter(FilterRules(exclude_words=["pg"]))
+    assert keyword_filter.is_excluded("Girls PG near Wakad")
+    assert not keyword_filter.is_excluded("upgraded kitchen")
+
+
+def test_include_rules():
+    keyword_filter = KeywordFilter(
+        FilterRules(exclude=["sold"], include=["bhk", "flatmate"], min_length=10)
+    )
+    assert keyword_filter.accepts("Looking for a Flatmate in Baner")
+    assert not keyword_filter.accepts("Selling a used bike in Baner")
+    # an exclusion after an included keyword still drops the message
+    assert not keyword_filter.accepts("2 BHK flat, already sold")
+    assert not keyword_filter.accepts("1 BHK")
+
+
+def test_no_rules():
+    keyword_filter = KeywordFilter(FilterRules())
+    assert keyword_filter.accepts("anything")
+    assert not keyword_filter.is_excluded("lead")
+
+
+def test_keywords_are_escaped():
+    keyword_filter = KeywordFilter(FilterRules(exclude=["c++", "(dm)"]))
+    assert keyword_filter.is_excluded("needs C++ dev")
+    assert keyword_filter.is_excluded("rent 10k (DM)")
+    assert not keyword_filter.is_excluded("c dm")
+
+
+def test_substring_and_word_keywords():
+    keyword_filter = KeywordFilter(
+        FilterRules(exclude=["broker"], exclude_words=["pg"], min_length=5)
+    )
+    assert not keyword_filter.accepts("No BROKERAGE, call the owner")
+    assert not keyword_filter.accepts("Boys pg in Baner")
+    assert keyword_filter.accepts("upgraded 2 BHK in Baner")
+
+
+def test_long_keyword_lists_match_like_short_ones():
+    keywords = ["lead", "leads", "lease", "c++", "(dm)", "car rental"]
+    keywords += [f"spam keyword {i}" for i in range(TRIE_MIN_KEYWORDS)]
+    long_filter = KeywordFilter(FilterRules(exclude=keywords, include=keywords))
+    texts = [
+        "Genuine LEADS here",
+        "lease deed",
+        "needs c++",
+        "rent 10k (dm)",
+        "spam keyword 7",
+        "spam keyword",
+        "lea",
+        "car rent",
+        "2 BHK in Baner",
+    ]
+    for text in texts:
+        expected = any(k in text.lower() for k in keywords)
+        assert long_filter.is_excluded(text) == expected
+        assert long_filter.include(text.lower()) == expected
+
+
+def test_word_keywords_sharing_a_prefix():
+    keyword_filter = KeywordFilter(FilterRules(exclude_words=["broker", "brokerage"]))
+    assert keyword_filter.is_excluded("No brokerage")
+    assert keyword_filter.is_excluded("no broker please")
+    assert not keyword_filter.is_excluded("brokers welcome")
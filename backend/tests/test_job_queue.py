@@ -0,0 +1,157 @@
+import multiprocessing
+from datetime import datetime
+
+import pytest
+
+from flattracker.job_queue import (
+    EXTRACTED,
+    FAILED,
+    FETCHED,
+    PREPROCESSED,
+    SKIPPED,
+    STORED,
+    JobQueue,
+    text_hash,
+)
+
+
+def make_messages(n, start=1):
+    return [
+        {
+            "id": i,
+            "date": datetime(2025, 3, 19, 8, i % 60),
+            "text": f"message {i}",
+            "sender_first_name": "John",
+            "sender_last_name": None,
+        }
+        for i in range(start, start + n)
+    ]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue("chan", make_messages(3)) == 3
+    assert queue.enqueue("chan", make_messages(4)) == 1
+    assert queue.enqueue("other", make_messages(1)) == 1
+    assert queue.counts() == {FETCHED: 5}
+
+
+def test_claim_leases_jobs(queue):
+    queue.enqueue("chan", make_messages(3))
+    first = queue.claim(FETCHED, "w1", limit=2)
+    second = queue.claim(FETCHED, "w2", limit=2)
+
+    assert [job.message_id for job in first] == [1, 2]
+    assert [job.message_id for job in second] == [3]
+    assert queue.claim(FETCHED, "w3") == []
+    assert first[0].message["date"] == datetime(2025, 3, 19, 8, 1)
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=-1)
+    queue.enqueue("chan", make_messages(1))
+    [job] = queue.claim(FETCHED, "crashed")
+    [again] = queue.claim(FETCHED, "w2")
+    assert again.id == job.id
+
+    # the worker that lost the lease can no longer write
+    assert not queue.advance(job, "crashed", PREPROCESSED, job.message)
+    assert queue.advance(again, "w2", PREPROCESSED, again.message)
+    assert queue.counts() == {PREPROCESSED: 1}
+
+
+def test_advance_keeps_stage_output(queue):
+    queue.enqueue("chan", make_messages(1))
+    [job] = queue.claim(FETCHED, "w1")
+    message = dict(job.message, text="clean text")
+    queue.advance(job, "w1", PREPROCESSED, message)
+
+    [job] = queue.claim(PREPROCESSED, "w1")
+    assert job.message["text"] == "clean text"
+    queue.advance(job, "w1", EXTRACTED, result=[{"BHK": 2}])
+
+    [job] = queue.claim(EXTRACTED, "w1")
+    assert job.message["text"] == "clean text"
+    assert job.result == [{"BHK": 2}]
+
+
+def test_fail_retries_then_gives_up(queue):
+    queue.enqueue("chan", make_messages(1))
+    [job] = queue.claim(FETCHED, "w1")
+    queue.fail(job, "w1", "boom")
+    [job] = queue.claim(FETCHED, "w1")
+    queue.fail(job, "w1", "boom")
+    assert queue.counts() == {FAILED: 1}
+
+
+def test_renew_keeps_leases_held(queue):
+    queue.enqueue("chan", make_messages(2))
+    first, second = queue.claim(FETCHED, "w1")
+    # the lease on the second job ran out and another worker took it over
+    queue.conn.execute("UPDATE jobs SET lease_expires = 0 WHERE id = ?", (second.id,))
+    assert [job.id for job in queue.claim(FETCHED, "w2")] == [second.id]
+    assert queue.renew([first, second], "w1") == {first.id}
+    # a renewed lease is not claimable
+    queue.conn.execute("UPDATE jobs SET lease_expires = lease_expires - 30")
+    assert queue.claim(FETCHED, "w3") == []
+
+
+def test_is_duplicate(queue):
+    queue.enqueue("chan", make_messages(2))
+    first, second = queue.claim(FETCHED, "w1")
+    queue.advance(first, "w1", PREPROCESSED, dict(first.message, text="same"))
+    assert queue.is_duplicate(second, text_hash("same"))
+    assert not queue.is_duplicate(second, text_hash("different"))
+    queue.advance(second, "w1", SKIPPED)
+    # once stored, the text is a repost rather than a duplicate
+    [first] = queue.claim(PREPROCESSED, "w1")
+    queue.advance(first, "w1", STORED)
+    assert not queue.is_duplicate(second, text_hash("same"))
+
+
+def test_purge_finished_keeps_recent_and_failed_jobs(queue):
+    queue.enqueue("chan", make_messages(4))
+    stored, skipped, failed, recent = queue.claim(FETCHED, "w1")
+    queue.advance(stored, "w1", STORED)
+    queue.advance(skipped, "w1", SKIPPED)
+    queue.conn.execute("UPDATE jobs SET stage = ? WHERE id = ?", (FAILED, failed.id))
+    queue.advance(recent, "w1", STORED)
+    queue.conn.execute(
+        "UPDATE jobs SET updated_at = updated_at - 61 * 86400 WHERE id != ?",
+        (recent.id,),
+    )
+    assert queue.purge_finished(60) == 2
+    assert queue.counts() == {FAILED: 1, STORED: 1}
+
+
+def _claim_all(db_path, worker, out):
+    queue = JobQueue(db_path)
+    claimed = []
+    while jobs := queue.claim(FETCHED, worker, limit=3):
+        claimed.extend(job.id for job in jobs)
+    out.put(claimed)
+
+
+def test_parallel_workers_never_share_a_job(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    queue = JobQueue(db_path)
+    queue.enqueue("chan", make_messages(60))
+
+    out = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_claim_all, args=(db_path, f"w{i}", out))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    claimed = [job_id for _ in workers for job_id in out.get(timeout=30)]
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == list(range(1, 61))
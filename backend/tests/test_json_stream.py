@@ -0,0 +1,44 @@
+from flattracker.json_stream import JSONStreamParser, loads_lenient, parse_json_values
+
+
+def test_parse_fenced_block():
+    text = """Here you go:\n```json\n{"BHK": 2, "Rent": 20000}\n```"""
+    assert parse_json_values(text) == [{"BHK": 2, "Rent": 20000}]
+
+
+def test_parse_multiple_values_and_prose():
+    text = 'First {"a": 1} then [1, 2] and "{not json}" done'
+    assert parse_json_values(text) == [{"a": 1}, [1, 2]]
+
+
+def test_brackets_inside_strings():
+    text = '{"Address": "Flat {3} [Phase 1]", "note": "say \\"hi\\" }"}'
+    assert parse_json_values(text) == [
+        {"Address": "Flat {3} [Phase 1]", "note": 'say "hi" }'}
+    ]
+
+
+def test_feed_in_chunks():
+    parser = JSONStreamParser()
+    chunks = ['{"listings": [{"BHK"', ': 1}, {"BHK": 2}', "]}", ' {"x": 3}']
+    values = []
+    for chunk in chunks:
+        values.extend(parser.feed(chunk))
+    assert values == [{"listings": [{"BHK": 1}, {"BHK": 2}]}, {"x": 3}]
+
+
+def test_close_repairs_truncated_value():
+    assert parse_json_values('{"a": [1, 2, {"b": "unfinish') == [
+        {"a": [1, 2, {"b": "unfinish"}]}
+    ]
+    assert parse_json_values('{"a": 1, "b":') == [{"a": 1}]
+
+
+def test_loads_lenient():
+    assert loads_lenient('{"a": True, "b": None, "c": [1,],}') == {
+        "a": True,
+        "b": None,
+        "c": [1],
+    }
+    assert loads_lenient('{"text": "None, True,]"}') == {"text": "None, True,]"}
+    assert loads_lenient('{"a" "b"}') is None
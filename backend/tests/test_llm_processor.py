@@ -23,17 +23,23 @@ def test_init(llm_processor):
     assert llm_processor.client.base_url == "https://openrouter.ai/api/v1/"
 
 
-def test_build_prompt(llm_processor):
-    message = {"text": "This is a test message."}
+def test_build_instructions(llm_processor):
     schema = {"name": "string", "age": "integer"}
-    prompt = llm_processor._build_prompt(message, schema)
+    instructions = llm_processor._build_instructions(schema)
 
-    expected_prompt = """Extract the following information from this message:
+    expected_instructions = """Extract the following information from the message:
 - name: string
 - age: integer
-Return the information as JSON object. If the text doesn't contain any information, leave the value field blank.
+Return the information as a JSON object {"listings": [...]} with one object per listing in the message. If the text doesn't contain any information, leave the value field blank."""
+
+    assert instructions == expected_instructions
+
+
+def test_build_prompt(llm_processor):
+    message = {"text": "This is a test message."}
+    prompt = llm_processor._build_prompt(message)
 
-Message:
+    expected_prompt = """Message:
 Text: This is a test message."""
 
     assert prompt == expected_prompt
@@ -41,20 +47,35 @@ Text: This is a test message."""
 
 def test_build_prompt_empty_message(llm_processor):
     message = {"text": ""}
-    schema = {"name": "string", "age": "integer"}
-    prompt = llm_processor._build_prompt(message, schema)
+    prompt = llm_processor._build_prompt(message)
 
-    expected_prompt = """Extract the following information from this message:
-- name: string
-- age: integer
-Return the information as JSON object. If the text doesn't contain any information, leave the value field blank.
-
-Message:
+    expected_prompt = """Message:
 Text: """
 
     assert prompt == expected_prompt
 
 
+def test_build_prompt_truncates_long_messages(llm_processor):
+    llm_processor.max_message_tokens = 10
+    prompt = llm_processor._build_prompt({"text": "flat for rent " * 20})
+    assert prompt == "Message:\nText: flat for rent flat for rent flat for …"
+
+
+@patch("flattracker.llm_processor.OpenAI")
+def test_static_instructions_are_the_prompt_prefix(mock_openai):
+    llm_processor = LLMProcessor(api_key="test_api_key")
+    schema = {"name": "string", "age": "integer"}
+    calls = mock_openai.return_value.chat.completions.create
+    llm_processor.extract_structured_data({"text": "first message"}, schema)
+    llm_processor.extract_structured_data({"text": "second message"}, schema)
+
+    first, second = (call.kwargs["messages"] for call in calls.call_args_list)
+    assert first[0] == second[0]
+    assert first[0]["role"] == "system"
+    assert "- age: integer" in first[0]["content"]
+    assert first[1]["content"].endswith("first message")
+
+
 @patch("flattracker.llm_processor.OpenAI")
 def test_infer_llm_success(mock_openai, llm_processor):
     mock_response = MagicMock()
@@ -99,6 +120,58 @@ def test_extract_json_empty(llm_processor):
     assert result == dict()
 
 
+def test_extract_json_without_fence(llm_processor):
+    text = """Sure! Here is the data: {"name": "John Doe", "age": None,}"""
+    result = llm_processor.extract_json(text)
+    assert result == {"name": "John Doe", "age": None}
+
+
+def test_extract_listings_validates(llm_processor):
+    text = """{"listings": [{"BHK": "2", "Rent": "20k", "Gender": ["Male"]}, {"Address": {"street": 1}}]}"""
+    result = llm_processor.extract_listings(text)
+    assert len(result) == 1
+    assert result[0]["BHK"] == 2
+    assert result[0]["Rent"] == 20000
+    assert result[0]["Gender"] == ["Male"]
+    assert result[0]["Address"] == ""
+
+
+def test_extract_listings_blanks_invalid_fields(llm_processor):
+    text = """[{"BHK": 2, "Rent": "20k", "Address": {"street": 1}, "Gender": [1]}]"""
+    [listing] = llm_processor.extract_listings(text)
+    assert (listing["BHK"], listing["Rent"]) == (2, 20000)
+    assert listing["Address"] == ""
+    assert listing["Gender"] == ""
+
+
+def test_extract_listings_drops_items_without_schema_fields(llm_processor):
+    text = """{"listings": [{"name": "Wakad flat"}, {"BHK": 1}]}"""
+    assert [x["BHK"] for x in llm_processor.extract_listings(text)] == [1]
+
+
+def test_extract_listings_single_object(llm_processor):
+    text = """```json\n{"BHK": 1, "Sharing": "yes"}\n```"""
+    result = llm_processor.extract_listings(text)
+    assert [(x["BHK"], x["Sharing"]) for x in result] == [(1, True)]
+
+
+def test_extract_listings_no_json(llm_processor):
+    assert llm_processor.extract_listings("no listing here") == []
+
+
+@patch("flattracker.llm_processor.OpenAI")
+def test_infer_llm_requests_structured_output(mock_openai):
+    llm_processor = LLMProcessor(api_key="test_api_key")
+    llm_processor.infer_llm("Test prompt")
+    kwargs = mock_openai.return_value.chat.completions.create.call_args.kwargs
+    assert kwargs["response_format"]["type"] == "json_schema"
+
+    llm_processor = LLMProcessor(api_key="test_api_key", structured_outputs=False)
+    llm_processor.infer_llm("Test prompt")
+    kwargs = mock_openai.return_value.chat.completions.create.call_args.kwargs
+    assert "response_format" not in kwargs
+
+
 @patch("flattracker.llm_processor.LLMProcessor.infer_llm")
 def test_extract_structured_data_success(mock_infer_llm, llm_processor):
     message = {"text": "Hello, my name is John Doe and I am 30 years old."}
@@ -124,29 +197,31 @@ def test_extract_structured_data_error(mock_infer_llm, llm_processor):
 
 
 @patch("flattracker.llm_processor.LLMProcessor.extract_structured_data")
-@patch("flattracker.llm_processor.LLMProcessor.extract_json")
-def test_batch_process_success(mock_extract_json, mock_structured_data, llm_processor):
+@patch("flattracker.llm_processor.LLMProcessor.extract_listings")
+def test_batch_process_success(
+    mock_extract_listings, mock_structured_data, llm_processor
+):
     messages = [
         {"text": "Hello, my name is John Doe and I am 30 years old."},
         {"text": "Hello my name is Jane Smith."},
     ]
     schema = {"name": "string", "age": "integer"}
     expected_results = [
-        dict(name="John Doe", age=30),
-        dict(name="Jane Smith", age=None),
+        [{"name": "John Doe", "age": 30}],
+        [{"name": "Jane Smith", "age": None}, {"name": "Jack Smith", "age": None}],
     ]
     mock_structured_data.side_effect = [
         """```json\n{"name": "John Doe", "age": 30}\n```""",
-        """```json\n{"name": "Jane Smith", "age": None}\n```""",
+        """```json\n[{"name": "Jane Smith"}, {"name": "Jack Smith"}]\n```""",
     ]
-    mock_extract_json.side_effect = expected_results
+    mock_extract_listings.side_effect = expected_results
 
     with patch("flattracker.llm_processor.tqdm", return_value=messages) as mock_tqdm:
         results = llm_processor.batch_process(messages, schema)
         assert len(results) == 2
         assert results == expected_results
         mock_structured_data.assert_called()
-        mock_extract_json.assert_called()
+        mock_extract_listings.assert_called()
         mock_tqdm.assert_called_once()
 
 
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from flattracker.llm_router import AllEndpointsFailed, Endpoint, LLMRouter
+
+
+def make_server(delay: float = 0.0, status: int = 200):
+    """local stand-in for an OpenAI compatible chat completions server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self.server.requests.append(body)
+            time.sleep(delay)
+            if status != 200:
+                self.send_response(status)
+                self.end_headers()
+                return
+            payload = json.dumps(
+                {
+                    "id": "cmpl-1",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": body["model"]},
+                        }
+                    ],
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = make_server(**kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.shutdown()
+
+
+def endpoint(name, server, **kwargs):
+    client = OpenAI(
+        base_url=f"http://127.0.0.1:{server.server_port}/v1",
+        api_key="test",
+        max_retries=0,
+    )
+    return Endpoint(name=name, client=client, model=name, **kwargs)
+
+
+def ask(router):
+    completion, used = router.complete(messages=[{"role": "user", "content": "hi"}])
+    assert completion.choices[0].message.content == used.model
+    return used.name
+
+
+def test_routes_to_fastest_endpoint(servers):
+    slow, fast = servers(delay=0.2), servers()
+    router = LLMRouter(
+        [endpoint("slow", slow), endpoint("fast", fast)], hedge_after=None
+    )
+    # both endpoints are untried, so the first one is used first
+    assert ask(router) == "slow"
+    assert ask(router) == "fast"
+    assert ask(router) == "fast"
+    assert router.stats["slow"].latency > router.stats["fast"].latency
+
+
+def test_fails_over_and_benches_unhealthy_endpoint(servers):
+    broken, healthy = servers(status=500), servers()
+    router = LLMRouter(
+        [endpoint("broken", broken), endpoint("healthy", healthy)],
+        hedge_after=None,
+        max_error_rate=0.4,
+    )
+    assert ask(router) == "healthy"
+    assert router.stats["broken"].error_rate == 1.0
+    assert [e.name for e in router.ranked()] == ["healthy", "broken"]
+    assert ask(router) == "healthy"
+    assert len(broken.requests) == 1
+
+
+def test_hedges_slow_request(servers):
+    stalled, backup = servers(delay=1.0), servers()
+    router = LLMRouter(
+        [endpoint("stalled", stalled), endpoint("backup", backup)], hedge_after=0.05
+    )
+    start = time.perf_counter()
+    assert ask(router) == "backup"
+    assert time.perf_counter() - start < 0.9
+    assert len(stalled.requests) == 1
+
+
+def test_hedge_timer_starts_when_request_is_sent(servers):
+    primary, backup = servers(delay=0.05), servers()
+    router = LLMRouter(
+        [endpoint("primary", primary), endpoint("backup", backup)],
+        hedge_after=0.2,
+        concurrency=1,
+    )
+    # other callers hold every thread for longer than `hedge_after`
+    for _ in range(2):
+        router._executor.submit(time.sleep, 0.4)
+    assert ask(router) == "primary"
+    assert backup.requests == []
+
+
+def test_pool_fits_concurrent_callers(servers):
+    server = servers(delay=0.2)
+    router = LLMRouter([endpoint("only", server)], concurrency=4)
+    threads = [threading.Thread(target=ask, args=(router,)) for _ in range(4)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - start < 0.35
+
+
+def test_success_does_not_bench_endpoint():
+    router = LLMRouter([Endpoint("a", client=None, model="a")], max_error_rate=0.4)
+    router._record(router.endpoints[0], None)
+    router._record(router.endpoints[0], None)
+    stats = router.stats["a"]
+    assert stats.cooldown_until > 0
+    stats.cooldown_until = 0.0
+    router._record(router.endpoints[0], 0.1)
+    assert stats.error_rate > 0.4
+    assert stats.cooldown_until == 0.0
+
+
+def test_drops_response_format_for_unsupported_endpoint(servers):
+    server = servers()
+    router = LLMRouter([endpoint("plain", server, structured_outputs=False)])
+    router.complete(
+        messages=[{"role": "user", "content": "hi"}],
+        response_format={"type": "json_object"},
+    )
+    assert "response_format" not in server.requests[0]
+
+
+def test_all_endpoints_failed(servers):
+    router = LLMRouter([endpoint("a", servers(status=500))], hedge_after=None)
+    with pytest.raises(AllEndpointsFailed):
+        ask(router)
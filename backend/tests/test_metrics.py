@@ -0,0 +1,95 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from flattracker.api import app as api
+from flattracker.api.app import app
+from flattracker.metrics import Metrics
+
+
+@pytest.fixture
+def metrics():
+    return Metrics(prefix="test")
+
+
+def test_counters(metrics):
+    metrics.inc("cache_hits")
+    metrics.inc("cache_hits", 2)
+    assert metrics.snapshot()["counters"] == {"cache_hits": 3}
+
+
+def test_span_records_duration(metrics):
+    with metrics.span("llm_call"):
+        pass
+    with pytest.raises(ValueError), metrics.span("llm_call"):
+        raise ValueError("boom")
+
+    span = metrics.snapshot()["spans"]["llm_call"]
+    assert span["count"] == 2
+    assert span["total_seconds"] >= 0
+
+
+def test_render_prometheus(metrics):
+    metrics.inc("cache_hits", 4)
+    metrics.observe("db_write", 0.02)
+    metrics.observe("db_write", 100)
+
+    text = metrics.render_prometheus()
+    assert "# TYPE test_cache_hits_total counter" in text
+    assert "test_cache_hits_total 4" in text
+    assert 'test_stage_duration_seconds_bucket{stage="db_write",le="0.01"} 0' in text
+    assert 'test_stage_duration_seconds_bucket{stage="db_write",le="0.05"} 1' in text
+    assert 'test_stage_duration_seconds_bucket{stage="db_write",le="+Inf"} 2' in text
+    assert 'test_stage_duration_seconds_count{stage="db_write"} 2' in text
+
+
+def test_write_report_since(metrics, tmp_path):
+    metrics.inc("cache_hits")
+    metrics.observe("db_write", 1.0)
+    before = metrics.snapshot()
+    metrics.inc("cache_hits")
+    metrics.inc("llm_prompt_tokens", 120)
+    metrics.observe("llm_call", 2.0)
+
+    path = tmp_path / "report.json"
+    metrics.write_report(path, since=before)
+    report = json.loads(path.read_text())
+
+    assert report["counters"] == {"cache_hits": 1, "llm_prompt_tokens": 120}
+    assert set(report["spans"]) == {"llm_call"}
+    assert report["spans"]["llm_call"]["mean_seconds"] == 2.0
+
+
+def record_in_process(db_path, hits):
+    """record `hits` cache hits and a db_write span in a separate process"""
+    code = (
+        "from flattracker.metrics import Metrics\n"
+        f"metrics = Metrics().share({str(db_path)!r})\n"
+        f"metrics.inc('cache_hits', {hits})\n"
+        "metrics.observe('db_write', 0.02)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_metrics_shared_between_processes(tmp_path, monkeypatch):
+    db_path = tmp_path / "metrics.db"
+    monkeypatch.setattr(api, "METRICS", Metrics().share(db_path))
+    client = TestClient(app)
+
+    # what exited processes recorded is kept and summed
+    record_in_process(db_path, 3)
+    record_in_process(db_path, 2)
+    api.METRICS.inc("api_snapshot_hits")
+    text = client.get("/metrics").text
+    assert "flattracker_cache_hits_total 5" in text
+    assert "flattracker_api_snapshot_hits_total 1" in text
+    assert 'flattracker_stage_duration_seconds_count{stage="db_write"} 2' in text
+    bucket = 'flattracker_stage_duration_seconds_bucket{stage="db_write",le="0.05"} 2'
+    assert bucket in text
+
+    # flushing again only adds what is new
+    api.METRICS.flush()
+    assert api.METRICS.shared().counters["api_snapshot_hits"] == 1
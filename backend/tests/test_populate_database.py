@@ -0,0 +1,130 @@
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from sqlalchemy import select
+
+from flattracker.database_manager import AuthorStats, MessageData
+from flattracker.job_queue import EXTRACTED, FAILED, PREPROCESSED, SKIPPED, STORED
+
+LISTING_TEXT = "2 BHK flat available in Hinjewadi phase 1, rent 20k, deposit 40k. DM {}"
+
+
+def completion(rent):
+    return json.dumps({"listings": [{"BHK": 2, "Rent": rent}]})
+
+
+@pytest.mark.asyncio
+async def test_pipeline_resumes_after_llm_failure(make_orchestrator, make_message):
+    messages = [
+        make_message(1, LISTING_TEXT.format("me")),
+        make_message(2, "too short"),
+        make_message(3, LISTING_TEXT.format("please")),
+        make_message(4, LISTING_TEXT.format("me")),
+    ]
+
+    orc = make_orchestrator()
+    orc.job_queue.enqueue(orc.channel, messages)
+    await orc.preprocess_jobs()
+    # the short message is filtered and message 4 is a duplicate of message 1
+    assert orc.job_queue.counts() == {PREPROCESSED: 2, SKIPPED: 2}
+
+    orc.llm_processor.extract_structured_data = Mock(
+        side_effect=[completion(20000), KeyboardInterrupt()]
+    )
+    with pytest.raises(KeyboardInterrupt):
+        await orc.extract_jobs()
+    # the first, paid for, result is kept although the batch never finished
+    assert orc.job_queue.counts()[EXTRACTED] == 1
+
+    # a new process picks up the job whose lease expired
+    resumed = make_orchestrator()
+    resumed.job_queue.conn.execute("UPDATE jobs SET lease_expires = 0")
+    resumed.llm_processor.extract_structured_data = Mock(return_value=completion(21000))
+    await resumed.drain()
+
+    assert resumed.job_queue.counts() == {STORED: 2, SKIPPED: 2}
+    assert resumed.llm_processor.extract_structured_data.call_count == 1
+    assert resumed.stored_count == 2
+
+    async with resumed.db_manager.session_factory() as session:
+        rows = (await session.execute(select(MessageData))).scalars().all()
+    assert sorted(row.structured_data["Rent"] for row in rows) == [20000, 21000]
+
+
+@pytest.mark.asyncio
+async def test_store_is_idempotent(make_orchestrator, make_message):
+    orc = make_orchestrator()
+    orc.job_queue.enqueue(orc.channel, [make_message(1, LISTING_TEXT.format("me"))])
+    orc.llm_processor.extract_structured_data = Mock(return_value=completion(20000))
+    await orc.preprocess_jobs()
+    await orc.extract_jobs()
+
+    # simulate a crash after the rows were written but before the job advanced
+    [job] = orc.job_queue.claim(EXTRACTED, "crashed")
+    listing = dict(job.result[0], original_message=job.message)
+    await orc.db_manager.store_messages([listing])
+    orc.job_queue.conn.execute("UPDATE jobs SET lease_expires = 0")
+
+    await orc.store_jobs()
+    async with orc.db_manager.session_factory() as session:
+        rows = (await session.execute(select(MessageData))).scalars().all()
+    assert len(rows) == 1
+    assert orc.job_queue.counts() == {STORED: 1}
+
+
+@pytest.mark.asyncio
+async def test_repost_moves_stored_listing_forward(make_orchestrator, make_message):
+    orc = make_orchestrator()
+    orc.llm_processor.extract_structured_data = Mock(return_value=completion(20000))
+    orc.job_queue.enqueue(orc.channel, [make_message(1, LISTING_TEXT.format("me"))])
+    await orc.drain()
+
+    # the same text posted again a week later is not extracted a second time
+    reposted = make_message(9, LISTING_TEXT.format("me"), date=datetime(2025, 3, 26))
+    orc.job_queue.enqueue(orc.channel, [reposted])
+    await orc.drain()
+    assert orc.llm_processor.extract_structured_data.call_count == 1
+    assert orc.job_queue.counts() == {STORED: 1, SKIPPED: 1}
+
+    async with orc.db_manager.session_factory() as session:
+        [row] = (await session.execute(select(MessageData))).scalars().all()
+        stats = await session.get(AuthorStats, "Owner")
+    assert row.date == datetime(2025, 3, 26)
+    assert stats.reposts == 1
+
+
+@pytest.mark.asyncio
+async def test_repost_of_message_with_several_listings(make_orchestrator, make_message):
+    orc = make_orchestrator()
+    orc.llm_processor.extract_structured_data = Mock(
+        return_value=json.dumps(
+            {"listings": [{"BHK": 1, "Rent": 15000}, {"BHK": 2, "Rent": 20000}]}
+        )
+    )
+    orc.job_queue.enqueue(orc.channel, [make_message(1, LISTING_TEXT.format("me"))])
+    await orc.drain()
+
+    reposted = make_message(9, LISTING_TEXT.format("me"), date=datetime(2025, 3, 26))
+    orc.job_queue.enqueue(orc.channel, [reposted])
+    await orc.drain()
+    assert orc.job_queue.counts() == {STORED: 1, SKIPPED: 1}
+    async with orc.db_manager.session_factory() as session:
+        rows = (await session.execute(select(MessageData))).scalars().all()
+    assert [row.date for row in rows] == [datetime(2025, 3, 26)] * 2
+
+
+@pytest.mark.asyncio
+async def test_job_errors_fail_the_job(make_orchestrator, make_message):
+    orc = make_orchestrator()
+    orc.job_queue.max_attempts = 2
+    orc.job_queue.enqueue(orc.channel, [make_message(1, LISTING_TEXT.format("me"))])
+    await orc.preprocess_jobs()
+    orc.db_manager.get_message_by_text = AsyncMock(side_effect=OSError("disk I/O"))
+
+    # the error is recorded on the job instead of ending the drain
+    await orc.drain()
+    assert orc.job_queue.counts() == {FAILED: 1}
+    [(error,)] = orc.job_queue.conn.execute("SELECT error FROM jobs").fetchall()
+    assert error == "disk I/O"
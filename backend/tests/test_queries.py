@@ -0,0 +1,142 @@
+import json
+import math
+import shutil
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from flattracker.api import app as api
+from flattracker.api.app import app
+from flattracker.api.queries import parse_fields, query_messages
+from flattracker.database_manager import DatabaseManager
+from flattracker.models import Message
+from flattracker.snapshot import SnapshotReader
+
+# the database committed with the repository, from before any migration
+UNMIGRATED_DB = Path(__file__).parents[1] / "telegram_data.db"
+
+
+@pytest_asyncio.fixture
+async def client(db_path, db_manager, make_listing, tmp_path, monkeypatch):
+    def listing(i, **details):
+        return make_listing(
+            f"2 BHK flat in Wakad number {i}",
+            datetime(2025, 4, 1, i),
+            Rent=20000 + i,
+            Address="Wakad",
+            **details,
+        )
+
+    await db_manager.store_messages(
+        [listing(1), listing(2, BHK=math.nan, Deposit=math.inf)]
+    )
+    monkeypatch.setattr(api, "DB_PATH", db_path)
+    monkeypatch.setattr(api, "SNAPSHOT", SnapshotReader(tmp_path / "none.json"))
+    yield TestClient(app)
+
+
+def test_parse_fields():
+    assert parse_fields(None) == (
+        ["id", "raw_text", "time_created", "author", "details", "available_from"],
+        None,
+    )
+    assert parse_fields("Rent, id,BHK") == (["id", "details"], ["Rent", "BHK"])
+    assert parse_fields("details,Rent") == (["details"], None)
+    with pytest.raises(ValueError, match="Unknown fields: rent"):
+        parse_fields("id,rent")
+
+
+def test_non_finite_values_stored_as_null(client):
+    messages = client.get("/messages").json()
+    assert [m["details"]["BHK"] for m in messages] == [None, 2]
+    assert messages[0]["details"]["Deposit"] is None
+    # every message matches the documented response model
+    TypeAdapter(list[Message]).validate_python(messages)
+
+
+def test_fields_projection(client):
+    response = client.get("/messages", params={"fields": "id,time_created,Rent"})
+    assert response.json() == [
+        {
+            "id": 2,
+            "time_created": "2025-04-01 02:00:00.000000",
+            "details": {"Rent": 20002},
+        },
+        {
+            "id": 1,
+            "time_created": "2025-04-01 01:00:00.000000",
+            "details": {"Rent": 20001},
+        },
+    ]
+    assert client.get("/messages", params={"fields": "id,nope"}).status_code == 422
+    schema = client.get("/openapi.json").json()
+    assert "Message" in schema["components"]["schemas"]
+
+
+@pytest.mark.parametrize(
+    "bounds, index",
+    [
+        ({"available_after": date(2025, 4, 1)}, "ix_message_data_date"),
+        (
+            {
+                "available_after": date(2025, 4, 1),
+                "available_before": date(2025, 4, 30),
+            },
+            "ix_message_data_available_from",
+        ),
+    ],
+)
+def test_available_filter_query_plan(client, db_path, bounds, index):
+    statements = []
+    with sqlite3.connect(db_path) as db:
+        db.set_trace_callback(statements.append)
+        query_messages(db, **bounds)
+        [select] = [s for s in statements if s.startswith("SELECT")]
+        plan = " ".join(row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {select}"))
+    assert index in plan
+
+
+@pytest.mark.asyncio
+async def test_initialize_drops_existing_non_finite_values(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE message_data (id INTEGER PRIMARY KEY, raw_text VARCHAR, "
+        "date DATETIME, author VARCHAR, structured_data VARCHAR)"
+    )
+    conn.execute(
+        "INSERT INTO message_data (raw_text, date, author, structured_data) "
+        "VALUES (?, ?, ?, ?)",
+        ("text", "2025-04-01 00:00:00", "Owner", json.dumps({"BHK": math.nan})),
+    )
+    conn.commit()
+
+    manager = DatabaseManager(db_url=f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize()
+    await manager.engine.dispose()
+    [(data,)] = conn.execute("SELECT structured_data FROM message_data").fetchall()
+    assert json.loads(data) == {"BHK": None}
+    assert conn.execute("PRAGMA user_version").fetchone() == (1,)
+    conn.close()
+
+
+def test_unmigrated_database(tmp_path, monkeypatch):
+    db_path = tmp_path / "telegram_data.db"
+    shutil.copy(UNMIGRATED_DB, db_path)
+    monkeypatch.setattr(api, "DB_PATH", db_path)
+    monkeypatch.setattr(api, "SNAPSHOT", SnapshotReader(tmp_path / "none.json"))
+    client = TestClient(app)
+
+    messages = client.get("/messages").json()
+    assert len(messages) == 71
+    assert {m["available_from"] for m in messages} == {None}
+    # no author is known to be a broker and no listing to be available
+    assert len(client.get("/messages", params={"is_broker": False}).json()) == 71
+    assert client.get("/messages", params={"is_broker": True}).json() == []
+    params = {"available_after": "2025-01-01", "fields": "id,available_from"}
+    assert client.get("/messages", params=params).json() == []
+    assert client.get("/messages/archived").json() == []
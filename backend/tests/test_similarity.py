@@ -0,0 +1,125 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from flattracker.api import app as api
+from flattracker.api.app import app, get_db
+from flattracker.compression import CODEC
+from flattracker.similarity import SimilarityIndex, listing_features
+
+
+def listing(rent, bhk=2, address="Hinjewadi Phase 1", furnished="Furnished"):
+    text = f"{bhk} BHK {furnished} flat in {address}, rent {rent // 1000}k"
+    details = {
+        "BHK": bhk,
+        "Rent": rent,
+        "Deposit": rent * 3,
+        "Furnished": furnished,
+        "Gender": "Male/Female",
+        "Address": address,
+    }
+    return text, details
+
+
+def test_features_tolerate_messy_values():
+    row = listing_features("some text", {"Rent": "20k", "BHK": "", "Gender": "FEMALE"})
+    assert row.shape == listing_features(None, None).shape
+    assert np.isfinite(row).all()
+    assert row[0] == pytest.approx(2.0 * np.log2(20000 / 15000))
+
+
+def test_similar_ranks_comparable_listings_first():
+    index = SimilarityIndex(capacity=2)
+    index.add(
+        [
+            (1, *listing(20000)),
+            (2, *listing(21000)),
+            (3, *listing(60000, bhk=3, address="Baner", furnished="Unfurnished")),
+            (4, *listing(20000, address="Wakad")),
+        ]
+    )
+    assert len(index) == 4
+    ranked = [id for id, _ in index.similar(1, k=3)]
+    assert ranked == [2, 4, 3]
+    assert index.similar(1, k=10)[0][0] == 2
+
+    index.remove([2])
+    assert [id for id, _ in index.similar(1, k=3)] == [4, 3]
+
+
+def test_similar_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = SimilarityIndex(capacity=16)
+    listings = [
+        (i, *listing(int(rng.integers(5, 50)) * 1000, bhk=int(rng.integers(1, 4))))
+        for i in range(1, 500)
+    ]
+    index.add(listings)
+
+    features = {id: listing_features(text, details) for id, text, details in listings}
+    expected = sorted(
+        (float(np.linalg.norm(features[id] - features[7])), id)
+        for id in features
+        if id != 7
+    )[:5]
+    result = index.similar(7, k=5)
+    assert [d for _, d in result] == pytest.approx([d for d, _ in expected], abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_similar_endpoint(db_path, db_manager, make_listing, monkeypatch):
+    rents = [20000, 21000, 60000, 90000]
+    await db_manager.store_messages(
+        [make_listing(text, **details) for text, details in map(listing, rents)]
+    )
+
+    def get_test_db():
+        conn = sqlite3.connect(db_path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    monkeypatch.setattr(api, "SIMILARITY_INDEX", SimilarityIndex())
+    try:
+        client = TestClient(app)
+        response = client.get("/messages/1/similar", params={"k": 2})
+        assert response.status_code == 200
+        assert [m["id"] for m in response.json()] == [2, 3]
+        assert response.json()[0]["details"]["Rent"] == 21000
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM message_data WHERE id = 2")
+        conn.commit()
+        conn.close()
+        # the next closest listing takes the place of the archived one
+        response = client.get("/messages/1/similar", params={"k": 2})
+        assert [m["id"] for m in response.json()] == [3, 4]
+        assert 2 not in api.SIMILARITY_INDEX
+        assert client.get("/messages/99/similar").status_code == 404
+
+        # listing 4 normalized again to the rent of listing 1
+        conn = sqlite3.connect(db_path)
+        details = dict(listing(90000)[1], Rent=20000, Deposit=60000)
+        conn.execute(
+            "UPDATE message_data SET structured_data = ?, revision = 1 WHERE id = 4",
+            (CODEC.encode(json.dumps(details)),),
+        )
+        conn.commit()
+        conn.close()
+        response = client.get("/messages/1/similar", params={"k": 2})
+        assert [m["id"] for m in response.json()] == [4, 3]
+        assert response.json()[0]["details"]["Rent"] == 20000
+
+        # a refresh dropped the listing after it was looked up
+        def removed(id, k):
+            raise KeyError(id)
+
+        monkeypatch.setattr(api.SIMILARITY_INDEX, "similar", removed)
+        assert client.get("/messages/1/similar").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,116 @@
+import json
+import os
+from datetime import datetime
+from unittest.mock import Mock
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from flattracker import snapshot
+from flattracker.api import app as api
+from flattracker.api.app import app
+from flattracker.snapshot import SnapshotReader, write_snapshot
+
+
+@pytest.fixture
+def listing(make_listing):
+    def make(rent):
+        return make_listing(
+            f"2 BHK flat in Wakad, rent {rent // 1000}k",
+            datetime(2025, 4, 1, rent // 1000 % 24),
+            Rent=rent,
+            AvailableDate="1 May",
+        )
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_snapshot_roundtrip_and_remap(db_path, db_manager, listing, tmp_path):
+    snapshot_path = tmp_path / "snapshot.json"
+    await db_manager.store_messages([listing(20000), listing(21000)])
+    reader = SnapshotReader(snapshot_path)
+    assert reader.read() is None
+
+    assert write_snapshot(db_path, snapshot_path) == 2
+    first = reader.read()
+    assert [m["details"]["Rent"] for m in orjson.loads(first)] == [21000, 20000]
+    assert reader.read() is first
+
+    await db_manager.store_messages([listing(30000)])
+    await db_manager.engine.dispose()
+    assert write_snapshot(db_path, snapshot_path) == 3
+    # the old map stays readable for responses still sending it
+    assert len(orjson.loads(first)) == 2
+    assert len(orjson.loads(reader.read())) == 3
+    # no temporary files are left next to the snapshot
+    assert set(os.listdir(tmp_path)) == {"data.db", "snapshot.json"}
+
+
+@pytest.mark.asyncio
+async def test_messages_served_from_snapshot(
+    db_path, db_manager, listing, tmp_path, monkeypatch
+):
+    snapshot_path = tmp_path / "snapshot.json"
+    await db_manager.store_messages([listing(20000), listing(21000)])
+    monkeypatch.setattr(api, "DB_PATH", db_path)
+    monkeypatch.setattr(api, "SNAPSHOT", SnapshotReader(snapshot_path))
+    client = TestClient(app)
+
+    # without a snapshot the database answers
+    assert len(client.get("/messages").json()) == 2
+
+    write_snapshot(db_path, snapshot_path)
+    # rows written after the snapshot only show up in the next one
+    await db_manager.store_messages([listing(30000)])
+    assert len(client.get("/messages").json()) == 2
+
+    filtered = client.get("/messages", params={"available_after": "2025-01-01"})
+    assert len(filtered.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_writes_snapshot(
+    db_manager, make_orchestrator, listing, tmp_path
+):
+    snapshot_path = tmp_path / "snapshot.json"
+    orc = make_orchestrator(snapshot_path=snapshot_path)
+    await db_manager.store_messages([listing(20000)])
+    await orc.write_snapshot()
+    assert [m["details"]["Rent"] for m in orjson.loads(snapshot_path.read_bytes())] == [
+        20000
+    ]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_written_once_per_drain(
+    make_orchestrator, make_message, tmp_path, monkeypatch
+):
+    snapshot_path = tmp_path / "snapshot.json"
+    writes = Mock(wraps=snapshot.write_snapshot)
+    monkeypatch.setattr(snapshot, "write_snapshot", writes)
+    orc = make_orchestrator(snapshot_path=snapshot_path)
+    orc.llm_processor.extract_structured_data = Mock(
+        return_value=json.dumps({"BHK": 2, "Rent": 20000})
+    )
+    text = "2 BHK flat available in Hinjewadi phase {}, rent 20k, deposit 40k. DM me"
+    # two extraction and store batches
+    messages = [make_message(i, text.format(i)) for i in range(1, 13)]
+    orc.job_queue.enqueue(orc.channel, messages)
+    await orc.drain()
+    assert writes.call_count == 1
+    assert len(orjson.loads(snapshot_path.read_bytes())) == 12
+
+    # a repost moves the date of the listing in the snapshot forward
+    reposted = make_message(20, text.format(1), date=datetime(2025, 4, 2))
+    orc.job_queue.enqueue(orc.channel, [reposted])
+    await orc.drain()
+    assert writes.call_count == 2
+    latest = orjson.loads(snapshot_path.read_bytes())[0]
+    assert latest["raw_text"] == text.format(1)
+    assert latest["time_created"].startswith("2025-04-02")
+
+    # nothing changed
+    await orc.drain()
+    assert writes.call_count == 2
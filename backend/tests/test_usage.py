@@ -0,0 +1,66 @@
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from flattracker.llm_processor import LLMProcessor
+from flattracker.llm_router import AllEndpointsFailed
+from flattracker.usage import UsageLog, completion_usage
+
+
+def completion(prompt_tokens, cached_tokens):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=20,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        ),
+    )
+
+
+def test_completion_usage_tolerates_missing_fields():
+    assert completion_usage(completion(100, 64)) == {
+        "prompt_tokens": 100,
+        "completion_tokens": 20,
+        "cached_tokens": 64,
+    }
+    assert completion_usage(SimpleNamespace(usage=Mock())) == {
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "cached_tokens": None,
+    }
+
+
+@patch("flattracker.llm_processor.OpenAI")
+def test_calls_and_runs_are_persisted(mock_openai, tmp_path):
+    db_path = tmp_path / "usage.db"
+    create = mock_openai.return_value.chat.completions.create
+    create.side_effect = [completion(300, 0), completion(310, 256), Exception("down")]
+    llm_processor = LLMProcessor(api_key="test", usage_log=UsageLog(db_path))
+
+    with llm_processor.usage_run("ingest test"):
+        for text in ["first", "second"]:
+            llm_processor.extract_structured_data({"text": text}, {"BHK": "integer"})
+        with pytest.raises(AllEndpointsFailed):
+            llm_processor.extract_structured_data({"text": "third"}, {})
+
+    conn = sqlite3.connect(db_path)
+    calls = conn.execute(
+        "SELECT run_id, endpoint, model, prompt_tokens, cached_tokens, error, latency "
+        "FROM llm_calls ORDER BY id"
+    ).fetchall()
+    assert [call[:6] for call in calls] == [
+        (1, "openrouter", "google/gemma-3-27b-it:free", 300, 0, None),
+        (1, "openrouter", "google/gemma-3-27b-it:free", 310, 256, None),
+        (1, None, None, None, None, "every LLM endpoint failed: down"),
+    ]
+    assert all(call[6] >= 0 for call in calls)
+
+    run = conn.execute(
+        "SELECT label, calls, failures, prompt_tokens, completion_tokens, "
+        "cached_tokens, finished_at IS NOT NULL FROM llm_runs"
+    ).fetchone()
+    assert run == ("ingest test", 3, 1, 610, 40, 256, 1)
+    conn.close()